@@ -1,9 +1,12 @@
 # 1_Login.py
 import streamlit as st
 import utils
+import metricas
+import usuarios
 import base64 # Biblioteca para codificar a imagem
 
 st.set_page_config(page_title="Login - Rocker Equipamentos", layout="centered")
+metricas.iniciar_execucao("Login")
 
 # --- FUNÇÃO PARA CARREGAR E CODIFICAR A IMAGEM ---
 def get_image_as_base64(path):
@@ -64,26 +67,22 @@ with st.form("login_form"):
     submitted = st.form_submit_button("Entrar")
 
     if submitted:
-        # Conexão com o banco de dados de usuários movida para dentro da submissão
+        # O diretório de usuários fica em memória: o login não depende de baixar o users.json
         try:
             drive = utils.login_gdrive()
-            users_file = utils.get_database_file(drive, "users.json")
-            users_data = utils.read_data(users_file)
-            
-            usuario_encontrado = None
-            for user in users_data:
-                if user['email'] == email and user['senha'] == senha:
-                    usuario_encontrado = user
-                    break
+            usuario_encontrado = usuarios.diretorio.autenticar(drive, email, senha)
             
             if usuario_encontrado:
                 st.session_state['autenticado'] = True
                 st.session_state['nome_usuario'] = usuario_encontrado['nome']
+                st.session_state['administrador'] = usuarios.eh_administrador(usuario_encontrado)
                 st.success("Login realizado com sucesso!")
                 st.switch_page("pages/2_Cadastro_de_Clientes.py")
             else:
                 st.error("E-mail ou senha incorretos.")
 
+        except usuarios.MuitasTentativas as e:
+            st.error(str(e))
         except Exception as e:
             st.error(f"Falha na conexão ou autenticação. Verifique sua rede e tente novamente. Erro: {e}")
 
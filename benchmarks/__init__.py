@@ -0,0 +1,3 @@
+# benchmarks/__init__.py
+# Medições de desempenho com dados sintéticos. Uso (na raiz do projeto):
+#   python -m benchmarks --escalas 1000 10000 --saida resultados.json
@@ -0,0 +1,6 @@
+# benchmarks/__main__.py
+import sys
+
+from benchmarks.executar import main
+
+sys.exit(main())
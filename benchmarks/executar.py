@@ -0,0 +1,227 @@
+# benchmarks/executar.py
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import documentos
+import drive_local
+import indices
+import referencias
+import serializacao
+import storage
+import utils
+from benchmarks.gerador import GeradorDados
+from settings import get_setting
+
+ESCALAS_PADRAO = (1_000, 10_000)
+
+
+# --- MEDIÇÃO ---
+def medir(funcao, repeticoes, preparar=None):
+    """
+    Executa funcao(contexto) `repeticoes` vezes (contexto = preparar(), fora da medição) e retorna
+    os tempos mínimo, mediano e médio em segundos e o pico de memória alocada (tracemalloc) de uma
+    execução extra, separada para que o rastreamento não distorça os tempos.
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        contexto = preparar() if preparar else None
+        inicio = time.perf_counter()
+        funcao(contexto)
+        tempos.append(time.perf_counter() - inicio)
+
+    contexto = preparar() if preparar else None
+    tracemalloc.start()
+    try:
+        funcao(contexto)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "tempo_min_s": min(tempos),
+        "tempo_mediana_s": statistics.median(tempos),
+        "tempo_media_s": statistics.fmean(tempos),
+        "pico_memoria_bytes": pico,
+    }
+
+
+# --- CASOS ---
+def casos_serializacao(dados):
+    """Codificação e decodificação dos arquivos do Drive em cada formato disponível."""
+    for formato in (serializacao.FORMATO_LEGADO, "json", "json+gzip", "msgpack+zstd"):
+        try:
+            serializacao.validar_formato(formato)
+        except serializacao.FormatoIndisponivel:
+            continue
+        for nome in ("clients.json", "contracts.json", "invoices.json"):
+            registros = dados[nome]
+            conteudo, _ = serializacao.codificar(registros, formato)
+            yield f"codificar[{formato}] {nome}", lambda _, r=registros, f=formato: serializacao.codificar(r, f), None, {"bytes": len(conteudo)}
+            yield f"decodificar[{formato}] {nome}", lambda _, c=conteudo: serializacao.decodificar(c), None, {}
+
+
+def casos_armazenamento(dados, pasta):
+    """read_data/write_data pelo backend SQLite (a serialização do Drive é medida à parte)."""
+    backend = storage.SQLiteStorage(os.path.join(pasta, "benchmark.db"))
+    for nome in ("clients.json", "contracts.json", "invoices.json"):
+        dataset = backend.open(None, nome)
+        backend.read(dataset)
+        backend.write(dataset, dados[nome])
+
+        def preparar_gravacao(dataset=dataset):
+            # write_data é condicional à versão lida: cada gravação parte de uma leitura
+            utils.read_data(dataset)
+            return dataset
+
+        yield f"read_data {nome}", lambda _, d=dataset: utils.read_data(d), None, {}
+        yield f"write_data {nome}", lambda d, r=dados[nome]: utils.write_data(d, r), preparar_gravacao, {}
+
+
+def casos_drive(dados, pasta, latencia):
+    """
+    Abertura, leitura e inclusão de registro pelo backend do Drive, sobre o emulador local com a
+    latência informada; `chamadas` registra as idas ao serviço de uma execução.
+    """
+    drive = drive_local.DriveLocal(latencia=latencia, semente=0)
+    backend = storage.DriveJSONStorage(caminho_ids=os.path.join(pasta, "drive_ids.json"))
+    for nome in ("clients.json", "contracts.json", "invoices.json"):
+        dataset = backend.open(drive, nome)
+        backend.read(dataset)
+        backend.write(dataset, dados[nome])
+        chave = storage.CHAVES_PRIMARIAS[nome]
+        novo = dict(dados[nome][0], **{chave: "benchmark"})
+
+        def contar(funcao):
+            def medida(contexto):
+                drive.zerar_contadores()
+                funcao(contexto)
+            return medida
+
+        def ler_sem_cache(_, nome=nome):
+            # Como no primeiro acesso de um processo: metadados e download
+            backend.cache = storage.CacheDatasets(ttl=backend.cache.ttl, max_bytes=backend.cache.max_bytes)
+            utils.read_data(backend.open(drive, nome))
+
+        def incluir(_, nome=nome, novo=novo):
+            backend.insert(backend.open(drive, nome), novo)
+
+        for caso, funcao in ((f"drive: abrir e ler {nome}", ler_sem_cache), (f"drive: incluir registro em {nome}", incluir)):
+            medida = contar(funcao)
+            yield caso, medida, None, {"latencia_s": latencia, "chamadas": drive.chamadas}
+
+
+def casos_filtros(dados, pasta):
+    """Lógica de filtro e ordenação das páginas de clientes, contratos e faturas."""
+    backend = storage.SQLiteStorage(os.path.join(pasta, "filtros.db"))
+    clients_file = backend.open(None, "clients.json")
+    clientes = dados["clients.json"]
+    contratos = referencias.contratos_resolvidos(dados["contracts.json"])
+    faturas = dados["invoices.json"]
+    indice_contratos = indices.IndiceContratos(contratos)
+
+    def ordenar_clientes(_):
+        # Descarta a ordenação guardada, para medir o cálculo e não a consulta ao cache
+        utils._ordenacoes.limpar()
+        utils.ordem_por(clients_file, clientes, "nome_razao_social")
+
+    def filtrar_faturas(_):
+        filtradas = [f for f in faturas if f.get("status") == "Pendente"]
+        sorted(filtradas, key=lambda i: i["data_emissao"], reverse=True)
+
+    yield "ordenar clientes por nome (página 2)", ordenar_clientes, None, {}
+    yield "montar índice de contratos", lambda _: indices.IndiceContratos(contratos), None, {}
+    yield "filtrar contratos por status (página 4)", lambda _: indice_contratos.filtrar("", "Ativo", None), None, {}
+    yield "filtrar contratos por texto (página 4)", lambda _: indice_contratos.filtrar("silva", None, None), None, {}
+    yield "filtrar e ordenar faturas por status (página 5)", filtrar_faturas, None, {}
+
+
+def casos_busca_clientes(dados):
+    """Montagem do índice de clientes e buscas por CPF/CNPJ, nome e e-mail."""
+    clientes = dados["clients.json"]
+    indice = indices.IndiceClientes(clientes)
+    exemplo = clientes[len(clientes) // 2]
+    yield "montar índice de clientes", lambda _: indices.IndiceClientes(clientes), None, {}
+    yield "buscar cliente por CPF/CNPJ", lambda _: indice.buscar(exemplo["cpf_cnpj"][:6]), None, {}
+    yield "buscar cliente por nome", lambda _: indice.buscar(exemplo["nome_razao_social"].split()[0]), None, {}
+    yield "buscar cliente por e-mail", lambda _: indice.buscar(exemplo["email"][:5]), None, {}
+
+
+def casos_documentos(dados):
+    """Geração de um contrato e de uma fatura .docx (sem o cache de documentos)."""
+    contratos = referencias.contratos_resolvidos(dados["contracts.json"][:1])
+    contratos_por_id = {c["id_contrato"]: c for c in contratos}
+    fatura = referencias.resolver_fatura(dict(dados["invoices.json"][0], id_contrato=contratos[0]["id_contrato"]), contratos_por_id)
+    yield "gerar_contrato_docx", lambda _: utils.gerar_contrato_docx(contratos[0]), None, {}
+    yield "gerar_fatura_docx", lambda _: utils.gerar_fatura_docx(documentos.dados_template_fatura(fatura)), None, {}
+
+
+# --- EXECUÇÃO ---
+def _commit_atual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(escalas, repeticoes, semente, com_documentos=True, latencia_drive=0.0, progresso=print):
+    resultados = []
+    for escala in escalas:
+        dados = GeradorDados(semente).gerar(escala)
+        with tempfile.TemporaryDirectory() as pasta:
+            grupos = [
+                ("serializacao", casos_serializacao(dados)),
+                ("armazenamento", casos_armazenamento(dados, pasta)),
+                ("drive", casos_drive(dados, pasta, latencia_drive)),
+                ("filtros", casos_filtros(dados, pasta)),
+                ("busca_clientes", casos_busca_clientes(dados)),
+            ]
+            if com_documentos:
+                grupos.append(("documentos", casos_documentos(dados)))
+            for grupo, casos in grupos:
+                for nome, funcao, preparar, extras in casos:
+                    medicao = medir(funcao, repeticoes, preparar)
+                    # Extras mutáveis (contadores) são lidos depois da medição
+                    extras = {chave: dict(valor) if isinstance(valor, dict) else valor for chave, valor in extras.items()}
+                    resultados.append({"grupo": grupo, "caso": nome, "escala": escala, "repeticoes": repeticoes, **medicao, **extras})
+                    progresso(f"[{escala}] {nome}: {medicao['tempo_mediana_s'] * 1000:.2f} ms (pico {medicao['pico_memoria_bytes'] / 2**20:.1f} MB)")
+    return {
+        "metadados": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "commit": _commit_atual(),
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "semente": semente,
+            "repeticoes": repeticoes,
+            "formato_armazenamento": get_setting("storage", "format", "json+gzip"),
+        },
+        "resultados": resultados,
+    }
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Mede o desempenho com dados sintéticos.")
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS_PADRAO), help="registros por dataset (ex.: 1000 10000 100000)")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--sem-documentos", action="store_true", help="não mede a geração dos .docx")
+    parser.add_argument("--latencia-drive", type=float, default=0.0, help="latência simulada de cada chamada ao Drive, em segundos")
+    parser.add_argument("--saida", default="benchmarks/resultados.json", help="arquivo JSON com os resultados")
+    args = parser.parse_args(argumentos)
+
+    relatorio = executar(args.escalas, args.repeticoes, args.semente, com_documentos=not args.sem_documentos, latencia_drive=args.latencia_drive)
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"Resultados gravados em {args.saida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# benchmarks/gerador.py
+import random
+import uuid
+from datetime import date, timedelta
+
+import faturamento
+import referencias
+
+NOMES = ("Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Íris", "João", "Lívia", "Márcio")
+SOBRENOMES = ("Silva", "Souza", "Oliveira", "Pereira", "Costa", "Rodrigues", "Almeida", "Nascimento", "Lima", "Araújo")
+RAMOS = ("Construções", "Engenharia", "Reformas", "Incorporadora", "Empreiteira", "Edificações")
+CIDADES = (("Florianópolis", "SC"), ("São José", "SC"), ("Palhoça", "SC"), ("Curitiba", "PR"), ("Porto Alegre", "RS"))
+PRODUTOS = ("BALANCIM SUSPENSO ULTRALEVE MANUAL", "BALANCIM SUSPENSO ULTRALEVE ELÉTRICO")
+PLATAFORMAS = ("PLATAFORMA DE 1 METRO", "PLATAFORMA DE 2 METROS", "PLATAFORMA DE 3 METROS", "PLATAFORMA DE 4 METROS",
+               "PLATAFORMA DE 5 METROS", "PLATAFORMA DE 6 METROS", "PLATAFORMA DE 8 METROS")
+STATUS_CONTRATO = ("Ativo", "Ativo", "Ativo", "Encerrado", "Encerrado com Pendências")
+STATUS_FATURA = ("Pendente", "Liquidada", "Liquidada", "Cancelada")
+
+
+def _digito_verificador(digitos, pesos):
+    resto = sum(d * p for d, p in zip(digitos, pesos)) % 11
+    return 0 if resto < 2 else 11 - resto
+
+
+class GeradorDados:
+    """
+    Gera clientes, contratos e faturas no formato gravado pelas páginas, com CPFs e CNPJs válidos.
+    A mesma semente sempre produz os mesmos dados, para que as medições possam ser comparadas.
+    """
+
+    def __init__(self, semente=42, hoje=date(2025, 6, 30)):
+        self.aleatorio = random.Random(semente)
+        self.hoje = hoje
+
+    def _uuid(self):
+        return str(uuid.UUID(int=self.aleatorio.getrandbits(128), version=4))
+
+    def cpf(self):
+        digitos = [self.aleatorio.randrange(10) for _ in range(9)]
+        digitos.append(_digito_verificador(digitos, range(10, 1, -1)))
+        digitos.append(_digito_verificador(digitos, range(11, 1, -1)))
+        texto = "".join(map(str, digitos))
+        return f"{texto[:3]}.{texto[3:6]}.{texto[6:9]}-{texto[9:]}"
+
+    def cnpj(self):
+        digitos = [self.aleatorio.randrange(10) for _ in range(8)] + [0, 0, 0, 1]
+        digitos.append(_digito_verificador(digitos, (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)))
+        digitos.append(_digito_verificador(digitos, (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)))
+        texto = "".join(map(str, digitos))
+        return f"{texto[:2]}.{texto[2:5]}.{texto[5:8]}/{texto[8:12]}-{texto[12:]}"
+
+    def _data(self, dias_atras):
+        return self.hoje - timedelta(days=self.aleatorio.randrange(dias_atras))
+
+    def cliente(self):
+        a = self.aleatorio
+        nome = f"{a.choice(NOMES)} {a.choice(SOBRENOMES)} {a.choice(SOBRENOMES)}"
+        cidade, estado = a.choice(CIDADES)
+        juridica = a.random() < 0.6
+        return {
+            "id": self._uuid(),
+            "tipo_pessoa": "Pessoa Jurídica" if juridica else "Pessoa Física",
+            "nome_razao_social": f"{a.choice(SOBRENOMES)} {a.choice(RAMOS)} LTDA" if juridica else nome,
+            "cpf_cnpj": self.cnpj() if juridica else self.cpf(),
+            "data_nascimento": None if juridica else str(date(a.randint(1950, 2000), a.randint(1, 12), a.randint(1, 28))),
+            "email": f"{nome.split()[0].lower()}.{a.randrange(10**6)}@exemplo.com.br",
+            "telefone": f"(48) 9{a.randrange(10**8):08d}",
+            "cep": f"88{a.randrange(10**6):06d}",
+            "cidade": cidade,
+            "estado": estado,
+            "endereco": f"Rua {a.choice(SOBRENOMES)}, {a.randint(1, 2000)}, Centro",
+            "representante_legal": {
+                "nome": nome, "cpf": self.cpf(), "data_nascimento": "1980-01-01", "telefone": "", "email": "",
+            } if juridica else None,
+        }
+
+    def contrato(self, cliente, sequencia):
+        a = self.aleatorio
+        geracao = self._data(3 * 365)
+        inicio = geracao + timedelta(days=a.randrange(15))
+        return {
+            "id_contrato": self._uuid(),
+            "numero_contrato": f"{sequencia:05d}-{geracao.year}",
+            "data_geracao": geracao.isoformat(),
+            "status": a.choice(STATUS_CONTRATO),
+            "tipo_contrato": "Locação" if a.random() < 0.9 else "Venda",
+            "cliente_id": cliente["id"],
+            "cliente_snapshot": referencias.snapshot_cliente(cliente),
+            "itens_contrato": [
+                {
+                    "produto": a.choice(PRODUTOS),
+                    "plataforma": a.choice(PLATAFORMAS),
+                    "quantidade": a.randint(1, 6),
+                    "valor_unitario_centavos": a.randrange(250, 1500, 50) * 100,
+                }
+                for _ in range(a.randint(1, 4))
+            ],
+            "valor_entrega_centavos": a.choice((0, 150, 250, 400)) * 100,
+            "valor_recolha_centavos": a.choice((0, 150, 250, 400)) * 100,
+            "endereco_obra": f"Av. {a.choice(SOBRENOMES)}, {a.randint(1, 5000)}",
+            "contato_nome": a.choice(NOMES),
+            "contato_telefone": f"(48) 9{a.randrange(10**8):08d}",
+            "data_inicio": inicio.strftime("%d/%m/%Y"),
+            "data_assinatura": geracao.strftime("%d/%m/%Y"),
+        }
+
+    def fatura(self, contrato, sequencia):
+        a = self.aleatorio
+        emissao = self._data(2 * 365)
+        return {
+            "id_fatura": self._uuid(),
+            "numero_fatura": f"{sequencia:07d}",
+            "id_contrato": contrato["id_contrato"],
+            "status": a.choice(STATUS_FATURA),
+            "data_emissao": emissao.isoformat(),
+            "data_vencimento": (emissao + timedelta(days=10)).isoformat(),
+            "descricao_servico": f"Referente a locação do contrato {contrato['numero_contrato']}",
+            "valor_total_centavos": faturamento.valor_mensal(contrato),
+            "forma_pagamento": a.choice(("BOLETO BANCÁRIO", "PIX", "TRANSFERÊNCIA")),
+            "observacao": "",
+            "cliente_id": contrato["cliente_id"],
+            "contrato_info": {"numero": contrato["numero_contrato"]},
+        }
+
+    def gerar(self, escala):
+        """Gera `escala` clientes, `escala` contratos e `escala` faturas, com as referências entre eles."""
+        clientes = [self.cliente() for _ in range(escala)]
+        contratos = [self.contrato(self.aleatorio.choice(clientes), i + 1) for i in range(escala)]
+        faturas = [self.fatura(self.aleatorio.choice(contratos), i + 1) for i in range(escala)]
+        return {"clients.json": clientes, "contracts.json": contratos, "invoices.json": faturas}
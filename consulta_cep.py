@@ -0,0 +1,243 @@
+# consulta_cep.py
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from settings import get_setting
+
+URL_VIACEP = "https://viacep.com.br/ws/{cep}/json/"
+
+# Campos do ViaCEP usados pelo cadastro (também são as colunas esperadas na base local)
+CAMPOS_ENDERECO = ("cep", "logradouro", "bairro", "localidade", "uf")
+
+
+def limpar_cep(cep):
+    return "".join(filter(str.isdigit, cep or ""))
+
+
+class CEPIndisponivel(Exception):
+    """O ViaCEP falhou ou demorou e o CEP não está em nenhum cache nem na base local: não dá para saber se ele existe."""
+
+
+class ResolvedorCEP:
+    """
+    Consulta de endereço por CEP com cache em dois níveis:
+    - memória (LRU com validade), compartilhada pelas sessões do processo;
+    - SQLite local, que sobrevive a reinícios.
+    CEPs inexistentes também ficam em cache (por menos tempo), para não repetir a consulta.
+    O ViaCEP é chamado por uma sessão HTTP reaproveitada e com tempo limite. Se ele falhar ou
+    demorar, a resposta vem de um cache já vencido ou da base local de CEPs (opcional, CSV com
+    as colunas de CAMPOS_ENDERECO); sem nenhum dos dois, levanta CEPIndisponivel. Depois de
+    `falhas_para_pausa` falhas seguidas o serviço fica `pausa_apos_falha` segundos sem ser chamado.
+    """
+
+    def __init__(self, caminho_cache, ttl, ttl_negativo, max_memoria, timeout, base_local=None, pausa_apos_falha=60,
+                 falhas_para_pausa=3):
+        self.caminho_cache = caminho_cache
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.max_memoria = max_memoria
+        # (conexão, leitura) em segundos
+        self.timeout = timeout
+        self.base_local = base_local
+        self.pausa_apos_falha = pausa_apos_falha
+        self.falhas_para_pausa = falhas_para_pausa
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._indisponivel_ate = 0.0
+        self._falhas_seguidas = 0
+        self._base_local_carregada = False
+
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=0)
+        self.sessao.mount("https://", adaptador)
+
+        if caminho_cache:
+            pasta = os.path.dirname(caminho_cache)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            with self._conexao() as conexao:
+                conexao.execute(
+                    "CREATE TABLE IF NOT EXISTS ceps (cep TEXT PRIMARY KEY, dados TEXT, expira_em REAL NOT NULL)"
+                )
+                conexao.execute("CREATE TABLE IF NOT EXISTS ceps_base_local (cep TEXT PRIMARY KEY, dados TEXT NOT NULL)")
+                conexao.execute("CREATE TABLE IF NOT EXISTS ceps_meta (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)")
+
+    def _conexao(self):
+        # Uma conexão por thread, como no SQLiteStorage
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho_cache, timeout=5)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            self._local.conexao = conexao
+        return conexao
+
+    # --- Cache em memória ---
+    def _da_memoria(self, cep):
+        with self._lock:
+            entrada = self._memoria.get(cep)
+            if entrada is None:
+                return None
+            self._memoria.move_to_end(cep)
+            return entrada
+
+    def _guardar_memoria(self, cep, dados, expira_em):
+        with self._lock:
+            self._memoria[cep] = (dados, expira_em)
+            self._memoria.move_to_end(cep)
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+
+    # --- Cache em disco ---
+    def _do_disco(self, cep):
+        if not self.caminho_cache:
+            return None
+        linha = self._conexao().execute("SELECT dados, expira_em FROM ceps WHERE cep = ?", (cep,)).fetchone()
+        if linha is None:
+            return None
+        return (json.loads(linha[0]) if linha[0] else None), linha[1]
+
+    def _guardar_disco(self, cep, dados, expira_em):
+        if not self.caminho_cache:
+            return
+        with self._conexao() as conexao:
+            conexao.execute(
+                "INSERT INTO ceps (cep, dados, expira_em) VALUES (?, ?, ?) "
+                "ON CONFLICT(cep) DO UPDATE SET dados = excluded.dados, expira_em = excluded.expira_em",
+                (cep, json.dumps(dados, ensure_ascii=False) if dados else None, expira_em),
+            )
+
+    def _guardar(self, cep, dados):
+        expira_em = time.time() + (self.ttl if dados else self.ttl_negativo)
+        self._guardar_memoria(cep, dados, expira_em)
+        self._guardar_disco(cep, dados, expira_em)
+
+    # --- Base local ---
+    def _carregar_base_local(self):
+        """Importa o CSV da base local para o SQLite (só quando o arquivo muda)."""
+        if self._base_local_carregada or not (self.base_local and self.caminho_cache):
+            return
+        self._base_local_carregada = True
+        try:
+            assinatura = str(os.stat(self.base_local).st_mtime_ns)
+        except OSError:
+            return
+        conexao = self._conexao()
+        linha = conexao.execute("SELECT valor FROM ceps_meta WHERE chave = 'base_local'").fetchone()
+        if linha and linha[0] == assinatura:
+            return
+        with open(self.base_local, encoding="utf-8", newline="") as f, conexao:
+            conexao.execute("DELETE FROM ceps_base_local")
+            conexao.executemany(
+                "INSERT OR REPLACE INTO ceps_base_local (cep, dados) VALUES (?, ?)",
+                (
+                    (limpar_cep(r["cep"]), json.dumps({c: r.get(c, "") for c in CAMPOS_ENDERECO}, ensure_ascii=False))
+                    for r in csv.DictReader(f)
+                ),
+            )
+            conexao.execute(
+                "INSERT OR REPLACE INTO ceps_meta (chave, valor) VALUES ('base_local', ?)", (assinatura,)
+            )
+
+    def _da_base_local(self, cep):
+        self._carregar_base_local()
+        if not (self.base_local and self.caminho_cache):
+            return None
+        linha = self._conexao().execute("SELECT dados FROM ceps_base_local WHERE cep = ?", (cep,)).fetchone()
+        return json.loads(linha[0]) if linha else None
+
+    # --- ViaCEP ---
+    def _consultar_viacep(self, cep):
+        """Retorna os dados do CEP, None se ele não existir ou levanta requests.RequestException."""
+        resposta = self.sessao.get(URL_VIACEP.format(cep=cep), timeout=self.timeout)
+        if resposta.status_code == 400:
+            return None
+        resposta.raise_for_status()
+        dados = resposta.json()
+        if dados.get("erro"):
+            return None
+        return dados
+
+    def _registrar_falha(self):
+        # Uma falha isolada (um tempo limite) não tira o serviço do ar para todas as sessões
+        with self._lock:
+            self._falhas_seguidas += 1
+            if self._falhas_seguidas >= self.falhas_para_pausa:
+                self._indisponivel_ate = time.time() + self.pausa_apos_falha
+                self._falhas_seguidas = 0
+
+    def _registrar_sucesso(self):
+        with self._lock:
+            self._falhas_seguidas = 0
+
+    def consultar(self, cep):
+        """
+        Retorna o endereço do CEP no formato do ViaCEP, ou None se o CEP for inválido ou não for encontrado.
+        Levanta CEPIndisponivel se o ViaCEP não respondeu e não há outra fonte para o CEP.
+        """
+        cep = limpar_cep(cep)
+        if len(cep) != 8:
+            return None
+
+        agora = time.time()
+        guardado = self._da_memoria(cep)
+        if guardado is None or guardado[1] <= agora:
+            # Outro processo pode ter renovado a entrada no cache em disco
+            guardado = self._do_disco(cep) or guardado
+        if guardado is not None:
+            dados, expira_em = guardado
+            if expira_em > agora:
+                self._guardar_memoria(cep, dados, expira_em)
+                return dados
+
+        if agora >= self._indisponivel_ate:
+            try:
+                dados = self._consultar_viacep(cep)
+            except (requests.RequestException, ValueError):
+                self._registrar_falha()
+            else:
+                self._registrar_sucesso()
+                self._guardar(cep, dados)
+                return dados
+
+        # Serviço fora do ar ou lento: vale um resultado vencido do cache ou a base local
+        if guardado is not None and guardado[0] is not None:
+            return guardado[0]
+        dados = self._da_base_local(cep)
+        if dados is not None:
+            return dados
+        if guardado is not None:
+            # O ViaCEP já respondeu antes que o CEP não existe
+            return None
+        raise CEPIndisponivel(f"Serviço de CEP indisponível para {cep}")
+
+
+_resolvedor = None
+_lock_resolvedor = threading.Lock()
+
+
+def resolvedor():
+    """Resolvedor configurado pela seção [cep] (ver README), criado no primeiro uso: importar o módulo não cria o cache."""
+    global _resolvedor
+    with _lock_resolvedor:
+        if _resolvedor is None:
+            timeout = get_setting("cep", "timeout", 3.0)
+            _resolvedor = ResolvedorCEP(
+                caminho_cache=get_setting("cep", "cache_path", ".cache/ceps.db"),
+                ttl=get_setting("cep", "cache_ttl", 30 * 24 * 3600),
+                ttl_negativo=get_setting("cep", "cache_ttl_negativo", 24 * 3600),
+                max_memoria=get_setting("cep", "cache_max_itens", 5000),
+                timeout=(min(timeout, 2.0), timeout),
+                base_local=get_setting("cep", "base_local", None),
+                pausa_apos_falha=get_setting("cep", "pausa_apos_falha", 60),
+                falhas_para_pausa=get_setting("cep", "falhas_para_pausa", 3),
+            )
+        return _resolvedor
@@ -0,0 +1,124 @@
+# dinheiro.py
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import numpy as np
+
+import utils
+
+# Valores em dinheiro são guardados como centavos inteiros em `<campo>_centavos`
+# (ex.: valor_total_centavos = 150000 para R$ 1.500,00). Registros ainda não migrados
+# têm o valor antigo em `<campo>` (número em reais ou texto como "1500.00").
+SUFIXO_CENTAVOS = "_centavos"
+
+
+def para_centavos(valor):
+    """Converte um valor em reais (número ou texto: "1500.00", "1.500,00", "R$ 1500") para centavos, sem erro de arredondamento."""
+    if valor is None or valor == "":
+        return 0
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return valor * 100
+    if isinstance(valor, float):
+        # repr() é o menor texto que representa o float: 0.1 vira "0.1", e não 0.1000000000000000055...
+        texto = repr(valor)
+    else:
+        texto = str(valor).replace("R$", "").strip()
+        if "," in texto:
+            texto = texto.replace(".", "").replace(",", ".")
+    try:
+        return int((Decimal(texto) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"Valor em dinheiro inválido: {valor!r}") from None
+
+
+def centavos(registro, campo):
+    """Valor do campo em centavos, lendo `<campo>_centavos` ou, em registros antigos, `<campo>`."""
+    chave = campo + SUFIXO_CENTAVOS
+    if chave in registro:
+        return int(registro[chave])
+    return para_centavos(registro.get(campo))
+
+
+def proporcional(valor_centavos, parte, total):
+    """valor × parte / total em centavos, arredondado meio centavo para cima, só com inteiros."""
+    return (2 * valor_centavos * parte + total) // (2 * total)
+
+
+# --- FORMATAÇÃO (só na exibição e nos documentos) ---
+def formatar(valor_centavos):
+    """Centavos como texto com ponto decimal, como nos documentos: 150000 → "1500.00"."""
+    sinal = "-" if valor_centavos < 0 else ""
+    reais, resto = divmod(abs(int(valor_centavos)), 100)
+    return f"{sinal}{reais}.{resto:02d}"
+
+
+def formatar_reais(valor_centavos):
+    """Centavos no formato brasileiro: 150000 → "R$ 1.500,00"."""
+    sinal = "-" if valor_centavos < 0 else ""
+    reais, resto = divmod(abs(int(valor_centavos)), 100)
+    return f"{sinal}R$ {reais:,}".replace(",", ".") + f",{resto:02d}"
+
+
+def em_reais(valores_centavos):
+    """Array (ou coluna) de centavos em reais, para gráficos."""
+    return np.asarray(valores_centavos, dtype=np.int64) / 100
+
+
+# --- TOTAIS VETORIZADOS ---
+def totais_itens(itens):
+    """Array com quantidade × valor unitário (centavos) de cada item."""
+    quantidades = np.fromiter((int(i.get('quantidade') or 0) for i in itens), dtype=np.int64, count=len(itens))
+    unitarios = np.fromiter((centavos(i, 'valor_unitario') for i in itens), dtype=np.int64, count=len(itens))
+    return quantidades * unitarios
+
+
+def totais_mensais(contratos):
+    """Array com o valor mensal (soma dos itens, em centavos) de cada contrato, calculado de uma vez para todos."""
+    itens = [item for c in contratos for item in c.get('itens_contrato', [])]
+    posicoes = np.repeat(np.arange(len(contratos)), [len(c.get('itens_contrato', [])) for c in contratos])
+    totais = np.zeros(len(contratos), dtype=np.int64)
+    np.add.at(totais, posicoes, totais_itens(itens))
+    return totais
+
+
+def somar(valores_centavos):
+    return int(np.asarray(valores_centavos, dtype=np.int64).sum())
+
+
+# --- MIGRAÇÃO DOS ARQUIVOS ANTIGOS ---
+def _migrar_campo(registro, campo):
+    if campo not in registro:
+        return False
+    registro[campo + SUFIXO_CENTAVOS] = centavos(registro, campo)
+    del registro[campo]
+    return True
+
+
+def migrar_valores(drive):
+    """
+    Converte os valores em reais (número ou texto) de contracts.json e invoices.json para centavos:
+    valor_unitario dos itens, valor_entrega e valor_recolha dos contratos e valor_total das faturas.
+    Pode ser executada mais de uma vez. Retorna quantos registros foram convertidos.
+    """
+    contracts_file = utils.get_database_file(drive, "contracts.json")
+    contratos = utils.read_data(contracts_file)
+    convertidos_contratos = 0
+    for contrato in contratos:
+        alterados = [_migrar_campo(item, 'valor_unitario') for item in contrato.get('itens_contrato', [])]
+        alterados += [_migrar_campo(contrato, campo) for campo in ('valor_entrega', 'valor_recolha')]
+        convertidos_contratos += any(alterados)
+    if convertidos_contratos:
+        utils.write_data(contracts_file, contratos)
+
+    invoices_file = utils.get_database_file(drive, "invoices.json")
+    faturas = utils.read_data(invoices_file)
+    convertidas_faturas = sum(_migrar_campo(fatura, 'valor_total') for fatura in faturas)
+    if convertidas_faturas:
+        utils.write_data(invoices_file, faturas)
+    return {"contracts.json": convertidos_contratos, "invoices.json": convertidas_faturas}
+
+
+if __name__ == "__main__":
+    # Uso: python dinheiro.py
+    resumo = migrar_valores(utils.login_gdrive())
+    for nome, quantidade in resumo.items():
+        print(f"{nome}: {quantidade} registro(s) convertido(s) para centavos")
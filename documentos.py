@@ -0,0 +1,164 @@
+# documentos.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import streamlit as st
+
+import dinheiro
+import renderizacao
+import utils
+from settings import get_setting
+
+MIME_DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def _hash_logo():
+    try:
+        with open('assets/logo.png', 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return ""
+
+
+class CacheDocumentos:
+    """
+    Cache dos documentos .docx já gerados, endereçado pelo conteúdo: a chave é o hash dos dados
+    de entrada junto com a versão do modelo e a logo. Mantém até max_bytes em memória (LRU) e,
+    se houver uma pasta configurada, também guarda os arquivos em disco.
+    """
+
+    def __init__(self, max_bytes, pasta=None):
+        self.max_bytes = max_bytes
+        self.pasta = pasta
+        self._entradas = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._hash_logo = _hash_logo()
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+    def chave(self, tipo, versao_modelo, dados):
+        conteudo = json.dumps(dados, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(f"{tipo}|{versao_modelo}|{self._hash_logo}|{conteudo}".encode("utf-8")).hexdigest()
+
+    def get(self, chave):
+        with self._lock:
+            conteudo = self._entradas.get(chave)
+            if conteudo is not None:
+                self._entradas.move_to_end(chave)
+                return conteudo
+        if self.pasta:
+            try:
+                with open(os.path.join(self.pasta, f"{chave}.docx"), "rb") as f:
+                    conteudo = f.read()
+            except FileNotFoundError:
+                return None
+            self._guardar_memoria(chave, conteudo)
+            return conteudo
+        return None
+
+    def put(self, chave, conteudo):
+        self._guardar_memoria(chave, conteudo)
+        if self.pasta:
+            caminho = os.path.join(self.pasta, f"{chave}.docx")
+            temporario = f"{caminho}.{threading.get_ident()}.tmp"
+            with open(temporario, "wb") as f:
+                f.write(conteudo)
+            os.replace(temporario, caminho)
+
+    def _guardar_memoria(self, chave, conteudo):
+        if len(conteudo) > self.max_bytes:
+            return
+        with self._lock:
+            if chave in self._entradas:
+                self._entradas.move_to_end(chave)
+                return
+            self._entradas[chave] = conteudo
+            self._total_bytes += len(conteudo)
+            while self._total_bytes > self.max_bytes:
+                _, removido = self._entradas.popitem(last=False)
+                self._total_bytes -= len(removido)
+
+
+cache = CacheDocumentos(
+    max_bytes=get_setting("documentos", "cache_max_bytes", 32 * 1024 * 1024),
+    pasta=get_setting("documentos", "cache_dir", None),
+)
+
+
+# --- GERAÇÃO DOS DOCUMENTOS ---
+GERADORES = {
+    "contrato": utils.gerar_contrato_docx,
+    "fatura": utils.gerar_fatura_docx,
+}
+VERSOES_MODELO = {
+    "contrato": lambda: utils.VERSAO_MODELO_CONTRATO,
+    "fatura": lambda: utils.VERSAO_MODELO_FATURA,
+}
+
+
+def gerar(tipo, dados):
+    """Gera o documento sem passar pelo cache. É o que roda dentro dos processos de renderização."""
+    return GERADORES[tipo](dados).getvalue()
+
+
+def dados_template_fatura(f):
+    """Monta os dados do modelo de fatura a partir de uma fatura salva (já resolvida por referencias.resolver_fatura)."""
+    return {
+        "NUMERO_FATURA": f.get("numero_fatura"), "DATA_EMISSAO": datetime.fromisoformat(f.get("data_emissao")).strftime('%d/%m/%Y'),
+        "NOME_CLIENTE": f['cliente_info']['nome_razao_social'], "CNPJ_CLIENTE": f['cliente_info']['cpf_cnpj'],
+        "ENDERECO_CLIENTE": f['cliente_info']['endereco'], "NUMERO_CONTRATO": f['contrato_info']['numero'],
+        "FORMA_PAGAMENTO": f.get("forma_pagamento"), "DATA_VENCIMENTO": datetime.fromisoformat(f.get("data_vencimento")).strftime('%d/%m/%Y'),
+        "DESCRICAO_SERVICO": f.get("descricao_servico"), "VALOR_TOTAL": dinheiro.formatar(dinheiro.centavos(f, 'valor_total')), "OBSERVACAO": f.get("observacao"),
+        "BAIRRO_CLIENTE": "", "CIDADE_CLIENTE": f['cliente_info']['cidade'], "CEP_CLIENTE": f['cliente_info']['cep']
+    }
+
+
+def chave_documento(tipo, dados):
+    return cache.chave(tipo, VERSOES_MODELO[tipo](), dados)
+
+
+# --- COMPONENTE DE DOWNLOAD DE UMA TAREFA EM SEGUNDO PLANO ---
+def exibir_download(tarefa, label, file_name):
+    """
+    Mostra o andamento de uma tarefa de renderização e, quando ela termina, o botão de download.
+    Enquanto a tarefa está em andamento apenas este trecho da página é atualizado (a cada segundo).
+    """
+    em_andamento = not tarefa.finalizada()
+
+    @st.fragment(run_every=1.0 if em_andamento else None)
+    def painel():
+        if not tarefa.finalizada():
+            st.info(f"⏳ {tarefa.descricao_estado()}")
+        elif em_andamento:
+            # Terminou durante a atualização parcial: recarrega a página para parar a atualização periódica
+            st.rerun(scope="app")
+        elif tarefa.estado == renderizacao.CONCLUIDA:
+            st.download_button(label, data=tarefa.resultado(), file_name=file_name, mime=MIME_DOCX)
+        else:
+            st.error(f"Não foi possível gerar o documento: {tarefa.descricao_estado()}")
+
+    painel()
+
+
+# --- GERAÇÃO SOB DEMANDA ---
+def exibir_documento_sob_demanda(tipo, montar_dados, label, file_name, key):
+    """
+    Botão que pede o documento ao pool de renderização; com o pedido feito, mostra o andamento e
+    depois o download (ver exibir_download). A tarefa fica na sessão: a página continua respondendo
+    enquanto o documento é gerado, e um documento já gerado antes sai do cache na hora.
+    """
+    chave_sessao = f"tarefa_{key}"
+    tarefa = st.session_state.get(chave_sessao)
+    if tarefa is None:
+        if not st.button(label, key=key, use_container_width=True):
+            return
+        tarefa = st.session_state[chave_sessao] = renderizacao.servico.submeter_interativo(tipo, montar_dados())
+    exibir_download(tarefa, "Baixar (.docx)", file_name)
+    # Como nos demais downloads, o botão aparece uma única vez depois que o documento fica pronto
+    if tarefa.finalizada():
+        del st.session_state[chave_sessao]
@@ -0,0 +1,296 @@
+# drive_local.py
+import copy
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+from pydrive2.files import ApiRequestError
+
+from settings import get_setting
+
+# Condições de busca entendidas por ListFile (as mesmas usadas pelo storage)
+_CONDICAO = re.compile(r"(\w+)\s*=\s*('(?:[^'\\]|\\.)*'|true|false)")
+
+
+def _erro_http(status, motivo, mensagem):
+    conteudo = {"error": {"code": status, "message": mensagem, "errors": [{"reason": motivo, "message": mensagem}]}}
+    return HttpError(httplib2.Response({"status": status, "reason": motivo}), json.dumps(conteudo).encode("utf-8"))
+
+
+# --- EMULADOR ---
+class DriveLocal:
+    """
+    Substituto local do GoogleDrive do pydrive2, para rodar o app, scripts e medições sem o serviço.
+    Implementa a parte da API usada pelo storage: ListFile (busca por título e lixeira), CreateFile,
+    FetchMetadata, FetchContent, GetContentString/SetContentString, Upload, Trash e o upload
+    condicional por etag (If-Match), com md5Checksum, modifiedDate, etag e version como no Drive.
+
+    Os arquivos ficam em memória ou, com `pasta`, em disco (um arquivo por ID mais um índice de
+    metadados), sobrevivendo a reinícios; a pasta deve ser usada por um processo de cada vez.
+    Cada chamada ao "serviço" espera `latencia` segundos (± `variacao_latencia`) e falha com
+    probabilidade `taxa_falhas`, com o mesmo erro transitório (503) do Drive; com `semente` as
+    falhas e a variação da latência se repetem de uma execução para outra. `chamadas` conta as
+    chamadas por tipo, para medir as idas ao serviço de cada página.
+    """
+
+    def __init__(self, pasta=None, latencia=0.0, variacao_latencia=0.0, taxa_falhas=0.0, semente=None):
+        self.pasta = pasta
+        self.latencia = latencia
+        self.variacao_latencia = variacao_latencia
+        self.taxa_falhas = taxa_falhas
+        self.chamadas = Counter()
+        self.auth = _AuthLocal(self)
+        self._aleatorio = random.Random(semente)
+        self._lock = threading.RLock()
+        self._metadados = {}
+        self._conteudos = {}
+        self._ultima_alteracao = datetime.now(timezone.utc)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+            try:
+                with open(self._caminho_indice(), encoding="utf-8") as f:
+                    self._metadados = json.load(f)
+            except FileNotFoundError:
+                pass
+
+    # --- Simulação do serviço ---
+    def _chamada(self, tipo):
+        """Registra uma ida ao serviço, aplicando a latência e as falhas configuradas."""
+        with self._lock:
+            self.chamadas[tipo] += 1
+            espera = max(0.0, self.latencia + self._aleatorio.uniform(-1, 1) * self.variacao_latencia)
+            falhou = self._aleatorio.random() < self.taxa_falhas
+        if espera:
+            time.sleep(espera)
+        if falhou:
+            raise _erro_http(503, "backendError", f"Falha simulada em {tipo}")
+
+    def zerar_contadores(self):
+        with self._lock:
+            self.chamadas.clear()
+
+    # --- Persistência ---
+    def _caminho_indice(self):
+        return os.path.join(self.pasta, "metadados.json")
+
+    def _salvar_indice(self):
+        if not self.pasta:
+            return
+        temporario = f"{self._caminho_indice()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self._metadados, f, indent=4)
+        os.replace(temporario, self._caminho_indice())
+
+    def _ler_conteudo(self, file_id):
+        if not self.pasta:
+            return self._conteudos.get(file_id, b"")
+        try:
+            with open(os.path.join(self.pasta, file_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return b""
+
+    def _gravar_conteudo(self, file_id, conteudo):
+        if not self.pasta:
+            self._conteudos[file_id] = conteudo
+            return
+        caminho = os.path.join(self.pasta, file_id)
+        with open(f"{caminho}.tmp", "wb") as f:
+            f.write(conteudo)
+        os.replace(f"{caminho}.tmp", caminho)
+
+    def _agora(self):
+        # modifiedDate sempre cresce, mesmo com duas gravações no mesmo milissegundo
+        agora = max(datetime.now(timezone.utc), self._ultima_alteracao + timedelta(milliseconds=1))
+        self._ultima_alteracao = agora
+        return agora.strftime("%Y-%m-%dT%H:%M:%S.") + f"{agora.microsecond // 1000:03d}Z"
+
+    # --- Operações (chamadas pelos arquivos) ---
+    def _metadados_de(self, file_id):
+        with self._lock:
+            metadados = self._metadados.get(file_id)
+            if metadados is None:
+                raise ApiRequestError(_erro_http(404, "notFound", f"File not found: {file_id}"))
+            return copy.deepcopy(metadados)
+
+    def _gravar(self, metadados, conteudo, etag_esperada=None):
+        """Cria ou atualiza um arquivo. Com etag_esperada, só grava se o arquivo ainda estiver nela."""
+        with self._lock:
+            file_id = metadados.get("id")
+            atual = self._metadados.get(file_id) if file_id else None
+            if etag_esperada is not None and (atual is None or atual["etag"] != etag_esperada):
+                raise _erro_http(412, "conditionNotMet", "Precondition Failed")
+            agora = self._agora()
+            if atual is None:
+                file_id = file_id or uuid.uuid4().hex
+                atual = {
+                    "id": file_id, "title": "", "mimeType": "application/octet-stream",
+                    "labels": {"trashed": False}, "createdDate": agora, "version": 0,
+                }
+            for campo in ("title", "mimeType"):
+                if metadados.get(campo):
+                    atual[campo] = metadados[campo]
+            if conteudo is not None:
+                self._gravar_conteudo(file_id, conteudo)
+                atual["md5Checksum"] = hashlib.md5(conteudo).hexdigest()
+                atual["fileSize"] = str(len(conteudo))
+            atual["version"] += 1
+            atual["modifiedDate"] = agora
+            atual["etag"] = f'"{file_id}/{atual["version"]}"'
+            atual["downloadUrl"] = f"local://{file_id}"
+            self._metadados[file_id] = atual
+            self._salvar_indice()
+            return copy.deepcopy(atual)
+
+    def _enviar_para_lixeira(self, file_id):
+        with self._lock:
+            metadados = self._metadados.get(file_id)
+            if metadados is None:
+                raise ApiRequestError(_erro_http(404, "notFound", f"File not found: {file_id}"))
+            metadados["labels"] = {"trashed": True}
+            metadados["modifiedDate"] = self._agora()
+            self._salvar_indice()
+            return copy.deepcopy(metadados)
+
+    def _listar(self, q):
+        condicoes = {campo: valor.strip("'").replace("\\'", "'") for campo, valor in _CONDICAO.findall(q or "")}
+        with self._lock:
+            encontrados = []
+            for metadados in self._metadados.values():
+                if "title" in condicoes and metadados["title"] != condicoes["title"]:
+                    continue
+                if "trashed" in condicoes and metadados["labels"]["trashed"] != (condicoes["trashed"] == "true"):
+                    continue
+                encontrados.append(copy.deepcopy(metadados))
+            return encontrados
+
+    # --- API do GoogleDrive ---
+    def ListFile(self, param=None):
+        return _ListaLocal(self, (param or {}).get("q"))
+
+    def CreateFile(self, metadata=None):
+        return ArquivoLocal(self, metadata)
+
+
+class _ListaLocal:
+    def __init__(self, drive, q):
+        self.drive = drive
+        self.q = q
+
+    def GetList(self):
+        try:
+            self.drive._chamada("list")
+        except HttpError as e:
+            raise ApiRequestError(e)
+        return [ArquivoLocal(self.drive, metadados, carregado=True) for metadados in self.drive._listar(self.q)]
+
+
+class ArquivoLocal(dict):
+    """Equivalente ao GoogleDriveFile: metadados no próprio dicionário e o conteúdo em `content`."""
+
+    def __init__(self, drive, metadata=None, carregado=False):
+        super().__init__(metadata or {})
+        self.drive = drive
+        self.auth = drive.auth
+        self.content = None
+        self.metadata_fetched = carregado
+
+    def _chamada(self, tipo):
+        try:
+            self.drive._chamada(tipo)
+        except HttpError as e:
+            raise ApiRequestError(e)
+
+    def UpdateMetadata(self, metadata=None):
+        self.update(metadata or {})
+
+    def FetchMetadata(self, fields=None, fetch_all=False):
+        self._chamada("metadata")
+        self.update(self.drive._metadados_de(self["id"]))
+        self.metadata_fetched = True
+
+    def FetchContent(self, mimetype=None, remove_bom=False):
+        self._chamada("download")
+        self.content = io.BytesIO(self.drive._ler_conteudo(self["id"]))
+
+    def GetContentString(self, mimetype=None, encoding="utf-8", remove_bom=False):
+        if self.content is None:
+            self.FetchContent()
+        texto = self.content.getvalue().decode(encoding)
+        return texto.lstrip("\ufeff") if remove_bom else texto
+
+    def SetContentString(self, content, encoding="utf-8"):
+        self.content = io.BytesIO(content.encode(encoding))
+
+    def Upload(self, param=None):
+        self._chamada("upload")
+        conteudo = self.content.getvalue() if self.content is not None else None
+        self.update(self.drive._gravar(self, conteudo))
+
+    def Trash(self, param=None):
+        self._chamada("trash")
+        self.update(self.drive._enviar_para_lixeira(self["id"]))
+
+
+# --- UPLOAD CONDICIONAL ---
+# O storage grava com If-Match chamando auth.service.files().update(...).execute(http=...), como na
+# API do Drive; as classes abaixo atendem essa mesma chamada, respondendo 412 quando a etag mudou.
+class _AuthLocal:
+    def __init__(self, drive):
+        self.service = _ServicoLocal(drive)
+        self.thread_local = threading.local()
+
+    def Get_Http_Object(self):
+        return None
+
+
+class _ServicoLocal:
+    def __init__(self, drive):
+        self.drive = drive
+
+    def files(self):
+        return self
+
+    def update(self, fileId, media_body=None, body=None, **_):
+        return _RequisicaoLocal(self.drive, fileId, media_body, body)
+
+
+class _RequisicaoLocal:
+    def __init__(self, drive, file_id, media_body, body):
+        self.drive = drive
+        self.file_id = file_id
+        self.media_body = media_body
+        self.body = body or {}
+        self.headers = {}
+
+    def execute(self, http=None):
+        self.drive._chamada("upload")
+        conteudo = self.media_body.getbytes(0, self.media_body.size()) if self.media_body is not None else None
+        metadados = dict(self.body, id=self.file_id)
+        return self.drive._gravar(metadados, conteudo, etag_esperada=self.headers.get("If-Match"))
+
+
+# --- CONFIGURAÇÃO ---
+def ativo():
+    return get_setting("drive_local", "ativo", False)
+
+
+def criar_de_configuracao():
+    """DriveLocal configurado pela seção [drive_local] (ver README)."""
+    return DriveLocal(
+        pasta=get_setting("drive_local", "pasta", ".cache/drive_local") or None,
+        latencia=get_setting("drive_local", "latencia", 0.0),
+        variacao_latencia=get_setting("drive_local", "variacao_latencia", 0.0),
+        taxa_falhas=get_setting("drive_local", "taxa_falhas", 0.0),
+        semente=get_setting("drive_local", "semente", 0),
+    )
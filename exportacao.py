@@ -0,0 +1,151 @@
+# exportacao.py
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import time
+import zipfile
+
+import documentos
+import renderizacao
+from settings import get_setting
+
+PASTA_EXPORTACOES = get_setting("exportacao", "pasta", ".cache/exportacoes")
+
+CAMPOS_MANIFESTO = ["tipo", "numero", "cliente", "data", "status", "arquivo", "sha256"]
+
+
+# --- SELEÇÃO DOS DOCUMENTOS ---
+def selecionar_contratos(contratos, inicio, fim, status=None):
+    """Contratos com data de geração no período [inicio, fim] e, se informado, com um dos status."""
+    return [
+        c for c in contratos
+        if inicio.isoformat() <= c['data_geracao'] <= fim.isoformat() and (not status or c.get('status') in status)
+    ]
+
+
+def selecionar_faturas(faturas, inicio, fim, status=None):
+    """Faturas com data de emissão no período [inicio, fim] e, se informado, com um dos status."""
+    return [
+        f for f in faturas
+        if inicio.isoformat() <= f['data_emissao'] <= fim.isoformat() and (not status or f.get('status') in status)
+    ]
+
+
+def _nome_seguro(texto):
+    return re.sub(r'[^\w\-]+', '_', texto, flags=re.UNICODE).strip('_')
+
+
+def montar_itens(contratos, faturas):
+    """Converte contratos e faturas na lista de documentos da exportação (tipo, dados do modelo, linha do manifesto)."""
+    itens = []
+    for c in contratos:
+        itens.append(("contrato", c, {
+            "tipo": "contrato", "numero": c['numero_contrato'], "cliente": c['cliente']['nome_razao_social'],
+            "data": c['data_geracao'], "status": c.get('status', ''),
+            "arquivo": f"contratos/CONTRATO_{_nome_seguro(c['numero_contrato'])}_{_nome_seguro(c['cliente']['nome_razao_social'])}.docx",
+        }))
+    for f in faturas:
+        itens.append(("fatura", documentos.dados_template_fatura(f), {
+            "tipo": "fatura", "numero": f['numero_fatura'], "cliente": f['cliente_info']['nome_razao_social'],
+            "data": f['data_emissao'], "status": f.get('status', ''),
+            "arquivo": f"faturas/FATURA_{_nome_seguro(f['numero_fatura'])}.docx",
+        }))
+    return itens
+
+
+# --- EXPORTAÇÃO ---
+def pasta_trabalho(itens):
+    """Pasta de trabalho de uma exportação. A mesma seleção sempre cai na mesma pasta, o que permite retomar."""
+    assinatura = hashlib.sha256(
+        json.dumps([(tipo, dados, linha) for tipo, dados, linha in itens], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    return os.path.join(PASTA_EXPORTACOES, assinatura)
+
+
+def exportar_zip(itens, progresso=None, em_paralelo=None):
+    """
+    Gera todos os documentos e os reúne em um único ZIP com um manifesto CSV. Retorna o caminho do ZIP.
+
+    Os documentos são gerados em paralelo no pool de renderizacao.py, com no máximo `em_paralelo`
+    deles em memória ao mesmo tempo; cada um é gravado em disco na pasta de trabalho assim que fica
+    pronto. Se a exportação for interrompida, chamá-la de novo com os mesmos itens reaproveita os
+    documentos já gravados. progresso(concluidos, total) é chamado a cada documento.
+    """
+    pasta = pasta_trabalho(itens)
+    pasta_partes = os.path.join(pasta, "partes")
+    os.makedirs(pasta_partes, exist_ok=True)
+    caminho_zip = os.path.join(pasta, "exportacao.zip")
+    if os.path.exists(caminho_zip):
+        if progresso:
+            progresso(len(itens), len(itens))
+        return caminho_zip
+
+    em_paralelo = em_paralelo or max(2, renderizacao.servico.processos * 2)
+
+    def caminho_parte(linha):
+        return os.path.join(pasta_partes, linha["arquivo"].replace("/", "__"))
+
+    pendentes = [item for item in itens if not os.path.exists(caminho_parte(item[2]))]
+    concluidos = len(itens) - len(pendentes)
+    if progresso:
+        progresso(concluidos, len(itens))
+
+    em_andamento = []
+    while pendentes or em_andamento:
+        # Mantém a fila do pool abastecida sem passar do limite de documentos em memória
+        while pendentes and len(em_andamento) < em_paralelo:
+            tipo, dados, linha = pendentes[0]
+            try:
+                em_andamento.append((renderizacao.servico.submeter(tipo, dados), linha))
+            except renderizacao.FilaCheia:
+                break
+            pendentes.pop(0)
+        if not em_andamento:
+            # Fila do pool ocupada por outras sessões: espera uma vaga
+            time.sleep(0.2)
+            continue
+
+        restantes = []
+        for tarefa, linha in em_andamento:
+            if not tarefa.finalizada():
+                restantes.append((tarefa, linha))
+                continue
+            if tarefa.estado != renderizacao.CONCLUIDA:
+                raise RuntimeError(f"Falha ao gerar {linha['arquivo']}: {tarefa.descricao_estado()}")
+            destino = caminho_parte(linha)
+            with open(f"{destino}.tmp", "wb") as f:
+                f.write(tarefa.resultado())
+            os.replace(f"{destino}.tmp", destino)
+            concluidos += 1
+            if progresso:
+                progresso(concluidos, len(itens))
+        if len(restantes) == len(em_andamento):
+            time.sleep(0.05)
+        em_andamento = restantes
+
+    _montar_zip(itens, caminho_parte, caminho_zip)
+    shutil.rmtree(pasta_partes)
+    return caminho_zip
+
+
+def _montar_zip(itens, caminho_parte, caminho_zip):
+    # Copia os documentos para o ZIP em blocos, sem carregar todos na memória
+    manifesto = io.StringIO()
+    escritor = csv.DictWriter(manifesto, fieldnames=CAMPOS_MANIFESTO)
+    escritor.writeheader()
+    temporario = f"{caminho_zip}.tmp"
+    with zipfile.ZipFile(temporario, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for _, _, linha in itens:
+            origem = caminho_parte(linha)
+            sha256 = hashlib.sha256()
+            with open(origem, "rb") as entrada, zf.open(linha["arquivo"], "w") as saida:
+                for bloco in iter(lambda: entrada.read(1024 * 1024), b""):
+                    sha256.update(bloco)
+                    saida.write(bloco)
+            escritor.writerow(dict(linha, sha256=sha256.hexdigest()))
+        zf.writestr("manifesto.csv", manifesto.getvalue().encode("utf-8-sig"))
+    os.replace(temporario, caminho_zip)
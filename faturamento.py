@@ -0,0 +1,184 @@
+# faturamento.py
+import calendar
+import uuid
+from datetime import date, datetime
+
+import dinheiro
+import numeracao
+import storage
+import utils
+
+# Marca das faturas lançadas pelo faturamento mensal (as lançadas à mão não têm `competencia`)
+ORIGEM_FATURAMENTO_MENSAL = "faturamento_mensal"
+
+# Namespace dos IDs das faturas mensais: o mesmo contrato na mesma competência sempre gera o
+# mesmo id_fatura, então uma competência repetida substitui a fatura em vez de duplicá-la
+_NAMESPACE_FATURAS = uuid.UUID("4f6c1d0e-2b7a-4c55-9a8e-6d3f1b2c9e71")
+
+
+def competencia(mes):
+    """Competência (mês de referência) no formato 'AAAA-MM'."""
+    return f"{mes.year:04d}-{mes.month:02d}"
+
+
+def id_fatura_mensal(id_contrato, comp):
+    return str(uuid.uuid5(_NAMESPACE_FATURAS, f"{id_contrato}:{comp}"))
+
+
+def valor_mensal(contrato):
+    """Soma de quantidade × valor unitário mensal dos itens do contrato, em centavos."""
+    return dinheiro.somar(dinheiro.totais_itens(contrato.get('itens_contrato', [])))
+
+
+def _data_inicio(contrato):
+    try:
+        return datetime.strptime(contrato.get('data_inicio') or "", "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+# --- PLANEJAMENTO (SIMULAÇÃO) ---
+class ItemFaturamento:
+    """Uma linha do faturamento: o contrato e o valor calculado (em centavos), ou o motivo de ter ficado de fora."""
+
+    def __init__(self, contrato, valor=0, dias=0, dias_no_mes=0, frete=0, motivo=None):
+        self.contrato = contrato
+        self.valor = valor
+        self.dias = dias
+        self.dias_no_mes = dias_no_mes
+        self.frete = frete
+        self.motivo = motivo
+
+    @property
+    def faturar(self):
+        return self.motivo is None
+
+    def resumo(self):
+        """Linha da prévia exibida antes de confirmar o faturamento."""
+        return {
+            "Contrato": self.contrato['numero_contrato'],
+            "Cliente": self.contrato['cliente']['nome_razao_social'],
+            "Dias": f"{self.dias}/{self.dias_no_mes}" if self.faturar else "",
+            "Locação": dinheiro.formatar_reais(self.valor - self.frete) if self.faturar else None,
+            "Frete": dinheiro.formatar_reais(self.frete) if self.faturar else None,
+            "Total": dinheiro.formatar_reais(self.valor) if self.faturar else None,
+            "Situação": "A faturar" if self.faturar else self.motivo,
+        }
+
+
+def calcular_item(contrato, mes, competencias_faturadas, mensal=None):
+    """
+    Calcula o valor do contrato na competência de `mes`: aluguel mensal proporcional aos dias
+    desde a data de início (no mês em que a locação começa) mais o frete de entrega, que é
+    cobrado junto com o primeiro mês. `mensal` é o valor mensal já calculado, em centavos.
+    """
+    comp = competencia(mes)
+    if (contrato['id_contrato'], comp) in competencias_faturadas:
+        return ItemFaturamento(contrato, motivo="Já faturado nesta competência")
+    inicio = _data_inicio(contrato)
+    if inicio is None:
+        return ItemFaturamento(contrato, motivo="Data de início inválida")
+
+    dias_no_mes = calendar.monthrange(mes.year, mes.month)[1]
+    primeiro_dia, ultimo_dia = date(mes.year, mes.month, 1), date(mes.year, mes.month, dias_no_mes)
+    if inicio > ultimo_dia:
+        return ItemFaturamento(contrato, motivo="Locação começa depois desta competência")
+    dias = (ultimo_dia - max(inicio, primeiro_dia)).days + 1
+
+    if mensal is None:
+        mensal = valor_mensal(contrato)
+    frete = dinheiro.centavos(contrato, 'valor_entrega') if inicio >= primeiro_dia else 0
+    valor = dinheiro.proporcional(mensal, dias, dias_no_mes) + frete
+    if valor <= 0:
+        return ItemFaturamento(contrato, motivo="Contrato sem valor a faturar")
+    return ItemFaturamento(contrato, valor, dias, dias_no_mes, frete)
+
+
+def planejar(contratos, faturas, mes):
+    """
+    Simulação do faturamento da competência: um ItemFaturamento por contrato de locação ativo.
+    Não grava nada; contratos já faturados na competência aparecem com o motivo.
+    """
+    faturadas = {(f.get('id_contrato'), f.get('competencia')) for f in faturas if f.get('competencia')}
+    locacoes = [c for c in contratos if c.get('status') == 'Ativo' and c.get('tipo_contrato') == 'Locação']
+    mensais = dinheiro.totais_mensais(locacoes)
+    return [calcular_item(c, mes, faturadas, int(mensal)) for c, mensal in zip(locacoes, mensais)]
+
+
+_planos = utils.CachePorVersao()
+
+
+def planejar_por_versao(datasets, contratos, faturas, mes):
+    """
+    planejar() guardado por competência junto com as versões dos datasets de onde vieram os
+    contratos e as faturas: as interações da página não refazem a simulação, só uma gravação nelas.
+    """
+    versoes = tuple(utils.versao_dataset(d) for d in datasets)
+    versao = None if None in versoes else versoes
+    return _planos.obter(competencia(mes), versao, lambda: planejar(contratos, faturas, mes))
+
+
+# --- EXECUÇÃO ---
+def montar_fatura(item, numero, mes, emissao, vencimento, forma_pagamento):
+    contrato = item.contrato
+    comp = competencia(mes)
+    return {
+        "id_fatura": id_fatura_mensal(contrato['id_contrato'], comp),
+        "numero_fatura": numero,
+        "id_contrato": contrato['id_contrato'],
+        "status": "Pendente",
+        "data_emissao": emissao.isoformat(),
+        "data_vencimento": vencimento.isoformat(),
+        "descricao_servico": f"Referente a locação do contrato {contrato['numero_contrato']} - competência {mes.month:02d}/{mes.year}",
+        "valor_total_centavos": item.valor,
+        "forma_pagamento": forma_pagamento,
+        "observacao": "",
+        "cliente_id": contrato['cliente']['id'],
+        "contrato_info": {"numero": contrato['numero_contrato']},
+        "competencia": comp,
+        "origem": ORIGEM_FATURAMENTO_MENSAL,
+    }
+
+
+def executar(drive, invoices_file, itens, mes, vencimento, forma_pagamento, usuario=None):
+    """
+    Lança as faturas dos itens a faturar: reserva todos os números de uma vez e grava todas as
+    faturas em um único apply() no invoices.json. Faturas que já existem são deixadas como estão:
+    o invoices.json é relido (não vale o estado de quando a página abriu) e as entradas são
+    "create_new", que o backend ignora se o id_fatura (fixo por contrato e competência) já
+    existir no momento da gravação. Assim repetir o faturamento, ou outra sessão tê-lo feito no
+    meio, não sobrescreve o status nem o número das faturas lançadas.
+    Retorna só as faturas gravadas por esta execução (conferidas relendo o invoices.json); os
+    números reservados para as que outra sessão lançou no meio são registrados como lacunas.
+    """
+    backend = invoices_file.backend
+    faturas_atuais = backend.read(backend.open(drive, invoices_file.nome))
+    existentes = {f['id_fatura'] for f in faturas_atuais}
+    faturadas = {(f.get('id_contrato'), f.get('competencia')) for f in faturas_atuais if f.get('competencia')}
+    comp = competencia(mes)
+    itens = [
+        i for i in itens
+        if i.faturar
+        and (i.contrato['id_contrato'], comp) not in faturadas
+        and id_fatura_mensal(i.contrato['id_contrato'], comp) not in existentes
+    ]
+    if not itens:
+        return []
+
+    numeros = numeracao.alocador_faturas.reservar(drive, len(itens))
+    emissao = date.today()
+    faturas = [
+        montar_fatura(item, str(numero).zfill(7), mes, emissao, vencimento, forma_pagamento)
+        for item, (numero, _) in zip(itens, numeros)
+    ]
+    lancadas = []
+    if backend.apply(invoices_file, [storage.nova_entrada("create_new", f['id_fatura'], f, usuario) for f in faturas]):
+        gravadas = {f['id_fatura']: f for f in backend.read(backend.open(drive, invoices_file.nome))}
+        lancadas = [f for f in faturas if gravadas.get(f['id_fatura'], {}).get('numero_fatura') == f['numero_fatura']]
+    ids_lancadas = {f['id_fatura'] for f in lancadas}
+    numeracao.alocador_faturas.registrar_lacunas(
+        drive,
+        [numero for f, numero in zip(faturas, numeros) if f['id_fatura'] not in ids_lancadas],
+        "faturamento mensal: fatura lançada por outra sessão",
+    )
+    return lancadas
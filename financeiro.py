@@ -0,0 +1,185 @@
+# financeiro.py
+import threading
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import dinheiro
+import indices
+
+STATUS_FATURA = ("Pendente", "Liquidada", "Cancelada")
+
+# Faixas de atraso das faturas pendentes, em dias depois do vencimento (limite superior de cada faixa)
+FAIXAS_ATRASO = (("A vencer", 0), ("1 a 30 dias", 30), ("31 a 60 dias", 60), ("61 a 90 dias", 90), ("Mais de 90 dias", None))
+
+# Colunas de cada linha da tabela de faturas usada pelos agregados (valor em centavos)
+COLUNAS = ("id_fatura", "mes", "cliente", "contrato", "status", "vencimento", "valor")
+
+# Tabelas agregadas: nome → colunas que formam a chave (todas terminam em status, exceto "vencimento",
+# que só conta as faturas pendentes e serve ao cálculo de atraso)
+TABELAS = {
+    "mes": ("mes", "status"),
+    "cliente": ("cliente", "status"),
+    "contrato": ("contrato", "status"),
+    "cliente_mes": ("cliente", "mes", "status"),
+    "vencimento": ("vencimento", "cliente"),
+}
+
+
+def valor_fatura(fatura):
+    """Valor da fatura em centavos (0 se o valor antigo estiver ilegível)."""
+    try:
+        return dinheiro.centavos(fatura, 'valor_total')
+    except ValueError:
+        return 0
+
+
+def cliente_da_fatura(fatura):
+    # Faturas antigas guardam a cópia do cliente em vez da referência
+    return fatura.get('cliente_id') or fatura.get('cliente_info', {}).get('id') or ""
+
+
+def _linha(fatura):
+    return (
+        fatura['id_fatura'],
+        (fatura.get('data_emissao') or "")[:7],
+        cliente_da_fatura(fatura),
+        fatura.get('id_contrato') or "",
+        fatura.get('status') or "",
+        fatura.get('data_vencimento') or "",
+        valor_fatura(fatura),
+    )
+
+
+# --- AGREGADOS DAS FATURAS ---
+class AgregadosFaturas:
+    """
+    Totais das faturas (quantidade e valor em centavos) por mês, cliente, contrato e status, e das faturas
+    pendentes por data de vencimento, montados uma vez por versão do invoices.json.
+    A montagem inicial é vetorizada (pandas); depois cada fatura criada ou alterada por esta sessão
+    só soma/subtrai a sua parcela nas tabelas, sem percorrer as demais.
+    """
+
+    def __init__(self, faturas=(), versao=None):
+        self.versao = versao
+        self._lock = threading.RLock()
+        self._linhas = {}
+        self._faturas_por_contrato = defaultdict(set)
+        self._cliente_do_contrato = {}
+        self._tabelas = {nome: {} for nome in TABELAS}
+        self._montar(faturas)
+
+    def _montar(self, faturas):
+        df = pd.DataFrame.from_records([_linha(f) for f in faturas], columns=COLUNAS)
+        if df.empty:
+            return
+        self._linhas = {linha[0]: linha[1:] for linha in df.itertuples(index=False, name=None)}
+        for id_fatura, contrato, cliente in zip(df["id_fatura"], df["contrato"], df["cliente"]):
+            self._faturas_por_contrato[contrato].add(id_fatura)
+            self._cliente_do_contrato[contrato] = cliente
+        for nome, chave in TABELAS.items():
+            origem = df[df["status"] == "Pendente"] if nome == "vencimento" else df
+            grupos = origem.groupby(list(chave), sort=False)["valor"].agg(["size", "sum"])
+            self._tabelas[nome] = {
+                k: [int(n), int(v)] for k, n, v in zip(grupos.index, grupos["size"], grupos["sum"])
+            }
+
+    @staticmethod
+    def _chaves(linha):
+        valores = dict(zip(COLUNAS[1:], linha))
+        for nome, chave in TABELAS.items():
+            if nome == "vencimento" and valores["status"] != "Pendente":
+                continue
+            yield nome, tuple(valores[c] for c in chave)
+
+    def _somar(self, linha, sinal):
+        for nome, chave in self._chaves(linha):
+            tabela = self._tabelas[nome]
+            total = tabela.setdefault(chave, [0, 0])
+            total[0] += sinal
+            total[1] += sinal * linha[-1]
+            if total[0] == 0:
+                del tabela[chave]
+
+    # --- Atualização incremental ---
+    def adicionar(self, fatura):
+        with self._lock:
+            self.remover(fatura['id_fatura'])
+            linha = _linha(fatura)
+            self._linhas[linha[0]] = linha[1:]
+            self._faturas_por_contrato[linha[3]].add(linha[0])
+            self._cliente_do_contrato[linha[3]] = linha[2]
+            self._somar(linha[1:], 1)
+
+    def alterar_status(self, id_fatura, status):
+        with self._lock:
+            linha = self._linhas.get(id_fatura)
+            if linha is None:
+                return
+            self._somar(linha, -1)
+            linha = linha[:3] + (status,) + linha[4:]
+            self._linhas[id_fatura] = linha
+            self._somar(linha, 1)
+
+    def remover(self, id_fatura):
+        with self._lock:
+            linha = self._linhas.pop(id_fatura, None)
+            if linha is not None:
+                self._somar(linha, -1)
+                self._faturas_por_contrato[linha[2]].discard(id_fatura)
+
+    # --- Consultas ---
+    def tabela(self, nome, **filtros):
+        """
+        Tabela agregada como DataFrame (colunas da chave + quantidade + valor).
+        Os filtros restringem colunas da chave, ex.: tabela("cliente_mes", cliente=id_cliente).
+        """
+        with self._lock:
+            itens = [(*chave, n, v) for chave, (n, v) in self._tabelas[nome].items()]
+        df = pd.DataFrame.from_records(itens, columns=(*TABELAS[nome], "quantidade", "valor"))
+        df = df.astype({"quantidade": "int64", "valor": "int64"})
+        for coluna, valor in filtros.items():
+            df = df[df[coluna] == valor]
+        return df
+
+    def por_status(self, nome, **filtros):
+        """Valores de uma tabela com um status por coluna (linhas = demais colunas da chave)."""
+        df = self.tabela(nome, **filtros)
+        linhas = [c for c in TABELAS[nome] if c != "status" and c not in filtros]
+        tabela = df.pivot_table(index=linhas, columns="status", values="valor", aggfunc="sum", fill_value=0)
+        return tabela.reindex(columns=list(STATUS_FATURA), fill_value=0)
+
+    def totais(self, **filtros):
+        """Quantidade e valor por status (no geral ou de um cliente/contrato)."""
+        nome = "contrato" if "contrato" in filtros else "cliente"
+        df = self.tabela(nome, **filtros)
+        soma = df.groupby("status")[["quantidade", "valor"]].sum()
+        return soma.reindex(list(STATUS_FATURA), fill_value=0)
+
+    def atraso(self, hoje=None, **filtros):
+        """Valor e quantidade das faturas pendentes por faixa de atraso (FAIXAS_ATRASO)."""
+        df = self.tabela("vencimento", **filtros)
+        faixas = [nome for nome, _ in FAIXAS_ATRASO]
+        if df.empty:
+            return pd.DataFrame({"quantidade": 0, "valor": 0}, index=pd.Index(faixas, name="faixa"))
+        hoje = np.datetime64(hoje or date.today(), "D")
+        vencimentos = pd.to_datetime(df["vencimento"], errors="coerce").to_numpy("datetime64[D]")
+        dias = (hoje - vencimentos).astype("int64")
+        limites = np.array([limite for _, limite in FAIXAS_ATRASO[:-1]])
+        df = df.assign(faixa=np.array(faixas)[np.searchsorted(limites, dias, side="left")])
+        return df.groupby("faixa")[["quantidade", "valor"]].sum().reindex(faixas, fill_value=0)
+
+    def contratos_do_cliente(self, id_cliente):
+        with self._lock:
+            return [c for c, cliente in self._cliente_do_contrato.items() if cliente == id_cliente]
+
+    def faturas_do_contrato(self, id_contrato):
+        with self._lock:
+            return set(self._faturas_por_contrato.get(id_contrato, ()))
+
+
+def agregados_faturas(invoices_file, faturas_data):
+    """Retorna os agregados das faturas, remontando-os só quando a versão do dataset mudou."""
+    return indices.estrutura_do_dataset(AgregadosFaturas, invoices_file, faturas_data)
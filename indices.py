@@ -0,0 +1,327 @@
+# indices.py
+import bisect
+import threading
+from collections import defaultdict
+
+import utils
+
+# Marcador usado como limite superior nas buscas por prefixo em listas ordenadas
+_FIM_PREFIXO = "\uffff"
+
+
+def somente_digitos(texto):
+    return "".join(filter(str.isdigit, texto or ""))
+
+
+def _trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _faixa_prefixo(lista_ordenada, prefixo):
+    inicio = bisect.bisect_left(lista_ordenada, prefixo)
+    fim = bisect.bisect_left(lista_ordenada, prefixo + _FIM_PREFIXO)
+    return lista_ordenada[inicio:fim]
+
+
+def _inserir_ordenado(lista_ordenada, valor):
+    posicao = bisect.bisect_left(lista_ordenada, valor)
+    if posicao == len(lista_ordenada) or lista_ordenada[posicao] != valor:
+        lista_ordenada.insert(posicao, valor)
+
+
+def _remover_ordenado(lista_ordenada, valor):
+    posicao = bisect.bisect_left(lista_ordenada, valor)
+    if posicao < len(lista_ordenada) and lista_ordenada[posicao] == valor:
+        del lista_ordenada[posicao]
+
+
+# --- ÍNDICE DE CLIENTES ---
+class IndiceClientes:
+    """
+    Índice de busca dos clientes, montado uma vez por versão do clients.json.
+    - CPF/CNPJ: só os dígitos, com mapa dígitos → cliente (unicidade em O(1)), lista ordenada
+      (busca por prefixo) e trigramas (busca por trecho do documento);
+    - nome: palavras sem acento e em minúsculas, buscadas por prefixo;
+    - e-mail: em minúsculas, buscado por prefixo.
+    Os clientes podem ser incluídos, alterados ou removidos sem remontar o índice.
+    """
+
+    def __init__(self, clientes=(), versao=None):
+        self.versao = versao
+        self._lock = threading.RLock()
+        self._clientes = {}
+        self._por_documento = {}
+        self._documentos_ordenados = []
+        self._trigramas = defaultdict(set)
+        self._por_palavra = defaultdict(set)
+        self._palavras_ordenadas = []
+        self._por_email = defaultdict(set)
+        self._emails_ordenados = []
+        for cliente in clientes:
+            self._adicionar(cliente)
+
+    @staticmethod
+    def _palavras(cliente):
+        return set(utils.normalizar_texto(cliente.get('nome_razao_social', '')).split())
+
+    def _adicionar(self, cliente):
+        id_cliente = cliente['id']
+        self._clientes[id_cliente] = cliente
+        documento = somente_digitos(cliente.get('cpf_cnpj'))
+        if documento:
+            self._por_documento[documento] = id_cliente
+            _inserir_ordenado(self._documentos_ordenados, documento)
+            for trigrama in _trigramas(documento):
+                self._trigramas[trigrama].add(id_cliente)
+        for palavra in self._palavras(cliente):
+            if not self._por_palavra[palavra]:
+                _inserir_ordenado(self._palavras_ordenadas, palavra)
+            self._por_palavra[palavra].add(id_cliente)
+        email = (cliente.get('email') or '').strip().lower()
+        if email:
+            if not self._por_email[email]:
+                _inserir_ordenado(self._emails_ordenados, email)
+            self._por_email[email].add(id_cliente)
+
+    def _remover(self, id_cliente):
+        cliente = self._clientes.pop(id_cliente, None)
+        if cliente is None:
+            return
+        documento = somente_digitos(cliente.get('cpf_cnpj'))
+        if documento and self._por_documento.get(documento) == id_cliente:
+            del self._por_documento[documento]
+            _remover_ordenado(self._documentos_ordenados, documento)
+            for trigrama in _trigramas(documento):
+                self._trigramas[trigrama].discard(id_cliente)
+        for palavra in self._palavras(cliente):
+            self._por_palavra[palavra].discard(id_cliente)
+            if not self._por_palavra[palavra]:
+                del self._por_palavra[palavra]
+                _remover_ordenado(self._palavras_ordenadas, palavra)
+        email = (cliente.get('email') or '').strip().lower()
+        if email:
+            self._por_email[email].discard(id_cliente)
+            if not self._por_email[email]:
+                del self._por_email[email]
+                _remover_ordenado(self._emails_ordenados, email)
+
+    # --- Atualização incremental ---
+    def adicionar(self, cliente):
+        self.atualizar(cliente)
+
+    def atualizar(self, cliente):
+        with self._lock:
+            self._remover(cliente['id'])
+            self._adicionar(cliente)
+
+    def remover(self, id_cliente):
+        with self._lock:
+            self._remover(id_cliente)
+
+    # --- Consultas ---
+    def documento_cadastrado(self, cpf_cnpj):
+        """Verifica em O(1) se o CPF/CNPJ (com ou sem pontuação) já pertence a algum cliente."""
+        return somente_digitos(cpf_cnpj) in self._por_documento
+
+    def buscar_documento(self, trecho):
+        digitos = somente_digitos(trecho)
+        if not digitos:
+            return []
+        with self._lock:
+            if len(digitos) < 3:
+                ids = {self._por_documento[d] for d in self._documentos_ordenados if digitos in d}
+            else:
+                candidatos = set.intersection(*(self._trigramas.get(t, set()) for t in _trigramas(digitos)))
+                ids = {i for i in candidatos if digitos in somente_digitos(self._clientes[i].get('cpf_cnpj'))}
+            return self._ordenar(ids)
+
+    def buscar_nome(self, texto):
+        palavras = utils.normalizar_texto(texto).split()
+        if not palavras:
+            return []
+        with self._lock:
+            ids = None
+            for palavra in palavras:
+                encontrados = set()
+                for completa in _faixa_prefixo(self._palavras_ordenadas, palavra):
+                    encontrados |= self._por_palavra[completa]
+                ids = encontrados if ids is None else ids & encontrados
+                if not ids:
+                    return []
+            return self._ordenar(ids)
+
+    def buscar_email(self, texto):
+        prefixo = texto.strip().lower()
+        with self._lock:
+            ids = set()
+            for email in _faixa_prefixo(self._emails_ordenados, prefixo):
+                ids |= self._por_email[email]
+            return self._ordenar(ids)
+
+    def buscar(self, texto):
+        """Busca por CPF/CNPJ (se o texto for numérico), e-mail (se tiver @) ou nome."""
+        texto = texto.strip()
+        if "@" in texto:
+            return self.buscar_email(texto)
+        if somente_digitos(texto) and not any(c.isalpha() for c in texto):
+            return self.buscar_documento(texto)
+        return self.buscar_nome(texto)
+
+    def _ordenar(self, ids):
+        clientes = [self._clientes[i] for i in ids]
+        return sorted(clientes, key=lambda c: utils.normalizar_texto(c.get('nome_razao_social', '')))
+
+
+# --- ÍNDICE DE CONTRATOS ---
+class IndiceContratos:
+    """
+    Índice dos filtros da página de gerenciamento de contratos, montado uma vez por versão do contracts.json.
+    - status: conjunto de contratos por status;
+    - data de geração: lista ordenada (data, número, id), que também dá a ordem dos resultados;
+    - texto: trigramas do número do contrato e do nome do cliente (sem acento e em minúsculas).
+    Os filtros são combinados por interseção e o resultado já sai do mais recente para o mais antigo.
+    """
+
+    def __init__(self, contratos=(), versao=None):
+        self.versao = versao
+        self._lock = threading.RLock()
+        self._contratos = {}
+        self._textos_normalizados = {}
+        self._por_status = defaultdict(set)
+        self._por_data = []
+        self._trigramas = defaultdict(set)
+        for contrato in contratos:
+            self._adicionar(contrato)
+
+    @staticmethod
+    def _chave_data(contrato):
+        return (contrato.get('data_geracao', ''), contrato.get('numero_contrato', ''), contrato['id_contrato'])
+
+    @staticmethod
+    def _textos(contrato):
+        return (
+            utils.normalizar_texto(contrato.get('numero_contrato', '')),
+            utils.normalizar_texto(contrato['cliente']['nome_razao_social']),
+        )
+
+    def _adicionar(self, contrato):
+        id_contrato = contrato['id_contrato']
+        self._contratos[id_contrato] = contrato
+        self._por_status[contrato.get('status')].add(id_contrato)
+        _inserir_ordenado(self._por_data, self._chave_data(contrato))
+        self._textos_normalizados[id_contrato] = self._textos(contrato)
+        for texto in self._textos_normalizados[id_contrato]:
+            for trigrama in _trigramas(texto):
+                self._trigramas[trigrama].add(id_contrato)
+
+    def _remover(self, id_contrato):
+        contrato = self._contratos.pop(id_contrato, None)
+        if contrato is None:
+            return
+        self._por_status[contrato.get('status')].discard(id_contrato)
+        _remover_ordenado(self._por_data, self._chave_data(contrato))
+        for texto in self._textos_normalizados.pop(id_contrato):
+            for trigrama in _trigramas(texto):
+                self._trigramas[trigrama].discard(id_contrato)
+                if not self._trigramas[trigrama]:
+                    del self._trigramas[trigrama]
+
+    # --- Atualização incremental ---
+    def adicionar(self, contrato):
+        self.atualizar(contrato)
+
+    def atualizar(self, contrato):
+        with self._lock:
+            self._remover(contrato['id_contrato'])
+            self._adicionar(contrato)
+
+    def alterar_status(self, id_contrato, novo_status):
+        with self._lock:
+            contrato = self._contratos.get(id_contrato)
+            if contrato is not None:
+                self._por_status[contrato.get('status')].discard(id_contrato)
+                contrato = dict(contrato, status=novo_status)
+                self._contratos[id_contrato] = contrato
+                self._por_status[novo_status].add(id_contrato)
+
+    def remover(self, id_contrato):
+        with self._lock:
+            self._remover(id_contrato)
+
+    # --- Consultas ---
+    def _ids_texto(self, texto, candidatos):
+        busca = utils.normalizar_texto(texto)
+        if len(busca) >= 3:
+            postings = sorted((self._trigramas.get(t, set()) for t in _trigramas(busca)), key=len)
+            encontrados = set.intersection(*postings)
+            candidatos = encontrados if candidatos is None else candidatos & encontrados
+        elif candidatos is None:
+            candidatos = self._contratos.keys()
+        # Confirma o trecho em cada campo (os trigramas só garantem que as partes existem)
+        return {i for i in candidatos if any(busca in t for t in self._textos_normalizados[i])}
+
+    def filtrar(self, texto=None, status=None, data=None):
+        """
+        Contratos que atendem a todos os filtros informados (None ignora o filtro), do mais recente
+        para o mais antigo. `data` é a data de geração exata (date ou 'AAAA-MM-DD').
+        """
+        with self._lock:
+            candidatos = None
+            if status is not None:
+                candidatos = set(self._por_status.get(status, ()))
+            if data is not None:
+                data = data.isoformat() if hasattr(data, "isoformat") else data
+                do_dia = {chave[2] for chave in _faixa_prefixo_tupla(self._por_data, data)}
+                candidatos = do_dia if candidatos is None else candidatos & do_dia
+            if texto:
+                candidatos = self._ids_texto(texto, candidatos)
+            if candidatos is None:
+                return [self._contratos[chave[2]] for chave in reversed(self._por_data)]
+            if len(candidatos) * 8 > len(self._por_data):
+                # Muitos resultados: percorrer a ordem por data sai mais barato que reordenar
+                return [self._contratos[chave[2]] for chave in reversed(self._por_data) if chave[2] in candidatos]
+            resultado = sorted((self._chave_data(self._contratos[i]) for i in candidatos), reverse=True)
+            return [self._contratos[chave[2]] for chave in resultado]
+
+
+def _faixa_prefixo_tupla(lista_ordenada, primeiro):
+    # Entradas (primeiro, ...) de uma lista ordenada de tuplas
+    inicio = bisect.bisect_left(lista_ordenada, (primeiro,))
+    fim = bisect.bisect_left(lista_ordenada, (primeiro + _FIM_PREFIXO,))
+    return lista_ordenada[inicio:fim]
+
+
+# --- ÍNDICES COMPARTILHADOS ---
+# Uma estrutura por dataset e classe, compartilhada entre as sessões do processo
+_indices = utils.CachePorVersao()
+
+
+def estrutura_do_dataset(classe, dataset, registros):
+    """
+    Estrutura derivada do dataset (índice, agregados) criada com classe(registros, versao) e
+    compartilhada entre as sessões; é remontada só quando a versão do dataset muda.
+    """
+    versao = utils.versao_dataset(dataset)
+    return _indices.obter((dataset.nome, classe), versao, lambda: classe(registros, versao))
+
+
+def indice_clientes(clients_file, clientes_data):
+    """Retorna o índice de clientes, remontando-o só quando a versão do dataset mudou."""
+    return estrutura_do_dataset(IndiceClientes, clients_file, clientes_data)
+
+
+def indice_contratos(contracts_file, contratos_data):
+    """Retorna o índice de contratos, remontando-o só quando a versão do dataset mudou."""
+    return estrutura_do_dataset(IndiceContratos, contracts_file, contratos_data)
+
+
+def registrar_gravacao(classe, dataset, versao_anterior, alterar):
+    """
+    Reflete na estrutura `classe` do dataset uma gravação feita por esta sessão, chamando
+    alterar(indice). versao_anterior é a versão do dataset antes da gravação: se a estrutura não
+    estava nela (outra sessão gravou no meio), ela é descartada e será remontada na próxima leitura.
+    """
+    versao = utils.versao_dataset(dataset)
+    indice = _indices.alterar((dataset.nome, classe), versao_anterior, versao, alterar)
+    if indice is not None:
+        indice.versao = versao
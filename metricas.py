@@ -0,0 +1,211 @@
+# metricas.py
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import streamlit as st
+
+from settings import get_setting
+
+# Com a instrumentação desligada, medido() devolve a própria função: nenhum custo por chamada
+ATIVO = get_setting("metricas", "ativo", False)
+ARQUIVO_JSONL = get_setting("metricas", "arquivo_jsonl", None)
+ARQUIVO_PROMETHEUS = get_setting("metricas", "arquivo_prometheus", None)
+
+# Limites (em segundos) das faixas dos histogramas exportados no formato do Prometheus
+LIMITES_HISTOGRAMA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Estatistica:
+    """Quantidade de chamadas, erros, tempo total e máximo e histograma dos tempos."""
+
+    def __init__(self):
+        self.chamadas = 0
+        self.erros = 0
+        self.total = 0.0
+        self.maximo = 0.0
+        self.faixas = [0] * len(LIMITES_HISTOGRAMA)
+
+    def registrar(self, duracao, erro=False):
+        self.chamadas += 1
+        self.erros += erro
+        self.total += duracao
+        self.maximo = max(self.maximo, duracao)
+        for i, limite in enumerate(LIMITES_HISTOGRAMA):
+            if duracao <= limite:
+                self.faixas[i] += 1
+                break
+
+    def resumo(self):
+        return {
+            "chamadas": self.chamadas,
+            "erros": self.erros,
+            "total_s": round(self.total, 6),
+            "media_s": round(self.total / self.chamadas, 6) if self.chamadas else 0.0,
+            "max_s": round(self.maximo, 6),
+        }
+
+
+# --- REGISTRO DO PROCESSO ---
+_operacoes = {}
+_paginas = {}
+_lock = threading.Lock()
+# Execução (rerun) em andamento na thread do script: página, início, totais e profundidade de aninhamento
+_execucao = threading.local()
+
+
+def _registrar(tabela, nome, duracao, erro=False):
+    with _lock:
+        tabela.setdefault(nome, Estatistica()).registrar(duracao, erro)
+
+
+def medido(nome):
+    """Decorador que mede o tempo e conta as chamadas (e os erros) da função sob o nome informado."""
+    def decorador(funcao):
+        if not ATIVO:
+            return funcao
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            execucao = getattr(_execucao, "atual", None)
+            if execucao is not None:
+                execucao["profundidade"] += 1
+            erro = False
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            except BaseException:
+                erro = True
+                raise
+            finally:
+                duracao = time.perf_counter() - inicio
+                _registrar(_operacoes, nome, duracao, erro)
+                if execucao is not None:
+                    execucao["profundidade"] -= 1
+                    totais = execucao["operacoes"].setdefault(nome, [0, 0.0])
+                    totais[0] += 1
+                    totais[1] += duracao
+                    if execucao["profundidade"] == 0:
+                        # Só as chamadas de primeiro nível entram no tempo instrumentado (sem contar duas vezes)
+                        execucao["instrumentado"] += duracao
+        return medida
+    return decorador
+
+
+# --- TOTAIS POR EXECUÇÃO DA PÁGINA ---
+def iniciar_execucao(pagina):
+    """Marca o início de uma execução (rerun) da página na thread atual."""
+    if not ATIVO:
+        return
+    _execucao.atual = {
+        "pagina": pagina, "inicio": time.perf_counter(), "operacoes": {}, "instrumentado": 0.0, "profundidade": 0,
+    }
+
+
+def finalizar_execucao():
+    """
+    Encerra a execução atual e retorna o resumo dela (ou None). O tempo não coberto pelas
+    operações medidas (montagem dos elementos do Streamlit, lógica da página) aparece como "outros".
+    """
+    execucao = getattr(_execucao, "atual", None)
+    if not ATIVO or execucao is None:
+        return None
+    _execucao.atual = None
+    duracao = time.perf_counter() - execucao["inicio"]
+    _registrar(_paginas, execucao["pagina"], duracao)
+    resumo = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "pagina": execucao["pagina"],
+        "duracao_s": round(duracao, 6),
+        "outros_s": round(max(0.0, duracao - execucao["instrumentado"]), 6),
+        "operacoes": {nome: {"chamadas": n, "total_s": round(t, 6)} for nome, (n, t) in execucao["operacoes"].items()},
+    }
+    _exportar(resumo)
+    return resumo
+
+
+# --- EXPORTAÇÃO ---
+def instantaneo():
+    """Estatísticas acumuladas do processo, por operação e por página."""
+    with _lock:
+        return {
+            "operacoes": {nome: e.resumo() for nome, e in _operacoes.items()},
+            "paginas": {nome: e.resumo() for nome, e in _paginas.items()},
+        }
+
+
+def jsonl(resumos):
+    return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in resumos)
+
+
+def _histograma_prometheus(metrica, rotulo, tabela, linhas):
+    linhas.append(f"# TYPE {metrica} histogram")
+    for nome, e in sorted(tabela.items()):
+        acumulado = 0
+        for limite, quantidade in zip(LIMITES_HISTOGRAMA, e.faixas):
+            acumulado += quantidade
+            linhas.append(f'{metrica}_bucket{{{rotulo}="{nome}",le="{limite}"}} {acumulado}')
+        linhas.append(f'{metrica}_bucket{{{rotulo}="{nome}",le="+Inf"}} {e.chamadas}')
+        linhas.append(f'{metrica}_sum{{{rotulo}="{nome}"}} {e.total:.6f}')
+        linhas.append(f'{metrica}_count{{{rotulo}="{nome}"}} {e.chamadas}')
+
+
+def prometheus():
+    """Estatísticas do processo no formato de texto do Prometheus."""
+    linhas = []
+    with _lock:
+        _histograma_prometheus("rocker_operacao_duracao_segundos", "operacao", _operacoes, linhas)
+        linhas.append("# TYPE rocker_operacao_erros_total counter")
+        for nome, e in sorted(_operacoes.items()):
+            linhas.append(f'rocker_operacao_erros_total{{operacao="{nome}"}} {e.erros}')
+        _histograma_prometheus("rocker_pagina_duracao_segundos", "pagina", _paginas, linhas)
+    return "\n".join(linhas) + "\n"
+
+
+def _exportar(resumo):
+    # Arquivos opcionais: JSONL com uma linha por execução e o texto do Prometheus
+    # (para o coletor de arquivos de texto do node_exporter), atualizado a cada execução
+    try:
+        if ARQUIVO_JSONL:
+            with open(ARQUIVO_JSONL, "a", encoding="utf-8") as f:
+                f.write(jsonl([resumo]))
+        if ARQUIVO_PROMETHEUS:
+            temporario = f"{ARQUIVO_PROMETHEUS}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                f.write(prometheus())
+            os.replace(temporario, ARQUIVO_PROMETHEUS)
+    except OSError:
+        # A medição nunca derruba a página
+        pass
+
+
+# --- PAINEL ---
+def exibir_painel(resumo):
+    """Painel de desempenho na barra lateral, só para administradores."""
+    if not ATIVO or not st.session_state.get('administrador'):
+        return
+    historico = st.session_state.setdefault('metricas_execucoes', [])
+    if resumo is not None:
+        historico.append(resumo)
+        del historico[:-50]
+    with st.sidebar.expander("Desempenho"):
+        if resumo is not None:
+            st.markdown(f"**Esta execução:** {resumo['duracao_s'] * 1000:.0f} ms")
+            linhas = [
+                {"Operação": nome, "Chamadas": o["chamadas"], "Tempo (ms)": round(o["total_s"] * 1000, 1)}
+                for nome, o in sorted(resumo["operacoes"].items(), key=lambda item: -item[1]["total_s"])
+            ]
+            linhas.append({"Operação": "outros (página e Streamlit)", "Chamadas": None, "Tempo (ms)": round(resumo["outros_s"] * 1000, 1)})
+            st.dataframe(linhas, hide_index=True)
+        dados = instantaneo()
+        st.markdown("**Acumulado do processo**")
+        st.dataframe(
+            [{"Operação": nome, **e} for nome, e in sorted(dados["operacoes"].items())] +
+            [{"Operação": f"página: {nome}", **e} for nome, e in sorted(dados["paginas"].items())],
+            hide_index=True,
+        )
+        st.download_button("Execuções desta sessão (JSONL)", data=jsonl(historico), file_name="metricas.jsonl", mime="application/x-ndjson")
+        st.download_button("Prometheus", data=prometheus(), file_name="metricas.prom", mime="text/plain")
@@ -0,0 +1,264 @@
+# numeracao.py
+import atexit
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+
+import storage
+from settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Reservas de blocos em uso e números que ficaram sem uso, guardados no config.json
+CAMPO_RESERVAS = "reservas_numeracao"
+CAMPO_LACUNAS = "lacunas_numeracao"
+
+# Dono das reservas feitas por este processo (o PID sozinho se repete depois de um reinício do contêiner)
+_DONO = {"host": socket.gethostname(), "pid": os.getpid(), "token": uuid.uuid4().hex}
+
+
+def _reserva_abandonada(reserva, validade):
+    """
+    Uma reserva é abandonada quando o processo dono terminou sem devolvê-la (queda, SIGKILL,
+    reinício): na mesma máquina, se o PID não está mais rodando (ou é o deste processo, de uma
+    execução anterior); em outra máquina, quando passou da validade.
+    """
+    dono = reserva.get("dono") or {}
+    if dono.get("token") == _DONO["token"]:
+        return False
+    if dono.get("host") == _DONO["host"] and isinstance(dono.get("pid"), int):
+        return dono["pid"] == _DONO["pid"] or not storage.processo_ativo(dono["pid"])
+    return datetime.now() - datetime.fromisoformat(reserva["reservado_em"]) > timedelta(seconds=validade)
+
+
+def _faixas(numeros):
+    """Agrupa números em faixas [início, fim] de números consecutivos."""
+    faixas = []
+    for numero in sorted(numeros):
+        if faixas and faixas[-1][1] == numero - 1:
+            faixas[-1][1] = numero
+        else:
+            faixas.append([numero, numero])
+    return faixas
+
+
+class AlocadorNumeros:
+    """
+    Distribui números sequenciais (contratos, faturas) a partir de blocos reservados no config.json.
+    Cada reserva é uma alteração atômica do contador (gravação condicional no Drive, transação no
+    SQLite); os números do bloco são entregues localmente, sem ida ao armazenamento.
+
+    A reserva fica registrada em reservas_numeracao (faixa, dono e data) até o bloco ser usado ou
+    devolvido. Números não usados voltam ao contador no encerramento do processo ou, se outro
+    processo já reservou depois deles, são registrados em lacunas_numeracao. Reservas de processos
+    que terminaram sem devolvê-las são conciliadas por reconciliar(): os números da faixa que não
+    aparecem em nenhum registro do dataset viram lacunas.
+    """
+
+    def __init__(self, nome, campo_contador, tamanho_bloco, dataset, campo_numero, campo_ano=None,
+                 validade_reserva=7 * 24 * 3600, max_lacunas=500):
+        self.nome = nome
+        self.campo_contador = campo_contador
+        # Com campo_ano, o contador recomeça do zero a cada ano
+        self.campo_ano = campo_ano
+        self.tamanho_bloco = tamanho_bloco
+        # Dataset e campo onde os números ficam gravados (ex.: "00012-2025" em numero_contrato)
+        self.dataset = dataset
+        self.campo_numero = campo_numero
+        self.validade_reserva = validade_reserva
+        self.max_lacunas = max_lacunas
+        self._lock = threading.Lock()
+        self._proximo = 0
+        self._fim = -1
+        self._ano = None
+        # Faixa [início, fim] da reserva deste processo ainda registrada no config.json
+        self._bloco = None
+        self._reconciliado = False
+        self._drive = None
+
+    def proximo(self, drive):
+        """Retorna (número, ano) do próximo número disponível."""
+        return self.reservar(drive, 1)[0]
+
+    def reservar(self, drive, quantidade):
+        """Reserva `quantidade` números consecutivos e retorna a lista de (número, ano)."""
+        with self._lock:
+            ano_atual = date.today().year
+            if self.campo_ano and self._ano is not None and self._ano != ano_atual:
+                # Virada de ano: o restante do bloco pertence ao ano anterior
+                self._devolver_bloco(drive)
+            if self._fim - self._proximo + 1 < quantidade:
+                self._devolver_bloco(drive)
+                self._reservar_bloco(drive, max(quantidade, self.tamanho_bloco))
+            numeros = [(n, self._ano) for n in range(self._proximo, self._proximo + quantidade)]
+            self._proximo += quantidade
+            return numeros
+
+    # --- Reservas no config.json ---
+    def _encerrar_reserva(self, config, bloco):
+        config[CAMPO_RESERVAS] = [
+            r for r in config.get(CAMPO_RESERVAS, [])
+            if not (r.get("tipo") == self.nome and r.get("numeros") == list(bloco)
+                    and (r.get("dono") or {}).get("token") == _DONO["token"])
+        ]
+
+    def _registrar_lacuna(self, config, faixa, ano, motivo):
+        lacunas = config.setdefault(CAMPO_LACUNAS, [])
+        lacunas.append({
+            "tipo": self.nome,
+            "numeros": list(faixa),
+            "ano": ano,
+            "motivo": motivo,
+            "registrado_em": datetime.now().isoformat(timespec="seconds"),
+        })
+        # O config.json é regravado a cada reserva: só as lacunas mais recentes ficam nele
+        if len(lacunas) > self.max_lacunas:
+            logger.warning("Lacunas de numeração antigas removidas do config.json: %s", lacunas[:-self.max_lacunas])
+            del lacunas[:-self.max_lacunas]
+
+    def _reservar_bloco(self, drive, quantidade):
+        if not self._reconciliado:
+            try:
+                self.reconciliar(drive)
+            except Exception:
+                # A conciliação pode esperar a próxima reserva; a numeração não para por ela
+                logger.exception("Falha ao conciliar as reservas de numeração de %s", self.nome)
+            self._reconciliado = True
+        config_file = storage.get_backend().open(drive, "config.json")
+        ano_atual = date.today().year
+        anterior = self._bloco
+
+        def reservar(config):
+            if anterior is not None:
+                # O bloco anterior foi todo usado (ou já devolvido): a reserva dele termina aqui
+                self._encerrar_reserva(config, anterior)
+            if self.campo_ano:
+                if config.get(self.campo_ano, ano_atual) != ano_atual:
+                    config[self.campo_contador] = 0
+                config[self.campo_ano] = ano_atual
+            inicio = config.get(self.campo_contador, 0) + 1
+            config[self.campo_contador] = inicio + quantidade - 1
+            config.setdefault(CAMPO_RESERVAS, []).append({
+                "tipo": self.nome,
+                "numeros": [inicio, inicio + quantidade - 1],
+                "ano": ano_atual,
+                "dono": _DONO,
+                "reservado_em": datetime.now().isoformat(timespec="seconds"),
+            })
+            return inicio
+
+        inicio = config_file.backend.modify(config_file, reservar)
+        self._proximo, self._fim, self._ano = inicio, inicio + quantidade - 1, ano_atual
+        self._bloco = (inicio, self._fim)
+        self._drive = drive
+
+    def _devolver_bloco(self, drive, sempre=False):
+        """
+        Devolve ao contador os números ainda não usados do bloco atual e encerra a reserva dele.
+        Com o bloco todo usado só grava se `sempre`; senão a reserva é encerrada junto com a próxima.
+        """
+        if self._bloco is None or (self._proximo > self._fim and not sempre):
+            return
+        bloco, proximo, fim, ano = self._bloco, self._proximo, self._fim, self._ano
+        self._bloco, self._proximo, self._fim = None, 0, -1
+        config_file = storage.get_backend().open(drive, "config.json")
+
+        def devolver(config):
+            self._encerrar_reserva(config, bloco)
+            if proximo > fim:
+                return
+            mesmo_ano = self.campo_ano is None or config.get(self.campo_ano) == ano
+            if mesmo_ano and config.get(self.campo_contador) == fim:
+                # Ninguém reservou depois deste bloco: o contador simplesmente volta
+                config[self.campo_contador] = proximo - 1
+                return
+            self._registrar_lacuna(config, (proximo, fim), ano, "devolvidos no encerramento")
+
+        config_file.backend.modify(config_file, devolver)
+
+    def registrar_lacunas(self, drive, numeros, motivo):
+        """Registra como lacunas números reservados que não chegaram a ser usados (lista de (número, ano))."""
+        if not numeros:
+            return
+        config_file = storage.get_backend().open(drive, "config.json")
+        por_ano = {}
+        for numero, ano in numeros:
+            por_ano.setdefault(ano, []).append(numero)
+
+        def registrar(config):
+            for ano, numeros_ano in por_ano.items():
+                for faixa in _faixas(numeros_ano):
+                    self._registrar_lacuna(config, faixa, ano, motivo)
+
+        config_file.backend.modify(config_file, registrar)
+
+    # --- Conciliação das reservas abandonadas ---
+    def _numeros_usados(self, drive):
+        """Conjunto de (número, ano) já gravados no dataset (ano None quando a numeração não é anual)."""
+        backend = storage.get_backend()
+        usados = set()
+        for registro in backend.read(backend.open(drive, self.dataset)):
+            numero, _, ano = str(registro.get(self.campo_numero) or "").partition("-")
+            if numero.isdigit():
+                usados.add((int(numero), int(ano) if self.campo_ano and ano.isdigit() else None))
+        return usados
+
+    def reconciliar(self, drive):
+        """
+        Encerra as reservas abandonadas deste tipo de número, registrando como lacunas os números
+        delas que não aparecem no dataset. Retorna quantas reservas foram encerradas.
+        """
+        backend = storage.get_backend()
+        config_file = backend.open(drive, "config.json")
+        abandonadas = [
+            r for r in backend.read(config_file).get(CAMPO_RESERVAS, [])
+            if r.get("tipo") == self.nome and _reserva_abandonada(r, self.validade_reserva)
+        ]
+        if not abandonadas:
+            return 0
+        usados = self._numeros_usados(drive)
+
+        def reconciliar(config):
+            reservas = config.get(CAMPO_RESERVAS, [])
+            encerradas = [r for r in reservas if r in abandonadas]
+            config[CAMPO_RESERVAS] = [r for r in reservas if r not in abandonadas]
+            for reserva in encerradas:
+                inicio, fim = reserva["numeros"]
+                ano = reserva.get("ano")
+                livres = [n for n in range(inicio, fim + 1) if (n, ano if self.campo_ano else None) not in usados]
+                for faixa in _faixas(livres):
+                    self._registrar_lacuna(config, faixa, ano, "reserva interrompida")
+            return len(encerradas)
+
+        return config_file.backend.modify(config_file, reconciliar)
+
+    def encerrar(self):
+        with self._lock:
+            self._devolver_bloco(self._drive, sempre=True)
+
+
+_tamanho_bloco = get_setting("numeracao", "tamanho_bloco", 10)
+_validade_reserva = get_setting("numeracao", "validade_reserva", 7 * 24 * 3600)
+_max_lacunas = get_setting("numeracao", "max_lacunas", 500)
+
+alocador_contratos = AlocadorNumeros(
+    "contrato", "ultimo_numero_contrato", _tamanho_bloco, "contracts.json", "numero_contrato",
+    campo_ano="ano_numero_contrato", validade_reserva=_validade_reserva, max_lacunas=_max_lacunas,
+)
+alocador_faturas = AlocadorNumeros(
+    "fatura", "ultimo_numero_fatura", _tamanho_bloco, "invoices.json", "numero_fatura",
+    validade_reserva=_validade_reserva, max_lacunas=_max_lacunas,
+)
+
+
+@atexit.register
+def _encerrar_alocadores():
+    for alocador in (alocador_contratos, alocador_faturas):
+        try:
+            alocador.encerrar()
+        except Exception:
+            # Sem acesso ao armazenamento no encerramento: a reserva fica registrada e é conciliada depois
+            pass
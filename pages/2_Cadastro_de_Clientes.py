@@ -1,11 +1,48 @@
 # pages/2_Cadastro_de_Clientes.py
 import streamlit as st
 import utils
+import consulta_cep
+import metricas
+import indices
 import uuid
 import pandas as pd
+import math
 from datetime import date
 
 st.set_page_config(page_title="Gerenciamento de Clientes", layout="wide")
+metricas.iniciar_execucao("Cadastro de Clientes")
+
+# --- FICHA DETALHADA DE UM CLIENTE ---
+def exibir_ficha_cliente(cliente, com_acoes=False):
+    st.markdown(f"**Tipo:** {cliente['tipo_pessoa']}")
+    if cliente.get('data_nascimento'):
+        st.markdown(f"**Data de Nascimento:** {cliente['data_nascimento']}")
+
+    st.markdown(f"**E-mail:** {cliente.get('email', 'N/A')}")
+    st.markdown(f"**Telefone:** {cliente.get('telefone', 'N/A')}")
+
+    st.markdown("---")
+    st.markdown("##### Endereço")
+    st.markdown(f"**CEP:** {cliente.get('cep', 'N/A')}")
+    st.markdown(f"**Endereço:** {cliente.get('endereco', 'N/A')}")
+    st.markdown(f"**Cidade/UF:** {cliente.get('cidade', 'N/A')} / {cliente.get('estado', 'N/A')}")
+
+    if cliente.get('representante_legal'):
+        rep = cliente['representante_legal']
+        st.markdown("---")
+        st.markdown("##### Representante Legal")
+        st.markdown(f"**Nome:** {rep.get('nome', 'N/A')}")
+        st.markdown(f"**CPF:** {rep.get('cpf', 'N/A')}")
+        st.markdown(f"**Data de Nascimento:** {rep.get('data_nascimento', 'N/A')}")
+        st.markdown(f"**Contato:** {rep.get('telefone', 'N/A')} / {rep.get('email', 'N/A')}")
+
+    if com_acoes:
+        st.markdown("---")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("Editar Cliente", key=f"edit_{cliente['id']}", use_container_width=True)
+        with col2:
+            st.button("Excluir Cliente", key=f"delete_{cliente['id']}", use_container_width=True, type="primary")
 
 # --- VERIFICAÇÃO DE AUTENTICAÇÃO E LOGOUT ---
 if not st.session_state.get('autenticado'):
@@ -33,43 +70,22 @@ except Exception as e:
     st.stop()
 
 # --- BUSCA DE CLIENTES ---
-st.subheader("Buscar Cliente por CPF/CNPJ")
-cpf_cnpj_busca = st.text_input("Digite o CPF ou CNPJ para buscar (com ou sem pontuação)")
-if cpf_cnpj_busca:
-    busca_limpa = "".join(filter(str.isdigit, cpf_cnpj_busca))
-    clientes_encontrados = []
-    if busca_limpa:
-        for c in clientes_data:
-            doc_armazenado_limpo = "".join(filter(str.isdigit, c.get('cpf_cnpj', '')))
-            if busca_limpa in doc_armazenado_limpo:
-                clientes_encontrados.append(c)
+# O índice é montado uma vez por versão do arquivo de clientes e compartilhado entre as sessões
+indice_clientes = indices.indice_clientes(clients_file, clientes_data)
+
+st.subheader("Buscar Cliente por CPF/CNPJ, Nome ou E-mail")
+texto_busca = st.text_input("Digite o CPF/CNPJ (com ou sem pontuação), parte do nome ou o e-mail para buscar")
+if texto_busca:
+    clientes_encontrados = indice_clientes.buscar(texto_busca)
 
     if clientes_encontrados:
         st.write(f"{len(clientes_encontrados)} cliente(s) encontrado(s):")
         # A busca agora usa o mesmo expander da lista principal
         for cliente in clientes_encontrados:
              with st.expander(f"**{cliente['nome_razao_social']}** - {cliente['cpf_cnpj']}"):
-                st.markdown(f"**Tipo:** {cliente['tipo_pessoa']}")
-                if cliente.get('data_nascimento'):
-                    st.markdown(f"**Data de Nascimento:** {cliente['data_nascimento']}")
-                st.markdown(f"**E-mail:** {cliente.get('email', 'N/A')}")
-                st.markdown(f"**Telefone:** {cliente.get('telefone', 'N/A')}")
-                st.markdown("---")
-                st.markdown("##### Endereço")
-                st.markdown(f"**CEP:** {cliente.get('cep', 'N/A')}")
-                st.markdown(f"**Endereço:** {cliente.get('endereco', 'N/A')}")
-                st.markdown(f"**Cidade/UF:** {cliente.get('cidade', 'N/A')} / {cliente.get('estado', 'N/A')}")
-                
-                if cliente.get('representante_legal'):
-                    rep = cliente['representante_legal']
-                    st.markdown("---")
-                    st.markdown("##### Representante Legal")
-                    st.markdown(f"**Nome:** {rep.get('nome', 'N/A')}")
-                    st.markdown(f"**CPF:** {rep.get('cpf', 'N/A')}")
-                    st.markdown(f"**Data de Nascimento:** {rep.get('data_nascimento', 'N/A')}")
-                    st.markdown(f"**Contato:** {rep.get('telefone', 'N/A')} / {rep.get('email', 'N/A')}")
+                exibir_ficha_cliente(cliente)
     else:
-        st.info("Nenhum cliente encontrado com este CPF/CNPJ.")
+        st.info("Nenhum cliente encontrado para esta busca.")
 
 st.markdown("---")
 
@@ -83,16 +99,20 @@ with col_cep1:
 with col_cep2:
     if st.button("Buscar Endereço"):
         if cep_lookup_input:
-            dados_cep = utils.consultar_cep(cep_lookup_input)
-            if dados_cep:
-                st.session_state.cep_pesquisado = dados_cep.get('cep', '')
-                st.session_state.endereco = dados_cep.get('logradouro', '')
-                st.session_state.bairro = dados_cep.get('bairro', '')
-                st.session_state.cidade = dados_cep.get('localidade', '')
-                st.session_state.estado = dados_cep.get('uf', '')
-                st.success("Endereço encontrado!")
+            try:
+                dados_cep = utils.consultar_cep(cep_lookup_input)
+            except consulta_cep.CEPIndisponivel:
+                st.warning("O serviço de consulta de CEP não respondeu. Tente novamente em instantes ou preencha o endereço manualmente.")
             else:
-                st.error("CEP não encontrado ou inválido.")
+                if dados_cep:
+                    st.session_state.cep_pesquisado = dados_cep.get('cep', '')
+                    st.session_state.endereco = dados_cep.get('logradouro', '')
+                    st.session_state.bairro = dados_cep.get('bairro', '')
+                    st.session_state.cidade = dados_cep.get('localidade', '')
+                    st.session_state.estado = dados_cep.get('uf', '')
+                    st.success("Endereço encontrado!")
+                else:
+                    st.error("CEP não encontrado ou inválido.")
         else:
             st.warning("Por favor, insira um CEP para buscar.")
 
@@ -160,7 +180,7 @@ with st.form("cadastro_cliente_form"):
                 st.error("CPF ou CNPJ do cliente inválido. Verifique a digitação.")
             else:
                 endereco_completo = f"{endereco}, {numero}, {bairro}" if numero and bairro else endereco
-                if any(c['cpf_cnpj'] == doc_formatado for c in clientes_data):
+                if indice_clientes.documento_cadastrado(doc_formatado):
                     st.error("Este CPF/CNPJ já está cadastrado!")
                 else:
                     if tipo_pessoa == "Pessoa Jurídica":
@@ -172,8 +192,10 @@ with st.form("cadastro_cliente_form"):
                         "email": email, "telefone": telefone, "cep": cep, "cidade": cidade, "estado": estado,
                         "endereco": endereco_completo, "representante_legal": representante_legal
                     }
-                    clientes_data.append(novo_cliente)
-                    utils.write_data(clients_file, clientes_data)
+                    versao_anterior = utils.versao_dataset(clients_file)
+                    utils.insert_record(clients_file, novo_cliente)
+                    # Atualiza o índice no lugar, sem remontá-lo na próxima execução
+                    indices.registrar_gravacao(indices.IndiceClientes, clients_file, versao_anterior, lambda indice: indice.adicionar(novo_cliente))
                     st.success(f"Cliente '{nome_razao_social}' salvo com sucesso!")
                     
                     for key in ['cep_pesquisado', 'endereco', 'bairro', 'cidade', 'estado']:
@@ -185,37 +207,44 @@ st.markdown("---")
 # --- LISTA DE CLIENTES CADASTRADOS ---
 st.subheader("Clientes Cadastrados")
 if clientes_data:
-    clientes_ordenados = sorted(clientes_data, key=lambda c: c['nome_razao_social'])
-    for cliente in clientes_ordenados:
-        with st.expander(f"**{cliente['nome_razao_social']}** - {cliente['cpf_cnpj']}"):
-            st.markdown(f"**Tipo:** {cliente['tipo_pessoa']}")
-            if cliente.get('data_nascimento'):
-                st.markdown(f"**Data de Nascimento:** {cliente['data_nascimento']}")
-            
-            st.markdown(f"**E-mail:** {cliente.get('email', 'N/A')}")
-            st.markdown(f"**Telefone:** {cliente.get('telefone', 'N/A')}")
-            
-            st.markdown("---")
-            st.markdown("##### Endereço")
-            st.markdown(f"**CEP:** {cliente.get('cep', 'N/A')}")
-            st.markdown(f"**Endereço:** {cliente.get('endereco', 'N/A')}")
-            st.markdown(f"**Cidade/UF:** {cliente.get('cidade', 'N/A')} / {cliente.get('estado', 'N/A')}")
-            
-            if cliente.get('representante_legal'):
-                rep = cliente['representante_legal']
-                st.markdown("---")
-                st.markdown("##### Representante Legal")
-                st.markdown(f"**Nome:** {rep.get('nome', 'N/A')}")
-                st.markdown(f"**CPF:** {rep.get('cpf', 'N/A')}")
-                st.markdown(f"**Data de Nascimento:** {rep.get('data_nascimento', 'N/A')}")
-                st.markdown(f"**Contato:** {rep.get('telefone', 'N/A')} / {rep.get('email', 'N/A')}")
-
-            st.markdown("---")
-            col1, col2 = st.columns(2)
-            with col1:
-                st.button("Editar Cliente", key=f"edit_{cliente['id']}", use_container_width=True)
-            with col2:
-                st.button("Excluir Cliente", key=f"delete_{cliente['id']}", use_container_width=True, type="primary")
+    col_lista1, col_lista2, col_lista3 = st.columns([2, 1, 1])
+    with col_lista1:
+        modo_lista = st.radio("Visualização", ["Tabela compacta", "Fichas detalhadas"], horizontal=True)
+    with col_lista2:
+        tamanho_pagina = st.selectbox("Clientes por página", [10, 25, 50, 100], index=1)
+    total_paginas = max(1, math.ceil(len(clientes_data) / tamanho_pagina))
+    with col_lista3:
+        pagina = st.number_input(f"Página (de {total_paginas})", min_value=1, max_value=total_paginas, value=1)
+
+    # A ordenação por nome é calculada uma vez por versão do arquivo de clientes
+    ordem = utils.ordem_por(clients_file, clientes_data, 'nome_razao_social')
+    inicio_pagina = (pagina - 1) * tamanho_pagina
+    clientes_pagina = [clientes_data[i] for i in ordem[inicio_pagina:inicio_pagina + tamanho_pagina]]
+    st.caption(f"Exibindo {inicio_pagina + 1}–{inicio_pagina + len(clientes_pagina)} de {len(clientes_data)} cliente(s).")
+
+    if modo_lista == "Tabela compacta":
+        tabela_clientes = pd.DataFrame([
+            {
+                "Nome / Razão Social": c['nome_razao_social'], "CPF / CNPJ": c['cpf_cnpj'], "Tipo": c['tipo_pessoa'],
+                "Cidade/UF": f"{c.get('cidade', '')} / {c.get('estado', '')}", "Telefone": c.get('telefone', ''), "E-mail": c.get('email', ''),
+            }
+            for c in clientes_pagina
+        ])
+        selecao = st.dataframe(
+            tabela_clientes, hide_index=True, use_container_width=True,
+            on_select="rerun", selection_mode="multi-row", key=f"tabela_clientes_{pagina}_{tamanho_pagina}",
+        )
+        st.caption("Selecione linhas da tabela para ver a ficha completa do cliente.")
+        # Só as linhas selecionadas ganham a ficha detalhada
+        for linha in selecao.selection.rows:
+            cliente = clientes_pagina[linha]
+            with st.container(border=True):
+                st.markdown(f"#### {cliente['nome_razao_social']} - {cliente['cpf_cnpj']}")
+                exibir_ficha_cliente(cliente, com_acoes=True)
+    else:
+        for cliente in clientes_pagina:
+            with st.expander(f"**{cliente['nome_razao_social']}** - {cliente['cpf_cnpj']}"):
+                exibir_ficha_cliente(cliente, com_acoes=True)
 else:
     st.info("Nenhum cliente cadastrado ainda.")
 
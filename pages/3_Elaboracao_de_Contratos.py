@@ -1,11 +1,18 @@
 # pages/3_Elaboracao_de_Contratos.py
 import streamlit as st
 import utils
+import metricas
+import indices
+import referencias
+import documentos
+import renderizacao
+import dinheiro
 import pandas as pd
 from datetime import date
 import uuid # Import para gerar IDs únicos
 
 st.set_page_config(page_title="Elaboração de Contratos", layout="wide")
+metricas.iniciar_execucao("Elaboração de Contratos")
 
 # --- VERIFICAÇÃO DE AUTENTICAÇÃO E LOGOUT ---
 if not st.session_state.get('autenticado'):
@@ -23,11 +30,17 @@ st.title("Elaboração de Contratos")
 # --- CONEXÃO COM BANCOS DE DADOS ---
 try:
     drive = utils.login_gdrive()
-    clients_file = utils.get_database_file(drive, "clients.json")
-    clientes_data = utils.read_data(clients_file)
+    # Clientes são lidos e o arquivo de contratos já fica aberto para o salvamento, em paralelo
+    carga = utils.carregar_datasets(drive, ["clients.json", "contracts.json"], somente_abrir={"contracts.json"})
 except Exception as e:
     st.error(f"Erro de conexão: {e}")
     st.stop()
+if carga.erros:
+    for nome, erro in carga.erros.items():
+        st.error(f"Erro de conexão ({nome}): {erro}")
+    st.stop()
+clients_file, contracts_file = carga.datasets["clients.json"], carga.datasets["contracts.json"]
+clientes_data = carga.dados["clients.json"]
     
 # Inicializa a lista de itens do contrato na sessão
 if 'itens_contrato' not in st.session_state:
@@ -96,7 +109,7 @@ if submitted:
                 'produto': st.session_state.get(f"produto_{i}"),
                 'plataforma': st.session_state.get(f"plataforma_{i}"),
                 'quantidade': st.session_state.get(f"quantidade_{i}"),
-                'valor_unitario': st.session_state.get(f"valor_unitario_{i}")
+                'valor_unitario_centavos': dinheiro.para_centavos(st.session_state.get(f"valor_unitario_{i}"))
             }
             itens_para_contrato.append(item_data)
         
@@ -111,10 +124,12 @@ if submitted:
                 "data_geracao": date.today().isoformat(),
                 "status": "Ativo", # NOVO: Define o status padrão como "Ativo"
                 "tipo_contrato": st.session_state.get("tipo_contrato"),
-                "cliente": cliente_obj,
+                # Só a referência ao cliente e os dados dele que entram no documento
+                "cliente_id": cliente_obj['id'],
+                "cliente_snapshot": referencias.snapshot_cliente(cliente_obj),
                 "itens_contrato": itens_para_contrato,
-                "valor_entrega": st.session_state.get("valor_entrega"),
-                "valor_recolha": st.session_state.get("valor_recolha"),
+                "valor_entrega_centavos": dinheiro.para_centavos(st.session_state.get("valor_entrega")),
+                "valor_recolha_centavos": dinheiro.para_centavos(st.session_state.get("valor_recolha")),
                 "endereco_obra": st.session_state.get("endereco_obra"),
                 "contato_nome": st.session_state.get("contato_nome"),
                 "contato_telefone": st.session_state.get("contato_telefone"),
@@ -123,13 +138,14 @@ if submitted:
             }
 
             # --- LÓGICA DE SALVAMENTO NO contracts.json ---
-            contracts_file = utils.get_database_file(drive, "contracts.json")
-            contratos_existentes = utils.read_data(contracts_file)
-            contratos_existentes.append(dados_contrato)
-            utils.write_data(contracts_file, contratos_existentes)
+            versao_anterior = utils.versao_dataset(contracts_file)
+            utils.insert_record(contracts_file, dados_contrato)
+            contrato_resolvido = referencias.resolver_contrato(dados_contrato)
+            # O índice de busca da página de gerenciamento recebe o contrato sem ser remontado
+            indices.registrar_gravacao(indices.IndiceContratos, contracts_file, versao_anterior, lambda indice: indice.adicionar(contrato_resolvido))
             
-            # ATUALIZADO: Chama a função a partir de utils para gerar o .docx
-            st.session_state.contrato_gerado = utils.gerar_contrato_docx(dados_contrato)
+            # O .docx é gerado em segundo plano; o andamento aparece abaixo do formulário
+            st.session_state.tarefa_contrato = renderizacao.servico.submeter_interativo("contrato", contrato_resolvido)
             st.session_state.nome_arquivo_contrato = f"CONTRATO_{numero_contrato}_{cliente_obj['nome_razao_social']}.docx"
             
             st.success("Contrato gerado e salvo com sucesso!")
@@ -139,12 +155,7 @@ if submitted:
         st.error("Cliente selecionado não encontrado.")
 
 # Botão de download que aparece após a geração do contrato
-if 'contrato_gerado' in st.session_state and st.session_state.contrato_gerado:
-    st.download_button(
-        label="Baixar Contrato (.docx)",
-        data=st.session_state.contrato_gerado,
-        file_name=st.session_state.nome_arquivo_contrato,
-        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    )
+if st.session_state.get('tarefa_contrato'):
+    documentos.exibir_download(st.session_state.tarefa_contrato, "Baixar Contrato (.docx)", st.session_state.nome_arquivo_contrato)
 
 utils.exibir_rodape()
\ No newline at end of file
@@ -1,24 +1,26 @@
 # pages/4_Gerenciamento_de_Contratos.py
 import streamlit as st
 import utils
+import metricas
+import indices
+import referencias
+import documentos
 import pandas as pd
 from datetime import datetime
 
 st.set_page_config(page_title="Gerenciamento de Contratos", layout="wide")
+metricas.iniciar_execucao("Gerenciamento de Contratos")
 
 # --- Função para atualizar o status de um contrato ---
 def atualizar_status_contrato(drive, id_contrato, novo_status):
     contracts_file = utils.get_database_file(drive, "contracts.json")
-    contratos_data = utils.read_data(contracts_file)
     
-    # Encontra o contrato e atualiza o status
-    for contrato in contratos_data:
-        if contrato['id_contrato'] == id_contrato:
-            contrato['status'] = novo_status
-            break
-            
-    # Salva a lista inteira de volta no arquivo
-    utils.write_data(contracts_file, contratos_data)
+    # Atualiza somente o registro do contrato (o backend decide como persistir a alteração)
+    versao_anterior = utils.versao_dataset(contracts_file)
+    if not utils.update_record(contracts_file, id_contrato, {'status': novo_status}):
+        st.error("Este contrato não existe mais (foi excluído em outra sessão). Recarregue a página.")
+        return
+    indices.registrar_gravacao(indices.IndiceContratos, contracts_file, versao_anterior, lambda indice: indice.alterar_status(id_contrato, novo_status))
     st.success(f"Status do contrato atualizado para '{novo_status}'.")
     st.rerun()
 
@@ -39,7 +41,8 @@ st.title("Gerenciamento de Contratos")
 try:
     drive = utils.login_gdrive()
     contracts_file = utils.get_database_file(drive, "contracts.json")
-    contratos_data = utils.read_data(contracts_file)
+    # Os contratos guardam só a referência ao cliente; a visão resolvida traz contrato['cliente']
+    contratos_data = referencias.contratos_resolvidos(utils.read_data(contracts_file))
 except Exception as e:
     st.error(f"Erro de conexão: {e}")
     st.stop()
@@ -56,14 +59,14 @@ with col3:
     data_hoje = datetime.now().date()
     busca_data = st.date_input("Filtrar por Data de Geração", value=None, max_value=data_hoje)
 
-contratos_filtrados = contratos_data
-if busca_texto:
-    busca_texto_lower = busca_texto.lower()
-    contratos_filtrados = [c for c in contratos_filtrados if busca_texto_lower in c['numero_contrato'].lower() or busca_texto_lower in c['cliente']['nome_razao_social'].lower()]
-if status_selecionado != "Todos":
-    contratos_filtrados = [c for c in contratos_filtrados if c.get('status') == status_selecionado]
-if busca_data:
-    contratos_filtrados = [c for c in contratos_filtrados if c['data_geracao'] == busca_data.isoformat()]
+# O índice é montado uma vez por versão do arquivo de contratos; os filtros são combinados
+# por interseção e o resultado já vem do mais recente para o mais antigo
+indice_contratos = indices.indice_contratos(contracts_file, contratos_data)
+contratos_filtrados = indice_contratos.filtrar(
+    texto=busca_texto or None,
+    status=status_selecionado if status_selecionado != "Todos" else None,
+    data=busca_data,
+)
 
 st.markdown("---")
 st.subheader("Contratos Encontrados")
@@ -71,9 +74,7 @@ st.subheader("Contratos Encontrados")
 if not contratos_filtrados:
     st.info("Nenhum contrato encontrado com os filtros atuais.")
 else:
-    contratos_ordenados = sorted(contratos_filtrados, key=lambda c: c['data_geracao'], reverse=True)
-    
-    for contrato in contratos_ordenados:
+    for contrato in contratos_filtrados:
         cliente = contrato['cliente']
         status_atual = contrato.get('status', 'N/A')
         
@@ -97,15 +98,13 @@ else:
             botoes_col1, botoes_col2, botoes_col3, botoes_col4 = st.columns(4)
             
             with botoes_col1:
-                # Botão de Download habilitado
-                contrato_docx = utils.gerar_contrato_docx(contrato)
-                st.download_button(
+                # O documento só é gerado quando o botão é clicado, em segundo plano
+                documentos.exibir_documento_sob_demanda(
+                    "contrato",
+                    lambda: contrato,
                     label="Baixar Novamente",
-                    data=contrato_docx,
                     file_name=f"CONTRATO_{contrato['numero_contrato']}_{cliente['nome_razao_social']}.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
                     key=f"download_{contrato['id_contrato']}",
-                    use_container_width=True
                 )
 
             # Lógica para mostrar botões de mudança de status
@@ -123,9 +122,12 @@ else:
 
             with botoes_col4:
                 if st.button("Excluir", type="primary", key=f"delete_{contrato['id_contrato']}", use_container_width=True):
-                    contratos_atualizados = [c for c in contratos_data if c['id_contrato'] != contrato['id_contrato']]
-                    utils.write_data(contracts_file, contratos_atualizados)
-                    st.success(f"Contrato Nº {contrato['numero_contrato']} foi excluído.")
-                    st.rerun()
+                    versao_anterior = utils.versao_dataset(contracts_file)
+                    if not utils.delete_record(contracts_file, contrato['id_contrato']):
+                        st.warning(f"O contrato Nº {contrato['numero_contrato']} já tinha sido excluído em outra sessão.")
+                    else:
+                        indices.registrar_gravacao(indices.IndiceContratos, contracts_file, versao_anterior, lambda indice: indice.remover(contrato['id_contrato']))
+                        st.success(f"Contrato Nº {contrato['numero_contrato']} foi excluído.")
+                        st.rerun()
 
 utils.exibir_rodape()
\ No newline at end of file
@@ -1,19 +1,32 @@
 # pages/5_Faturamento_e_Financeiro.py
 import streamlit as st
 import utils
+import metricas
+import documentos
+import referencias
+import indices
+import financeiro
+import faturamento
+import renderizacao
+import exportacao
+import dinheiro
+import os
 import uuid
 from datetime import date, datetime, timedelta
 
 st.set_page_config(page_title="Faturamento e Financeiro", layout="wide")
+metricas.iniciar_execucao("Faturamento e Financeiro")
 
 # --- Função de Ação para Atualizar Status ---
 def atualizar_status_fatura(drive, invoices_file, faturas_data, id_fatura, novo_status):
-    """Encontra uma fatura na lista, atualiza seu status e salva o arquivo de volta no Drive."""
-    for fatura in faturas_data:
-        if fatura['id_fatura'] == id_fatura:
-            fatura['status'] = novo_status
-            break
-    utils.write_data(invoices_file, faturas_data)
+    """Atualiza somente o status da fatura informada no armazenamento."""
+    fatura = next(f for f in faturas_data if f['id_fatura'] == id_fatura)
+    versao_anterior = utils.versao_dataset(invoices_file)
+    if not utils.update_record(invoices_file, id_fatura, {'status': novo_status}):
+        st.error(f"A fatura Nº {fatura['numero_fatura']} não existe mais (foi excluída em outra sessão). Recarregue a página.")
+        return
+    # Os totais do painel financeiro só trocam a fatura de status, sem serem recalculados
+    indices.registrar_gravacao(financeiro.AgregadosFaturas, invoices_file, versao_anterior, lambda agregados: agregados.alterar_status(id_fatura, novo_status))
     st.success(f"Status da fatura Nº {fatura['numero_fatura']} atualizado para '{novo_status}'.")
     st.rerun() # Recarrega a página para refletir a mudança
 
@@ -33,19 +46,32 @@ st.title("Faturamento e Gerenciamento Financeiro")
 # --- Carregamento dos Dados ---
 try:
     drive = utils.login_gdrive()
-    contracts_file = utils.get_database_file(drive, "contracts.json")
-    contratos_data = utils.read_data(contracts_file)
-    invoices_file = utils.get_database_file(drive, "invoices.json")
-    faturas_data = utils.read_data(invoices_file)
+    # Os três arquivos são baixados ao mesmo tempo
+    carga = utils.carregar_datasets(drive, ["clients.json", "contracts.json", "invoices.json"])
 except Exception as e:
     st.error(f"Erro de conexão com o Google Drive: {e}")
     st.stop()
+if carga.erros:
+    for nome, erro in carga.erros.items():
+        st.error(f"Erro de conexão com o Google Drive ({nome}): {erro}")
+    st.stop()
+
+clients_file = carga.datasets["clients.json"]
+contracts_file = carga.datasets["contracts.json"]
+invoices_file = carga.datasets["invoices.json"]
+clientes_por_id = referencias.mapa_por_id(clients_file, carga.dados["clients.json"], 'id')
+contratos_data = referencias.contratos_resolvidos(carga.dados["contracts.json"])
+contratos_por_id = {c['id_contrato']: c for c in contratos_data}
+# As faturas guardam só as referências; cliente_info vem do contrato (ou do cadastro do cliente)
+faturas_data = referencias.faturas_resolvidas(carga.dados["invoices.json"], contratos_por_id, clientes_por_id)
 
 # --- Interface com Abas ---
-tab1, tab2 = st.tabs([" Lançar Nova Fatura ", " Gerenciar Faturas Existentes "])
+# Só a aba escolhida é executada: com st.tabs todas rodam a cada interação (painel e prévia do faturamento inclusive)
+ABAS = ["Lançar Nova Fatura", "Gerenciar Faturas Existentes", "Exportação em Lote", "Painel Financeiro", "Faturamento Mensal"]
+aba = st.segmented_control("Seção", ABAS, default=ABAS[0], required=True, key="aba_faturamento", label_visibility="collapsed")
 
 # --- Aba 1: Lançar Nova Fatura ---
-with tab1:
+if aba == ABAS[0]:
     st.header("Criar Nova Fatura")
     
     contratos_ativos = [c for c in contratos_data if c.get('status') == 'Ativo']
@@ -80,38 +106,37 @@ with tab1:
                         "data_emissao": date.today().isoformat(),
                         "data_vencimento": vencimento.isoformat(),
                         "descricao_servico": descricao,
-                        "valor_total": f"{valor:.2f}",
+                        "valor_total_centavos": dinheiro.para_centavos(valor),
                         "forma_pagamento": forma_pagamento,
                         "observacao": observacoes,
-                        "cliente_info": contrato_obj['cliente'],
+                        "cliente_id": contrato_obj['cliente']['id'],
                         "contrato_info": {"numero": contrato_obj['numero_contrato']}
                     }
-                    faturas_data.append(nova_fatura)
-                    utils.write_data(invoices_file, faturas_data)
+                    versao_anterior = utils.versao_dataset(invoices_file)
+                    utils.insert_record(invoices_file, nova_fatura)
+                    indices.registrar_gravacao(financeiro.AgregadosFaturas, invoices_file, versao_anterior, lambda agregados: agregados.adicionar(nova_fatura))
                     
                     dados_template = {
                         "NUMERO_FATURA": novo_numero_fatura, "DATA_EMISSAO": date.today().strftime('%d/%m/%Y'),
                         "NOME_CLIENTE": contrato_obj['cliente']['nome_razao_social'], "CNPJ_CLIENTE": contrato_obj['cliente']['cpf_cnpj'],
                         "ENDERECO_CLIENTE": contrato_obj['cliente']['endereco'], "NUMERO_CONTRATO": contrato_obj['numero_contrato'],
                         "FORMA_PAGAMENTO": forma_pagamento, "DATA_VENCIMENTO": vencimento.strftime('%d/%m/%Y'),
-                        "DESCRICAO_SERVICO": descricao, "VALOR_TOTAL": f"{valor:.2f}", "OBSERVACAO": observacoes,
+                        "DESCRICAO_SERVICO": descricao, "VALOR_TOTAL": dinheiro.formatar(nova_fatura['valor_total_centavos']), "OBSERVACAO": observacoes,
                         "BAIRRO_CLIENTE": "", "CIDADE_CLIENTE": contrato_obj['cliente']['cidade'], "CEP_CLIENTE": contrato_obj['cliente']['cep']
                     }
-                    st.session_state.documento_gerado = utils.gerar_fatura_docx(dados_template)
+                    st.session_state.tarefa_fatura = renderizacao.servico.submeter_interativo("fatura", dados_template)
                     st.session_state.nome_arquivo_doc = f"FATURA_{novo_numero_fatura}_{contrato_obj['cliente']['nome_razao_social']}.docx"
                     st.success("Fatura gerada e salva com sucesso!")
 
-    if 'documento_gerado' in st.session_state:
-        st.download_button(
-            "Baixar Fatura em Word (.docx)", 
-            data=st.session_state.documento_gerado, 
-            file_name=st.session_state.nome_arquivo_doc, 
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-        )
-        del st.session_state['documento_gerado']
+    if 'tarefa_fatura' in st.session_state:
+        tarefa_fatura = st.session_state.tarefa_fatura
+        documentos.exibir_download(tarefa_fatura, "Baixar Fatura em Word (.docx)", st.session_state.nome_arquivo_doc)
+        # Como antes, o botão aparece uma única vez depois que o documento fica pronto
+        if tarefa_fatura.finalizada():
+            del st.session_state['tarefa_fatura']
 
 # --- Aba 2: Gerenciar Faturas Existentes ---
-with tab2:
+if aba == ABAS[1]:
     st.header("Consultar e Gerenciar Faturas")
     
     status_opcoes = ["Todas", "Pendente", "Liquidada", "Cancelada"]
@@ -131,7 +156,7 @@ with tab2:
             expander_title = (
                 f"{cor_status} **Fatura Nº {f['numero_fatura']}** | "
                 f"Cliente: **{f['cliente_info']['nome_razao_social']}** | "
-                f"Venc: {datetime.fromisoformat(f['data_vencimento']).strftime('%d/%m/%Y')} | R$ {f['valor_total']}"
+                f"Venc: {datetime.fromisoformat(f['data_vencimento']).strftime('%d/%m/%Y')} | R$ {dinheiro.formatar(dinheiro.centavos(f, 'valor_total'))}"
             )
 
             with st.expander(expander_title):
@@ -144,18 +169,9 @@ with tab2:
                 
                 cols_acoes = st.columns(4)
                 
-                # Botão de Baixar Novamente
+                # Botão de Baixar Novamente (o documento só é gerado no clique, em segundo plano)
                 with cols_acoes[0]:
-                    dados_template_dl = {
-                        "NUMERO_FATURA": f.get("numero_fatura"), "DATA_EMISSAO": datetime.fromisoformat(f.get("data_emissao")).strftime('%d/%m/%Y'),
-                        "NOME_CLIENTE": f['cliente_info']['nome_razao_social'], "CNPJ_CLIENTE": f['cliente_info']['cpf_cnpj'],
-                        "ENDERECO_CLIENTE": f['cliente_info']['endereco'], "NUMERO_CONTRATO": f['contrato_info']['numero'],
-                        "FORMA_PAGAMENTO": f.get("forma_pagamento"), "DATA_VENCIMENTO": datetime.fromisoformat(f.get("data_vencimento")).strftime('%d/%m/%Y'),
-                        "DESCRICAO_SERVICO": f.get("descricao_servico"), "VALOR_TOTAL": f.get("valor_total"), "OBSERVACAO": f.get("observacao"),
-                        "BAIRRO_CLIENTE": "", "CIDADE_CLIENTE": f['cliente_info']['cidade'], "CEP_CLIENTE": f['cliente_info']['cep']
-                    }
-                    fatura_docx = utils.gerar_fatura_docx(dados_template_dl)
-                    st.download_button("Baixar Novamente", data=fatura_docx, file_name=f"FATURA_{f['numero_fatura']}.docx", mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document", key=f"dl_{f['id_fatura']}")
+                    documentos.exibir_documento_sob_demanda("fatura", lambda: documentos.dados_template_fatura(f), "Baixar Novamente", f"FATURA_{f['numero_fatura']}.docx", key=f"dl_{f['id_fatura']}")
 
                 if status == "Pendente":
                     with cols_acoes[1]:
@@ -170,4 +186,172 @@ with tab2:
                         if st.button("Reverter para Pendente", key=f"revert_{f['id_fatura']}", use_container_width=True):
                             atualizar_status_fatura(drive, invoices_file, faturas_data, f['id_fatura'], "Pendente")
 
+# --- Aba 3: Exportação em Lote ---
+if aba == ABAS[2]:
+    st.header("Exportar Contratos e Faturas do Período")
+
+    hoje = date.today()
+    periodo = st.date_input("Período", value=(hoje.replace(day=1), hoje), format="DD/MM/YYYY", key="periodo_exportacao")
+    col_exp1, col_exp2 = st.columns(2)
+    with col_exp1:
+        incluir_contratos = st.checkbox("Incluir contratos", value=True)
+        status_contratos = st.multiselect("Status dos contratos", ["Ativo", "Encerrado", "Encerrado com Pendências"], default=[])
+    with col_exp2:
+        incluir_faturas = st.checkbox("Incluir faturas", value=True)
+        status_faturas = st.multiselect("Status das faturas", ["Pendente", "Liquidada", "Cancelada"], default=[])
+    st.caption("Deixe o status em branco para incluir todos.")
+
+    if len(periodo) == 2 and st.button("Gerar arquivo ZIP"):
+        inicio, fim = periodo
+        contratos_exp = exportacao.selecionar_contratos(contratos_data, inicio, fim, status_contratos) if incluir_contratos else []
+        faturas_exp = exportacao.selecionar_faturas(faturas_data, inicio, fim, status_faturas) if incluir_faturas else []
+        itens_exportacao = exportacao.montar_itens(contratos_exp, faturas_exp)
+        if not itens_exportacao:
+            st.info("Nenhum documento encontrado para os filtros escolhidos.")
+        else:
+            barra = st.progress(0.0, text="Preparando exportação...")
+            try:
+                caminho_zip = exportacao.exportar_zip(
+                    itens_exportacao,
+                    progresso=lambda feitos, total: barra.progress(feitos / total, text=f"{feitos} de {total} documento(s) gerado(s)"),
+                )
+            except Exception as e:
+                st.error(f"A exportação foi interrompida: {e}. Clique novamente para continuar de onde parou.")
+            else:
+                st.session_state.exportacao_zip = caminho_zip
+                st.session_state.exportacao_nome = f"documentos_{inicio.strftime('%Y%m%d')}_{fim.strftime('%Y%m%d')}.zip"
+
+    if st.session_state.get('exportacao_zip') and os.path.exists(st.session_state.exportacao_zip):
+        with open(st.session_state.exportacao_zip, "rb") as arquivo_zip:
+            st.download_button("Baixar ZIP", data=arquivo_zip, file_name=st.session_state.exportacao_nome, mime="application/zip")
+
+
+# --- Aba 4: Painel Financeiro ---
+if aba == ABAS[3]:
+    st.header("Visão Geral Financeira")
+    # Totais mantidos em memória por versão do invoices.json (ver financeiro.AgregadosFaturas)
+    agregados = financeiro.agregados_faturas(invoices_file, carga.dados["invoices.json"])
+
+    def nome_cliente(id_cliente):
+        return clientes_por_id.get(id_cliente, {}).get('nome_razao_social', id_cliente or "Sem cliente")
+
+    def numero_contrato(id_contrato):
+        return contratos_por_id.get(id_contrato, {}).get('numero_contrato', id_contrato or "Sem contrato")
+
+    # Os agregados guardam centavos; a formatação em reais acontece só aqui, na exibição
+    def em_reais(tabela, colunas):
+        return tabela.assign(**{coluna: tabela[coluna].map(dinheiro.formatar_reais) for coluna in colunas})
+
+    def exibir_totais(totais, atraso):
+        cols_metricas = st.columns(4)
+        cols_metricas[0].metric("Faturado (sem canceladas)", dinheiro.formatar_reais(totais.loc[["Pendente", "Liquidada"], "valor"].sum()))
+        cols_metricas[1].metric("Recebido", dinheiro.formatar_reais(totais.loc["Liquidada", "valor"]))
+        cols_metricas[2].metric("A receber", dinheiro.formatar_reais(totais.loc["Pendente", "valor"]))
+        cols_metricas[3].metric("Vencido", dinheiro.formatar_reais(atraso["valor"].iloc[1:].sum()))
+
+    exibir_totais(agregados.totais(), agregados.atraso())
+
+    col_p1, col_p2 = st.columns(2)
+    with col_p1:
+        st.subheader("Faturamento por Mês")
+        por_mes = agregados.por_status("mes").sort_index()
+        if por_mes.empty:
+            st.info("Nenhuma fatura lançada.")
+        else:
+            st.bar_chart(por_mes[["Liquidada", "Pendente"]].apply(dinheiro.em_reais))
+    with col_p2:
+        st.subheader("Contas a Receber por Atraso")
+        st.dataframe(em_reais(agregados.atraso(), ["valor"]), use_container_width=True)
+
+    st.subheader("Totais por Status")
+    st.dataframe(em_reais(agregados.totais(), ["valor"]), use_container_width=True)
+
+    st.subheader("Clientes")
+    por_cliente = agregados.por_status("cliente")
+    if not por_cliente.empty:
+        por_cliente = por_cliente.sort_values("Pendente", ascending=False)
+        por_cliente.index = [nome_cliente(c) for c in por_cliente.index]
+        st.dataframe(em_reais(por_cliente, financeiro.STATUS_FATURA), use_container_width=True)
+
+    # --- Detalhamento por cliente e por contrato (das mesmas tabelas agregadas) ---
+    st.markdown("---")
+    st.subheader("Detalhamento")
+    ids_clientes = sorted({c for c in agregados.tabela("cliente")["cliente"]}, key=nome_cliente)
+    cliente_detalhe = st.selectbox("Cliente", options=ids_clientes, format_func=nome_cliente, index=None, placeholder="Selecione um cliente")
+    if cliente_detalhe is not None:
+        exibir_totais(agregados.totais(cliente=cliente_detalhe), agregados.atraso(cliente=cliente_detalhe))
+        st.markdown("**Por mês**")
+        st.dataframe(em_reais(agregados.por_status("cliente_mes", cliente=cliente_detalhe).sort_index(), financeiro.STATUS_FATURA), use_container_width=True)
+
+        contratos_cliente = agregados.contratos_do_cliente(cliente_detalhe)
+        contrato_detalhe = st.selectbox("Contrato", options=contratos_cliente, format_func=numero_contrato, index=None, placeholder="Selecione um contrato")
+        if contrato_detalhe is not None:
+            st.dataframe(em_reais(agregados.totais(contrato=contrato_detalhe), ["valor"]), use_container_width=True)
+            faturas_por_id = {f['id_fatura']: f for f in faturas_data}
+            faturas_contrato = [faturas_por_id[i] for i in agregados.faturas_do_contrato(contrato_detalhe) if i in faturas_por_id]
+            st.dataframe(
+                [
+                    {"Fatura": f['numero_fatura'], "Emissão": f['data_emissao'], "Vencimento": f['data_vencimento'], "Status": f.get('status'), "Valor": dinheiro.formatar_reais(dinheiro.centavos(f, 'valor_total'))}
+                    for f in sorted(faturas_contrato, key=lambda f: f['data_emissao'], reverse=True)
+                ],
+                use_container_width=True,
+            )
+
+
+# --- Aba 5: Faturamento Mensal ---
+if aba == ABAS[4]:
+    st.header("Faturamento Mensal dos Contratos de Locação")
+
+    col_m1, col_m2, col_m3 = st.columns(3)
+    with col_m1:
+        mes_referencia = st.date_input("Competência (qualquer dia do mês)", value=date.today().replace(day=1), format="DD/MM/YYYY", key="competencia_mensal")
+    with col_m2:
+        vencimento_mensal = st.date_input("Data de Vencimento", value=date.today() + timedelta(days=10), format="DD/MM/YYYY", key="vencimento_mensal")
+    with col_m3:
+        forma_pagamento_mensal = st.selectbox("Forma de Pagamento", ["BOLETO BANCÁRIO", "PIX", "TRANSFERÊNCIA"], key="forma_pagamento_mensal")
+
+    # Prévia (simulação): nada é gravado até a confirmação
+    plano = faturamento.planejar_por_versao((clients_file, contracts_file, invoices_file), contratos_data, faturas_data, mes_referencia)
+    a_faturar = [item for item in plano if item.faturar]
+    if not plano:
+        st.info("Não há contratos de locação ativos.")
+    else:
+        st.dataframe([item.resumo() for item in plano], use_container_width=True)
+        st.metric(f"{len(a_faturar)} fatura(s) a lançar", dinheiro.formatar_reais(dinheiro.somar([item.valor for item in a_faturar])))
+
+    if a_faturar and st.button(f"Lançar {len(a_faturar)} fatura(s) da competência {mes_referencia.month:02d}/{mes_referencia.year}", type="primary"):
+        try:
+            versao_anterior = utils.versao_dataset(invoices_file)
+            lancadas = faturamento.executar(
+                drive, invoices_file, a_faturar, mes_referencia, vencimento_mensal, forma_pagamento_mensal,
+                usuario=st.session_state.get('nome_usuario'),
+            )
+        except Exception as e:
+            st.error(f"Erro ao lançar as faturas: {e}")
+        else:
+            def registrar_lancadas(agregados):
+                for fatura in lancadas:
+                    agregados.adicionar(fatura)
+            indices.registrar_gravacao(financeiro.AgregadosFaturas, invoices_file, versao_anterior, registrar_lancadas)
+            st.success(f"{len(lancadas)} fatura(s) lançada(s).")
+            if len(lancadas) < len(a_faturar):
+                st.info(f"{len(a_faturar) - len(lancadas)} fatura(s) desta competência já tinham sido lançadas em outra sessão e foram mantidas como estavam.")
+
+            # Os documentos são gerados em paralelo pelo pool de renderização e reunidos em um ZIP
+            if lancadas:
+                itens_mensais = exportacao.montar_itens([], referencias.faturas_resolvidas(lancadas, contratos_por_id, clientes_por_id))
+                barra_mensal = st.progress(0.0, text="Gerando documentos...")
+                try:
+                    st.session_state.faturamento_zip = exportacao.exportar_zip(
+                        itens_mensais,
+                        progresso=lambda feitos, total: barra_mensal.progress(feitos / total, text=f"{feitos} de {total} fatura(s) gerada(s)"),
+                    )
+                    st.session_state.faturamento_nome = f"faturas_{faturamento.competencia(mes_referencia)}.zip"
+                except Exception as e:
+                    st.error(f"As faturas foram lançadas, mas a geração dos documentos falhou: {e}. Use a Exportação em Lote para gerá-los.")
+
+    if st.session_state.get('faturamento_zip') and os.path.exists(st.session_state.faturamento_zip):
+        with open(st.session_state.faturamento_zip, "rb") as arquivo_zip:
+            st.download_button("Baixar Faturas (ZIP)", data=arquivo_zip, file_name=st.session_state.faturamento_nome, mime="application/zip")
+
 utils.exibir_rodape()
\ No newline at end of file
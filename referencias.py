@@ -0,0 +1,106 @@
+# referencias.py
+import utils
+
+# Dados do cliente que entram no texto do contrato (qualificação da locatária). São congelados
+# no contrato no momento da geração, para que o documento possa ser gerado de novo exatamente
+# como foi assinado mesmo que o cadastro do cliente mude depois.
+CAMPOS_SNAPSHOT_CLIENTE = (
+    "id", "tipo_pessoa", "nome_razao_social", "cpf_cnpj", "endereco", "cidade", "estado", "cep", "representante_legal",
+)
+
+
+def snapshot_cliente(cliente):
+    return {campo: cliente.get(campo) for campo in CAMPOS_SNAPSHOT_CLIENTE}
+
+
+def cliente_desconhecido(id_cliente=None):
+    """Cliente usado na visão de uma fatura cujo contrato e cliente foram excluídos (mesmos campos do snapshot)."""
+    return dict.fromkeys(CAMPOS_SNAPSHOT_CLIENTE, "") | {"id": id_cliente, "nome_razao_social": "Cliente não encontrado"}
+
+
+# --- RESOLUÇÃO DAS REFERÊNCIAS ---
+# Contratos guardam `cliente_id` + `cliente_snapshot`; faturas guardam `id_contrato` + `cliente_id`.
+# As funções abaixo montam, na leitura, a visão usada pelas páginas e pelos documentos:
+# contrato['cliente'] e fatura['cliente_info'] / fatura['contrato_info'], como antes.
+# Registros ainda no formato antigo (cliente copiado inteiro) passam sem alteração.
+def resolver_contrato(contrato, clientes_por_id=None):
+    if 'cliente_snapshot' not in contrato:
+        return contrato
+    visao = dict(contrato, cliente=contrato['cliente_snapshot'])
+    if clientes_por_id is not None:
+        visao['cliente_atual'] = clientes_por_id.get(contrato['cliente_id'])
+    return visao
+
+
+def resolver_fatura(fatura, contratos_por_id, clientes_por_id=None):
+    if 'cliente_info' in fatura:
+        return fatura
+    contrato = contratos_por_id.get(fatura.get('id_contrato'))
+    if contrato is not None:
+        # A fatura usa a mesma qualificação do cliente que consta no contrato faturado
+        cliente = resolver_contrato(contrato)['cliente']
+    else:
+        # Contrato excluído: recorre ao cadastro atual do cliente (que também pode ter sido excluído)
+        cliente = (clientes_por_id or {}).get(fatura.get('cliente_id')) or cliente_desconhecido(fatura.get('cliente_id'))
+    return dict(fatura, cliente_info=cliente)
+
+
+_mapas = utils.CachePorVersao()
+
+
+def mapa_por_id(dataset, registros, chave):
+    """Mapa chave → registro, montado uma vez por versão do dataset e compartilhado entre as sessões."""
+    return _mapas.obter(
+        (dataset.nome, chave), utils.versao_dataset(dataset), lambda: {r[chave]: r for r in registros},
+        valido=lambda mapa: len(mapa) == len(registros),
+    )
+
+
+def contratos_resolvidos(contratos_data, clientes_por_id=None):
+    return [resolver_contrato(c, clientes_por_id) for c in contratos_data]
+
+
+def faturas_resolvidas(faturas_data, contratos_por_id, clientes_por_id=None):
+    return [resolver_fatura(f, contratos_por_id, clientes_por_id) for f in faturas_data]
+
+
+# --- MIGRAÇÃO DOS ARQUIVOS ANTIGOS ---
+def migrar_referencias(drive):
+    """
+    Troca as cópias do cliente em contracts.json e invoices.json por referências.
+    Contratos passam a guardar `cliente_id` e o snapshot dos dados usados no documento; faturas
+    perdem `cliente_info` sempre que o contrato delas existe (o documento da fatura usa o snapshot do
+    contrato). Pode ser executada mais de uma vez. Retorna quantos registros foram convertidos.
+    """
+    contracts_file = utils.get_database_file(drive, "contracts.json")
+    contratos = utils.read_data(contracts_file)
+    convertidos_contratos = 0
+    for contrato in contratos:
+        if 'cliente' in contrato and 'cliente_snapshot' not in contrato:
+            cliente = contrato.pop('cliente')
+            contrato['cliente_id'] = cliente.get('id')
+            contrato['cliente_snapshot'] = snapshot_cliente(cliente)
+            convertidos_contratos += 1
+    if convertidos_contratos:
+        utils.write_data(contracts_file, contratos)
+
+    contratos_por_id = {c['id_contrato']: c for c in contratos}
+    invoices_file = utils.get_database_file(drive, "invoices.json")
+    faturas = utils.read_data(invoices_file)
+    convertidas_faturas = 0
+    for fatura in faturas:
+        contrato = contratos_por_id.get(fatura.get('id_contrato'))
+        if 'cliente_info' in fatura and contrato is not None:
+            cliente = fatura.pop('cliente_info')
+            fatura['cliente_id'] = cliente.get('id', contrato.get('cliente_id'))
+            convertidas_faturas += 1
+    if convertidas_faturas:
+        utils.write_data(invoices_file, faturas)
+    return {"contracts.json": convertidos_contratos, "invoices.json": convertidas_faturas}
+
+
+if __name__ == "__main__":
+    # Uso: python referencias.py
+    resumo = migrar_referencias(utils.login_gdrive())
+    for nome, quantidade in resumo.items():
+        print(f"{nome}: {quantidade} registro(s) convertido(s) para referências")
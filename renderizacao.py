@@ -0,0 +1,245 @@
+# renderizacao.py
+import collections
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+
+from settings import get_setting
+
+# Estados de uma tarefa de renderização
+NA_FILA = "na_fila"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+ERRO = "erro"
+EXPIRADA = "expirada"
+
+
+class FilaCheia(Exception):
+    """O limite de tarefas de renderização pendentes foi atingido."""
+
+
+class TempoEsgotado(Exception):
+    """A geração do documento passou do tempo limite."""
+
+
+def _trabalhador(conexao):
+    # Roda no processo de renderização: o import acontece uma vez por processo, que gera um documento por vez
+    import documentos
+
+    while True:
+        try:
+            tipo, dados = conexao.recv()
+        except EOFError:
+            return
+        try:
+            conexao.send(("ok", documentos.gerar(tipo, dados)))
+        except Exception as e:
+            conexao.send(("erro", f"{type(e).__name__}: {e}"))
+
+
+class _ProcessoRenderizacao:
+    """Processo de renderização com um canal (Pipe) próprio, que pode ser encerrado sem afetar os demais."""
+
+    def __init__(self, contexto):
+        self.conexao, conexao_filho = contexto.Pipe()
+        self.processo = contexto.Process(target=_trabalhador, args=(conexao_filho,), name="renderizacao", daemon=True)
+        self.processo.start()
+        conexao_filho.close()
+
+    def encerrar(self):
+        self.processo.kill()
+        self.processo.join()
+        self.conexao.close()
+
+
+class TarefaRenderizacao:
+    """Referência a um documento sendo gerado em segundo plano."""
+
+    def __init__(self, id_tarefa, tipo, chave, resultado=None, timeout=None):
+        self.id = id_tarefa
+        self.tipo = tipo
+        self.chave = chave
+        self.criada_em = time.monotonic()
+        self.timeout = timeout
+        self.prazo = self.criada_em + timeout if timeout else None
+        self.erro = None
+        self._resultado = resultado
+        self._estado = CONCLUIDA if resultado is not None else NA_FILA
+        self._lock = threading.Lock()
+        # Sinalizado quando a tarefa chega ao estado final
+        self._fim = threading.Event()
+        if resultado is not None:
+            self._fim.set()
+
+    @property
+    def estado(self):
+        return self._estado
+
+    def _iniciar(self):
+        """Passa a tarefa da fila para execução. Retorna False se ela já terminou (expirou na fila)."""
+        with self._lock:
+            if self._estado != NA_FILA:
+                return False
+            self._estado = EXECUTANDO
+            return True
+
+    def _finalizar(self, estado, de, resultado=None, erro=None):
+        """Leva a tarefa ao estado final se ela ainda estiver em um dos estados `de`. Retorna se levou."""
+        with self._lock:
+            if self._estado not in de:
+                return False
+            self._resultado, self.erro, self._estado = resultado, erro, estado
+        self._fim.set()
+        return True
+
+    def finalizada(self):
+        return self._fim.is_set()
+
+    def descricao_estado(self):
+        estado = self.estado
+        if estado == NA_FILA:
+            return "Documento na fila de geração..."
+        if estado == EXECUTANDO:
+            return f"Gerando documento... ({time.monotonic() - self.criada_em:.0f}s)"
+        if estado == ERRO:
+            return f"Erro na geração: {self.erro}"
+        if estado == EXPIRADA:
+            return f"A geração passou do tempo limite de {self.timeout:.0f}s."
+        return "Documento pronto."
+
+    def resultado(self, timeout=None):
+        """Espera a tarefa terminar e retorna o documento. Levanta TempoEsgotado se ela expirou."""
+        if not self._fim.wait(timeout):
+            raise TimeoutError()
+        if self.estado == EXPIRADA:
+            raise TempoEsgotado(self.descricao_estado())
+        if self.estado == ERRO:
+            raise self.erro
+        return self._resultado
+
+
+class ServicoRenderizacao:
+    """
+    Gera documentos .docx em processos próprios, fora da thread do script do Streamlit.
+    Cada um dos `processos` processos de renderização é atendido por uma thread que lhe entrega
+    uma tarefa por vez e espera o resultado até o prazo da tarefa (timeout, contado a partir da
+    submissão). Uma tarefa que passa do prazo na fila é descartada; uma que passa do prazo
+    rodando tem o seu processo encerrado (só ele: os outros processos e as suas tarefas seguem)
+    e substituído por um novo na tarefa seguinte.
+    A quantidade de tarefas pendentes é limitada (max_pendentes); ao atingir o limite, submeter()
+    levanta FilaCheia. Os documentos prontos vão para o cache de documentos.py, então uma tarefa
+    repetida termina na hora.
+    """
+
+    def __init__(self, processos, max_pendentes, timeout):
+        self.processos = processos
+        self.timeout = timeout
+        self._vagas = threading.BoundedSemaphore(max_pendentes)
+        self._fila = collections.deque()
+        self._condicao = threading.Condition()
+        self._threads = []
+        self._encerrado = False
+        self._ids = itertools.count(1)
+
+    def _iniciar_threads(self):
+        with self._condicao:
+            while len(self._threads) < self.processos:
+                thread = threading.Thread(target=self._atender, name=f"renderizacao-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submeter(self, tipo, dados):
+        """Envia um documento para geração e retorna a TarefaRenderizacao correspondente."""
+        import documentos
+
+        chave = documentos.chave_documento(tipo, dados)
+        conteudo = documentos.cache.get(chave)
+        if conteudo is not None:
+            return TarefaRenderizacao(next(self._ids), tipo, chave, resultado=conteudo)
+        if not self._vagas.acquire(blocking=False):
+            raise FilaCheia("Muitos documentos sendo gerados no momento. Tente novamente em instantes.")
+        tarefa = TarefaRenderizacao(next(self._ids), tipo, chave, timeout=self.timeout)
+        self._iniciar_threads()
+        with self._condicao:
+            self._fila.append((tarefa, dados))
+            self._condicao.notify()
+        prazo = threading.Timer(self.timeout, self._finalizar, (tarefa, EXPIRADA, (NA_FILA,)))
+        prazo.daemon = True
+        prazo.start()
+        return tarefa
+
+    def _finalizar(self, tarefa, estado, de, resultado=None, erro=None):
+        import documentos
+
+        if tarefa._finalizar(estado, de, resultado, erro):
+            self._vagas.release()
+            if estado == CONCLUIDA:
+                documentos.cache.put(tarefa.chave, resultado)
+
+    def _atender(self):
+        """Entrega as tarefas da fila a um processo de renderização, uma por vez, até o prazo de cada uma."""
+        contexto = multiprocessing.get_context("spawn")  # "spawn" evita copiar por fork as threads do Streamlit
+        processo = None
+        while True:
+            with self._condicao:
+                while not self._fila and not self._encerrado:
+                    self._condicao.wait()
+                if self._encerrado:
+                    break
+                tarefa, dados = self._fila.popleft()
+            if not tarefa._iniciar():
+                continue
+            try:
+                if processo is None:
+                    processo = _ProcessoRenderizacao(contexto)
+                processo.conexao.send((tarefa.tipo, dados))
+                if not processo.conexao.poll(max(0.0, tarefa.prazo - time.monotonic())):
+                    # Passou do prazo: o processo, que só roda esta tarefa, é encerrado
+                    processo.encerrar()
+                    processo = None
+                    self._finalizar(tarefa, EXPIRADA, (EXECUTANDO,))
+                    continue
+                situacao, valor = processo.conexao.recv()
+            except Exception as e:
+                # O processo não iniciou ou morreu no meio da geração (ex.: falta de memória): é
+                # substituído na próxima tarefa, e esta thread continua atendendo a fila
+                if processo is not None:
+                    processo.encerrar()
+                    processo = None
+                erro = RuntimeError(f"O processo de renderização falhou ({e or type(e).__name__})")
+                self._finalizar(tarefa, ERRO, (EXECUTANDO,), erro=erro)
+                continue
+            if situacao == "ok":
+                self._finalizar(tarefa, CONCLUIDA, (EXECUTANDO,), resultado=valor)
+            else:
+                self._finalizar(tarefa, ERRO, (EXECUTANDO,), erro=RuntimeError(valor))
+        if processo is not None:
+            processo.encerrar()
+
+    def submeter_interativo(self, tipo, dados):
+        """Como submeter(), mas com a fila cheia gera o documento na hora em vez de recusar o pedido."""
+        try:
+            return self.submeter(tipo, dados)
+        except FilaCheia:
+            return TarefaRenderizacao(next(self._ids), tipo, None, resultado=self._gerar_local(tipo, dados))
+
+    def _gerar_local(self, tipo, dados):
+        import documentos
+
+        conteudo = documentos.gerar(tipo, dados)
+        documentos.cache.put(documentos.chave_documento(tipo, dados), conteudo)
+        return conteudo
+
+    def encerrar(self):
+        with self._condicao:
+            self._encerrado = True
+            self._condicao.notify_all()
+
+
+servico = ServicoRenderizacao(
+    processos=get_setting("renderizacao", "processos", min(2, os.cpu_count() or 1)),
+    max_pendentes=get_setting("renderizacao", "max_pendentes", 16),
+    timeout=get_setting("renderizacao", "timeout", 60),
+)
@@ -0,0 +1,112 @@
+# serializacao.py
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError:  # dependência opcional
+    zstandard = None
+
+try:
+    import msgpack
+except ImportError:  # dependência opcional
+    msgpack = None
+
+# Cabeçalho dos arquivos gravados por este módulo: assinatura, versão do cabeçalho,
+# tamanho do nome do formato e o nome (ex.: b"json+gzip"). Arquivos sem a assinatura
+# são JSON puro no formato antigo (indentado) e continuam sendo lidos normalmente.
+ASSINATURA = b"RKR"
+VERSAO_CABECALHO = 1
+
+# Formato que grava exatamente como antes (JSON indentado, sem cabeçalho)
+FORMATO_LEGADO = "legado"
+
+
+class FormatoIndisponivel(Exception):
+    """O formato pedido (ou o de um arquivo lido) depende de um pacote que não está instalado."""
+
+
+def _json_para_bytes(dados):
+    return json.dumps(dados, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_de_bytes(conteudo):
+    return json.loads(conteudo.decode("utf-8"))
+
+
+def _msgpack_para_bytes(dados):
+    return msgpack.packb(dados, use_bin_type=True)
+
+
+def _msgpack_de_bytes(conteudo):
+    return msgpack.unpackb(conteudo, raw=False)
+
+
+SERIALIZADORES = {
+    "json": (_json_para_bytes, _json_de_bytes, lambda: True),
+    "msgpack": (_msgpack_para_bytes, _msgpack_de_bytes, lambda: msgpack is not None),
+}
+
+# mtime=0 deixa a saída do gzip determinística: o mesmo conteúdo gera o mesmo md5 no Drive
+COMPRESSORES = {
+    "": (lambda b: b, lambda b: b, lambda: True),
+    "gzip": (lambda b: gzip.compress(b, compresslevel=6, mtime=0), gzip.decompress, lambda: True),
+    "zstd": (
+        lambda b: zstandard.ZstdCompressor(level=6).compress(b),
+        lambda b: zstandard.ZstdDecompressor().decompress(b),
+        lambda: zstandard is not None,
+    ),
+}
+
+
+def _partes(formato):
+    serializador, _, compressor = formato.partition("+")
+    if serializador not in SERIALIZADORES or compressor not in COMPRESSORES:
+        raise ValueError(f"Formato de armazenamento desconhecido: {formato}")
+    if not (SERIALIZADORES[serializador][2]() and COMPRESSORES[compressor][2]()):
+        raise FormatoIndisponivel(f"O formato {formato} exige um pacote opcional que não está instalado")
+    return SERIALIZADORES[serializador], COMPRESSORES[compressor]
+
+
+def validar_formato(formato):
+    """Levanta ValueError/FormatoIndisponivel se o formato não puder ser usado neste ambiente."""
+    if formato != FORMATO_LEGADO:
+        _partes(formato)
+
+
+def tipo_mime(formato):
+    """Tipo MIME dos arquivos gravados no formato: só o formato legado é JSON puro; os demais têm o cabeçalho binário."""
+    return "application/json" if formato == FORMATO_LEGADO else "application/octet-stream"
+
+
+def codificar(dados, formato):
+    """
+    Serializa os dados no formato informado (ex.: "json+gzip", "msgpack+zstd" ou "legado").
+    Retorna (conteúdo, tamanho), onde tamanho é o do conteúdo antes da compressão.
+    """
+    if formato == FORMATO_LEGADO:
+        conteudo = json.dumps(dados, indent=4, ensure_ascii=False).encode("utf-8")
+        return conteudo, len(conteudo)
+    (serializar, _, _), (comprimir, _, _) = _partes(formato)
+    nome = formato.encode("ascii")
+    bruto = serializar(dados)
+    return ASSINATURA + bytes([VERSAO_CABECALHO, len(nome)]) + nome + comprimir(bruto), len(bruto)
+
+
+def decodificar(conteudo):
+    """
+    Lê um arquivo em qualquer formato suportado, identificando-o pelo cabeçalho.
+    Retorna (dados, tamanho), onde tamanho é o do conteúdo já descomprimido.
+    """
+    if not conteudo.startswith(ASSINATURA):
+        # Arquivo antigo: JSON puro (o Drive às vezes devolve com BOM)
+        texto = conteudo.decode("utf-8-sig")
+        return json.loads(texto), len(conteudo)
+    versao, tamanho_nome = conteudo[len(ASSINATURA)], conteudo[len(ASSINATURA) + 1]
+    if versao != VERSAO_CABECALHO:
+        raise ValueError(f"Versão de cabeçalho não suportada: {versao}")
+    inicio = len(ASSINATURA) + 2
+    formato = conteudo[inicio:inicio + tamanho_nome].decode("ascii")
+    (_, desserializar, _), (_, descomprimir, _) = _partes(formato)
+    bruto = descomprimir(conteudo[inicio + tamanho_nome:])
+    return desserializar(bruto), len(bruto)
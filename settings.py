@@ -0,0 +1,31 @@
+# settings.py
+import os
+
+import streamlit as st
+
+
+# --- LEITURA DE CONFIGURAÇÕES ---
+def get_setting(secao, chave, padrao=None):
+    """
+    Lê uma configuração da aplicação.
+    A variável de ambiente ROCKER_<SECAO>_<CHAVE> tem prioridade (útil para scripts e desenvolvimento);
+    em seguida é consultada a seção [secao] dos segredos do Streamlit. Se nada for encontrado, retorna o padrão.
+    """
+    valor_ambiente = os.environ.get(f"ROCKER_{secao}_{chave}".upper())
+    if valor_ambiente is not None:
+        return _converter(valor_ambiente, padrao)
+    try:
+        return st.secrets[secao][chave]
+    except (AttributeError, KeyError, FileNotFoundError):
+        return padrao
+
+
+def _converter(valor, padrao):
+    # Variáveis de ambiente são sempre texto: converte para o tipo do valor padrão
+    if isinstance(padrao, bool):
+        return valor.strip().lower() in ("1", "true", "sim", "yes", "on")
+    if isinstance(padrao, int):
+        return int(valor)
+    if isinstance(padrao, float):
+        return float(valor)
+    return valor
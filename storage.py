@@ -0,0 +1,1176 @@
+# storage.py
+import atexit
+import copy
+import glob
+import io
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
+from pydrive2.files import ApiRequestError
+
+import serializacao
+from settings import get_setting
+
+logger = logging.getLogger(__name__)
+
+# Chave primária de cada dataset em formato de lista. O config.json é um dicionário simples.
+CHAVES_PRIMARIAS = {
+    "clients.json": "id",
+    "contracts.json": "id_contrato",
+    "invoices.json": "id_fatura",
+    "users.json": "email",
+}
+
+# Datasets conhecidos, usados pelo migrador
+DATASETS = ["clients.json", "contracts.json", "invoices.json", "users.json", "config.json"]
+
+# Datasets cujas alterações são registradas em um diário (append-only), que também serve de auditoria
+DATASETS_COM_DIARIO = {"contracts.json", "invoices.json"}
+
+
+class ConflitoDeVersao(Exception):
+    """O dataset foi alterado por outra sessão entre a leitura e a gravação condicional."""
+
+
+# Número máximo de tentativas de uma alteração que encontra conflito de versão
+MAX_TENTATIVAS_CONFLITO = 8
+
+
+def conteudo_vazio(nome):
+    """Retorna o conteúdo inicial de um dataset que ainda não existe."""
+    return {} if nome == "config.json" else []
+
+
+class Dataset:
+    """
+    Referência a um dataset aberto em um backend de armazenamento.
+    versao_lida é a versão vista na última leitura, usada pelo SQLite na gravação condicional
+    (no Drive a etag guardada nos metadados do arquivo cumpre esse papel).
+    pendentes_lidas é usado pela gravação adiada (ver GravacaoAdiada.write).
+    """
+
+    def __init__(self, backend, nome, arquivo=None, drive=None, diario=None):
+        self.backend = backend
+        self.nome = nome
+        self.arquivo = arquivo
+        self.drive = drive
+        self.diario = diario
+        self.versao_lida = None
+        self.pendentes_lidas = None
+
+
+def processo_ativo(pid):
+    """Se há um processo com esse PID nesta máquina."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# --- DIÁRIO DE ALTERAÇÕES ---
+def nova_entrada(operacao, id_registro, dados=None, usuario=None):
+    """
+    Cria uma entrada de diário. A operação é "create" (dados = registro completo, substitui o
+    registro se o id já existir), "create_new" (como "create", mas não faz nada se o id já
+    existir), "update" (dados = campos alterados) ou "delete".
+    """
+    return {
+        "op": operacao,
+        "id": id_registro,
+        "dados": dados,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "usuario": usuario,
+    }
+
+
+def aplicar_entradas(registros, chave, entradas):
+    """
+    Aplica as entradas de diário sobre a lista de registros, alterando-a no lugar.
+    Reaplicar uma entrada não muda o resultado, então um diário pode ser repetido com segurança.
+    Retorna quantas entradas encontraram o seu registro.
+    """
+    posicoes = {r.get(chave): i for i, r in enumerate(registros)}
+    aplicadas = 0
+    houve_exclusao = False
+    for entrada in entradas:
+        posicao = posicoes.get(entrada["id"])
+        if entrada["op"] == "create_new" and posicao is not None:
+            continue
+        if entrada["op"] in ("create", "create_new"):
+            if posicao is None:
+                posicoes[entrada["id"]] = len(registros)
+                registros.append(dict(entrada["dados"]))
+            else:
+                registros[posicao] = dict(entrada["dados"])
+        elif posicao is None:
+            continue
+        elif entrada["op"] == "update":
+            registros[posicao].update(entrada["dados"])
+        elif entrada["op"] == "delete":
+            registros[posicao] = None
+            del posicoes[entrada["id"]]
+            houve_exclusao = True
+        aplicadas += 1
+    if houve_exclusao:
+        registros[:] = [r for r in registros if r is not None]
+    return aplicadas
+
+
+class StorageBackend:
+    """
+    Interface comum dos backends de armazenamento.
+    As operações de registro (insert/update/delete) viram entradas de diário aplicadas por apply(),
+    que pode ser sobrescrito por backends que sabem alterar uma única linha.
+    """
+
+    def open(self, drive, nome):
+        raise NotImplementedError
+
+    def read(self, dataset):
+        raise NotImplementedError
+
+    def write(self, dataset, dados):
+        raise NotImplementedError
+
+    def version(self, dataset):
+        """
+        Identificador da versão atual do dataset: muda sempre que o conteúdo muda.
+        Serve de chave para estruturas derivadas (ordenações, índices). None se o backend não souber informar.
+        """
+        return None
+
+    def insert(self, dataset, registro, usuario=None):
+        chave = CHAVES_PRIMARIAS[dataset.nome]
+        return self.apply(dataset, [nova_entrada("create", registro[chave], registro, usuario)])
+
+    def update(self, dataset, id_registro, campos, usuario=None):
+        return self.apply(dataset, [nova_entrada("update", id_registro, campos, usuario)])
+
+    def delete(self, dataset, id_registro, usuario=None):
+        return self.apply(dataset, [nova_entrada("delete", id_registro, usuario=usuario)])
+
+    def apply(self, dataset, entradas):
+        """
+        Aplica entradas de diário ao dataset. Retorna True se alguma delas encontrou o seu registro.
+        Passa por modify(): havendo conflito de versão, as entradas são reaplicadas sobre a versão nova.
+        """
+        chave = CHAVES_PRIMARIAS[dataset.nome]
+        return bool(self.modify(dataset, lambda dados: aplicar_entradas(dados, chave, entradas)))
+
+    def modify(self, dataset, funcao):
+        """
+        Lê o dataset, aplica funcao(dados) (que altera os dados no lugar) e grava o resultado
+        de forma atômica. Retorna o valor devolvido pela função.
+        Backends sem gravação condicional fazem apenas a leitura seguida da gravação.
+        """
+        dados = self.read(dataset)
+        resultado = funcao(dados)
+        self.write(dataset, dados)
+        return resultado
+
+
+# --- CACHE DE DATASETS COMPARTILHADO ENTRE SESSÕES ---
+class CacheDatasets:
+    """
+    Cache em memória dos datasets já interpretados, indexado pelo ID do arquivo.
+    Cada entrada guarda a versão (md5Checksum + modifiedDate) do conteúdo; uma entrada só é usada
+    se a versão bater com a dos metadados atuais e se não tiver passado do TTL. O tamanho total
+    (em bytes do conteúdo serializado) é limitado, descartando primeiro as entradas menos usadas.
+    """
+
+    def __init__(self, ttl, max_bytes):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, file_id, versao):
+        with self._lock:
+            entrada = self._entradas.get(file_id)
+            if entrada is None:
+                return None
+            versao_cache, dados, _, criado_em = entrada
+            if versao_cache != versao or time.monotonic() - criado_em > self.ttl:
+                self._remover(file_id)
+                return None
+            self._entradas.move_to_end(file_id)
+        # Cópia para que alterações de uma sessão não vazem para as outras
+        return copy.deepcopy(dados)
+
+    def put(self, file_id, versao, dados, tamanho):
+        if tamanho > self.max_bytes:
+            return
+        dados = copy.deepcopy(dados)
+        with self._lock:
+            self._remover(file_id)
+            self._entradas[file_id] = (versao, dados, tamanho, time.monotonic())
+            self._total_bytes += tamanho
+            while self._total_bytes > self.max_bytes:
+                self._remover(next(iter(self._entradas)))
+
+    def _remover(self, file_id):
+        entrada = self._entradas.pop(file_id, None)
+        if entrada is not None:
+            self._total_bytes -= entrada[2]
+
+
+# --- BACKEND GOOGLE DRIVE (ARQUIVOS JSON) ---
+class DriveJSONStorage(StorageBackend):
+    """
+    Armazena cada dataset como um arquivo JSON no Google Drive (comportamento original).
+    Os nomes dos datasets são resolvidos para IDs do Drive uma única vez e guardados em um
+    mapa persistente (storage.drive_ids_path); depois disso o arquivo é aberto direto pelo ID.
+
+    Contratos e faturas são gravados como um snapshot mais um diário de alterações
+    (ex.: contracts.journal.json). Cada alteração só regrava o diário; quando ele passa de
+    storage.journal_compact_threshold entradas, é incorporado a um novo snapshot e arquivado
+    em um arquivo próprio (ex.: contracts.journal.20250101T120000000000.json).
+
+    O conteúdo dos arquivos é gravado no formato storage.format (padrão JSON compacto com gzip,
+    ver serializacao.py); arquivos em outros formatos, inclusive o JSON indentado antigo, são lidos
+    normalmente e convertidos na próxima gravação.
+    """
+
+    # Campos pedidos ao abrir um arquivo pelo ID (inclui o necessário para baixar o conteúdo)
+    CAMPOS_METADADOS = "id,title,mimeType,labels,downloadUrl,md5Checksum,modifiedDate,createdDate,etag"
+
+    def __init__(self, caminho_ids=None):
+        self.caminho_ids = caminho_ids or get_setting("storage", "drive_ids_path", ".cache/drive_ids.json")
+        self._ids = self._carregar_ids()
+        self._ids_lock = threading.Lock()
+        self._locks_datasets = {}
+        self.cache = CacheDatasets(
+            ttl=get_setting("storage", "cache_ttl", 300),
+            max_bytes=get_setting("storage", "cache_max_bytes", 64 * 1024 * 1024),
+        )
+        self.limite_compactacao = get_setting("storage", "journal_compact_threshold", 200)
+        self.formato = get_setting("storage", "format", "json+gzip")
+        serializacao.validar_formato(self.formato)
+
+    def _carregar_ids(self):
+        try:
+            with open(self.caminho_ids, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _salvar_ids(self):
+        pasta = os.path.dirname(self.caminho_ids)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        temporario = f"{self.caminho_ids}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self._ids, f, indent=4)
+        os.replace(temporario, self.caminho_ids)
+
+    def _registrar_id(self, nome, file_id):
+        with self._ids_lock:
+            if file_id is None:
+                if self._ids.pop(nome, None) is None:
+                    return
+            elif self._ids.get(nome) == file_id:
+                return
+            else:
+                self._ids[nome] = file_id
+            self._salvar_ids()
+
+    def _lock_dataset(self, nome):
+        with self._ids_lock:
+            return self._locks_datasets.setdefault(nome, threading.Lock())
+
+    def _abrir_por_id(self, drive, file_id):
+        """Abre o arquivo pelo ID. Retorna None se ele não existir mais ou estiver na lixeira."""
+        arquivo = drive.CreateFile({'id': file_id})
+        try:
+            arquivo.FetchMetadata(fields=self.CAMPOS_METADADOS)
+        except ApiRequestError as e:
+            if e.error.get("code") == 404 or e.GetField("reason") == "notFound":
+                return None
+            raise
+        if arquivo.get("labels", {}).get("trashed"):
+            return None
+        return arquivo
+
+    @staticmethod
+    def _buscar(drive, nome):
+        file_list = drive.ListFile({'q': f"title='{nome}' and trashed=false"}).GetList()
+        # Em caso de duplicatas, o arquivo mais antigo é sempre o oficial
+        return sorted(file_list, key=lambda f: (f.get("createdDate", ""), f["id"]))
+
+    @staticmethod
+    def _nome_diario(nome):
+        return nome.replace(".json", ".journal.json")
+
+    def open(self, drive, nome):
+        diario = None
+        if nome in DATASETS_COM_DIARIO:
+            diario = Dataset(self, self._nome_diario(nome), self._abrir_arquivo(drive, self._nome_diario(nome)), drive)
+        return Dataset(self, nome, self._abrir_arquivo(drive, nome), drive, diario)
+
+    def _abrir_arquivo(self, drive, nome):
+        file_id = self._ids.get(nome)
+        if file_id:
+            arquivo = self._abrir_por_id(drive, file_id)
+            if arquivo is not None:
+                return arquivo
+            self._registrar_id(nome, None)
+
+        # O lock evita que duas sessões do mesmo processo criem o mesmo arquivo ao mesmo tempo
+        with self._lock_dataset(nome):
+            file_id = self._ids.get(nome)
+            arquivo = self._abrir_por_id(drive, file_id) if file_id else None
+            if arquivo is None:
+                arquivo = self._buscar_ou_criar(drive, nome)
+            self._registrar_id(nome, arquivo["id"])
+        return arquivo
+
+    def _buscar_ou_criar(self, drive, nome):
+        file_list = self._buscar(drive, nome)
+        if file_list:
+            return file_list[0]
+        file = drive.CreateFile({'title': nome, 'mimeType': serializacao.tipo_mime(self.formato)})
+        file.content = io.BytesIO(serializacao.codificar(conteudo_vazio(nome), self.formato)[0])
+        file.Upload()
+        # Outro processo pode ter criado o mesmo arquivo em paralelo: todos ficam com o mais antigo
+        file_list = self._buscar(drive, nome)
+        if file_list and file_list[0]["id"] != file["id"]:
+            file.Trash()
+            return file_list[0]
+        return file
+
+    @staticmethod
+    def _versao(arquivo):
+        return arquivo.get("md5Checksum"), arquivo.get("modifiedDate")
+
+    def version(self, dataset):
+        if dataset.diario is None:
+            return self._versao(dataset.arquivo)
+        return self._versao(dataset.arquivo) + self._versao(dataset.diario.arquivo)
+
+    def _ler_json(self, dataset):
+        # Os metadados já vieram ao abrir o arquivo; o download só acontece se a versão mudou
+        arquivo = dataset.arquivo
+        versao = self._versao(arquivo)
+        if versao[0] is not None:
+            dados = self.cache.get(arquivo["id"], versao)
+            if dados is not None:
+                return dados
+        # Sempre baixa: o conteúdo guardado no objeto do arquivo pode ser de uma versão anterior
+        arquivo.FetchContent()
+        content = arquivo.content.getvalue()
+        if content:
+            dados, tamanho = serializacao.decodificar(content)
+        else:
+            dados, tamanho = conteudo_vazio(dataset.nome), 0
+        self.cache.put(arquivo["id"], versao, dados, tamanho)
+        return dados
+
+    def _gravar_json(self, dataset, dados, condicional=False):
+        content, tamanho = serializacao.codificar(dados, self.formato)
+        # O tipo acompanha o formato gravado (arquivos antigos em JSON passam a binário na primeira gravação)
+        tipo = serializacao.tipo_mime(self.formato)
+        if condicional:
+            self._upload_condicional(dataset.arquivo, content, tipo)
+        else:
+            dataset.arquivo['mimeType'] = tipo
+            dataset.arquivo.content = io.BytesIO(content)
+            dataset.arquivo.Upload()
+        # A resposta do upload traz a nova versão do arquivo: o cache é atualizado sem novo download
+        self.cache.put(dataset.arquivo["id"], self._versao(dataset.arquivo), dados, tamanho)
+
+    @staticmethod
+    def _upload_condicional(arquivo, content, tipo):
+        """Envia o conteúdo somente se o arquivo ainda estiver na versão (etag) lida; senão levanta ConflitoDeVersao."""
+        # O pydrive2 não expõe o If-Match: a requisição é montada no serviço da API (auth.service), com o
+        # objeto HTTP autorizado da thread. Ambos dependem da versão do pydrive2 fixada no requirements.txt
+        request = arquivo.auth.service.files().update(
+            fileId=arquivo["id"],
+            body={"mimeType": tipo},
+            media_body=MediaIoBaseUpload(io.BytesIO(content), tipo),
+            supportsAllDrives=True,
+        )
+        request.headers["If-Match"] = arquivo["etag"]
+        http = getattr(arquivo.auth.thread_local, "http", None) or arquivo.auth.Get_Http_Object()
+        try:
+            metadata = request.execute(http=http)
+        except HttpError as e:
+            if e.resp.status == 412:
+                raise ConflitoDeVersao(arquivo["title"]) from e
+            raise ApiRequestError(e)
+        arquivo.UpdateMetadata(metadata)
+        arquivo.content = io.BytesIO(content)
+
+    def _recarregar_metadados(self, dataset):
+        dataset.arquivo.FetchMetadata(fields=self.CAMPOS_METADADOS)
+        if dataset.diario is not None:
+            dataset.diario.arquivo.FetchMetadata(fields=self.CAMPOS_METADADOS)
+
+    def _repetir_em_conflito(self, dataset, operacao):
+        """
+        Executa operacao() até ela gravar sem conflito de versão. A cada conflito os metadados
+        (etag) são recarregados, para que a próxima tentativa leia a versão nova e reaplique a
+        alteração sobre ela. Não há lock global: sessões que alteram o mesmo arquivo só
+        repetem o trabalho quando de fato se cruzam.
+        """
+        for tentativa in range(MAX_TENTATIVAS_CONFLITO):
+            if tentativa:
+                time.sleep(random.uniform(0.05, 0.2) * tentativa)
+                self._recarregar_metadados(dataset)
+            try:
+                return operacao()
+            except ConflitoDeVersao:
+                continue
+        raise ConflitoDeVersao(dataset.nome)
+
+    def modify(self, dataset, funcao):
+        # Gravação condicional pela etag; em caso de conflito relê a versão nova e reaplica a função
+        if dataset.diario is not None:
+            raise ValueError(f"modify() não se aplica a datasets com diário: {dataset.nome}")
+
+        def tentar():
+            dados = self._ler_json(dataset)
+            resultado = funcao(dados)
+            self._gravar_json(dataset, dados, condicional=True)
+            return resultado
+
+        return self._repetir_em_conflito(dataset, tentar)
+
+    def read(self, dataset):
+        dados = self._ler_json(dataset)
+        if dataset.diario is not None:
+            aplicar_entradas(dados, CHAVES_PRIMARIAS[dataset.nome], self._ler_json(dataset.diario))
+        return dados
+
+    def write(self, dataset, dados):
+        # Só grava se o arquivo ainda estiver na versão lida; senão levanta ConflitoDeVersao
+        if dataset.diario is None:
+            self._gravar_json(dataset, dados, condicional=True)
+            return
+        with self._lock_dataset(dataset.diario.nome):
+            etag_lida = dataset.diario.arquivo["etag"]
+            dataset.diario.arquivo.FetchMetadata(fields=self.CAMPOS_METADADOS)
+            if dataset.diario.arquivo["etag"] != etag_lida:
+                # Alguém registrou alterações depois da leitura: gravar por cima as desfaria
+                raise ConflitoDeVersao(dataset.nome)
+            self._compactar(dataset, dados, self._ler_json(dataset.diario))
+
+    def apply(self, dataset, entradas):
+        if dataset.diario is None:
+            return super().apply(dataset, entradas)
+        chave = CHAVES_PRIMARIAS[dataset.nome]
+
+        def tentar():
+            # Confere no estado atual se as entradas têm efeito antes de gravar
+            if not aplicar_entradas(self.read(dataset), chave, entradas):
+                return False
+            diario = self._ler_json(dataset.diario) + entradas
+            self._gravar_json(dataset.diario, diario, condicional=True)
+            if len(diario) >= self.limite_compactacao:
+                dados = self._ler_json(dataset)
+                aplicar_entradas(dados, chave, diario)
+                try:
+                    self._compactar(dataset, dados, diario)
+                except ConflitoDeVersao:
+                    # O snapshot mudou no meio (outra sessão compactou): nada foi retirado do diário
+                    # nem arquivado, e as entradas desta alteração já estão gravadas nele
+                    pass
+            return True
+
+        with self._lock_dataset(dataset.diario.nome):
+            return self._repetir_em_conflito(dataset, tentar)
+
+    def _compactar(self, dataset, dados, diario):
+        """
+        Grava o novo snapshot, tira do diário as entradas incorporadas a ele e só então as arquiva
+        (gravações condicionais). Arquivar por último garante que cada entrada é arquivada uma única
+        vez: se outra sessão compactar no meio, as entradas ficam para o arquivo dela.
+        """
+        self._gravar_json(dataset, dados, condicional=True)
+        if not diario or not self._retirar_do_diario(dataset, diario):
+            return
+        # Microssegundos no nome: duas compactações no mesmo segundo não geram arquivos com o mesmo título
+        marca_tempo = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        historico = dataset.drive.CreateFile({
+            'title': dataset.diario.nome.replace(".json", f".{marca_tempo}.json"),
+            'mimeType': serializacao.tipo_mime(self.formato),
+        })
+        historico.content = io.BytesIO(serializacao.codificar(diario, self.formato)[0])
+        historico.Upload()
+
+    def _retirar_do_diario(self, dataset, entradas):
+        """
+        Tira do início do diário as entradas já incorporadas ao snapshot, mantendo as que outras
+        sessões acrescentaram depois delas. Retorna False se elas não estão mais no diário
+        (outra sessão compactou) ou se os conflitos não deixaram gravar.
+        """
+        atual = entradas
+        for tentativa in range(MAX_TENTATIVAS_CONFLITO):
+            if tentativa:
+                dataset.diario.arquivo.FetchMetadata(fields=self.CAMPOS_METADADOS)
+                atual = self._ler_json(dataset.diario)
+                if atual[:len(entradas)] != entradas:
+                    return False
+            try:
+                self._gravar_json(dataset.diario, atual[len(entradas):], condicional=True)
+                return True
+            except ConflitoDeVersao:
+                continue
+        return False
+
+
+# --- BACKEND SQLITE LOCAL ---
+# Campos pelos quais as páginas filtram: viram colunas da tabela, com índice
+COLUNAS_SQLITE = {
+    "contracts.json": ("status", "data_geracao", "cliente_id"),
+    "invoices.json": ("status", "data_emissao", "id_contrato", "cliente_id"),
+}
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Armazena os datasets em tabelas de um banco SQLite local.
+    Cada registro ocupa uma linha com chave primária própria, então inserir, alterar
+    ou excluir um registro não regrava o restante do dataset. O registro completo fica em JSON
+    na coluna `dados`; os campos de COLUNAS_SQLITE são colunas geradas a partir dele (sempre
+    iguais ao JSON) e indexadas, para consultas e relatórios direto no banco.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._criar_tabelas()
+
+    def _conexao(self):
+        # Uma conexão por thread: cada sessão do Streamlit roda em sua própria thread
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            conexao = sqlite3.connect(self.caminho, timeout=30)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+        return conexao
+
+    @staticmethod
+    def _tabela(nome):
+        return nome.rsplit(".", 1)[0]
+
+    def _criar_tabelas(self):
+        conexao = self._conexao()
+        with conexao:
+            for nome in CHAVES_PRIMARIAS:
+                conexao.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self._tabela(nome)} (chave TEXT PRIMARY KEY, dados TEXT NOT NULL)"
+                )
+            conexao.execute("CREATE TABLE IF NOT EXISTS config (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)")
+            conexao.execute(
+                "CREATE TABLE IF NOT EXISTS diario (seq INTEGER PRIMARY KEY AUTOINCREMENT, dataset TEXT NOT NULL, "
+                "operacao TEXT NOT NULL, chave TEXT NOT NULL, dados TEXT, timestamp TEXT NOT NULL, usuario TEXT)"
+            )
+            conexao.execute("CREATE TABLE IF NOT EXISTS versoes (dataset TEXT PRIMARY KEY, versao INTEGER NOT NULL)")
+            for nome, colunas in COLUNAS_SQLITE.items():
+                tabela = self._tabela(nome)
+                existentes = {linha[1] for linha in conexao.execute(f"PRAGMA table_xinfo({tabela})")}
+                for coluna in colunas:
+                    # Bancos criados antes das colunas ganham as que faltam (colunas virtuais não regravam as linhas)
+                    if coluna not in existentes:
+                        conexao.execute(
+                            f"ALTER TABLE {tabela} ADD COLUMN {coluna} TEXT "
+                            f"GENERATED ALWAYS AS (json_extract(dados, '$.{coluna}')) VIRTUAL"
+                        )
+                    conexao.execute(f"CREATE INDEX IF NOT EXISTS {tabela}_{coluna} ON {tabela} ({coluna})")
+
+    def _validar(self, nome):
+        if nome != "config.json" and nome not in CHAVES_PRIMARIAS:
+            raise ValueError(f"Dataset desconhecido para o backend SQLite: {nome}")
+
+    def open(self, drive, nome):
+        self._validar(nome)
+        return Dataset(self, nome)
+
+    def read(self, dataset):
+        conexao = self._conexao()
+        # Versão e dados lidos na mesma transação, para que a versão corresponda aos dados
+        propria = not conexao.in_transaction
+        if propria:
+            conexao.execute("BEGIN")
+        try:
+            dataset.versao_lida = self.version(dataset)
+            if dataset.nome == "config.json":
+                linhas = conexao.execute("SELECT chave, valor FROM config").fetchall()
+                return {chave: json.loads(valor) for chave, valor in linhas}
+            linhas = conexao.execute(f"SELECT dados FROM {self._tabela(dataset.nome)} ORDER BY rowid").fetchall()
+            return [json.loads(dados) for (dados,) in linhas]
+        finally:
+            if propria:
+                conexao.commit()
+
+    def write(self, dataset, dados):
+        # Só grava se o dataset ainda estiver na versão lida; senão levanta ConflitoDeVersao
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            if dataset.versao_lida is not None and self.version(dataset) != dataset.versao_lida:
+                raise ConflitoDeVersao(dataset.nome)
+            self._gravar(conexao, dataset, dados)
+        except BaseException:
+            conexao.rollback()
+            raise
+        conexao.commit()
+        dataset.versao_lida = self.version(dataset)
+
+    def version(self, dataset):
+        linha = self._conexao().execute("SELECT versao FROM versoes WHERE dataset = ?", (dataset.nome,)).fetchone()
+        return linha[0] if linha else 0
+
+    @staticmethod
+    def _incrementar_versao(conexao, nome):
+        conexao.execute(
+            "INSERT INTO versoes (dataset, versao) VALUES (?, 1) ON CONFLICT(dataset) DO UPDATE SET versao = versao + 1",
+            (nome,),
+        )
+
+    def _gravar(self, conexao, dataset, dados):
+        """Grava só a diferença para o que está no banco, pela chave primária: linhas novas, alteradas e excluídas."""
+        self._incrementar_versao(conexao, dataset.nome)
+        if dataset.nome == "config.json":
+            tabela, coluna = "config", "valor"
+            linhas = [(chave, json.dumps(valor, ensure_ascii=False)) for chave, valor in dados.items()]
+        else:
+            chave = CHAVES_PRIMARIAS[dataset.nome]
+            tabela, coluna = self._tabela(dataset.nome), "dados"
+            linhas = [(r[chave], json.dumps(r, ensure_ascii=False)) for r in dados]
+        atuais = dict(conexao.execute(f"SELECT chave, {coluna} FROM {tabela}"))
+        novas = dict(linhas)
+        conexao.executemany(f"DELETE FROM {tabela} WHERE chave = ?", [(c,) for c in atuais if c not in novas])
+        conexao.executemany(
+            f"INSERT INTO {tabela} (chave, {coluna}) VALUES (?, ?) "
+            f"ON CONFLICT(chave) DO UPDATE SET {coluna} = excluded.{coluna}",
+            [(c, valor) for c, valor in linhas if atuais.get(c) != valor],
+        )
+
+    def modify(self, dataset, funcao):
+        # BEGIN IMMEDIATE bloqueia outros escritores até o fim da transação
+        conexao = self._conexao()
+        conexao.execute("BEGIN IMMEDIATE")
+        try:
+            dados = self.read(dataset)
+            resultado = funcao(dados)
+            self._gravar(conexao, dataset, dados)
+        except BaseException:
+            conexao.rollback()
+            raise
+        conexao.commit()
+        dataset.versao_lida = self.version(dataset)
+        return resultado
+
+    def apply(self, dataset, entradas):
+        tabela = self._tabela(dataset.nome)
+        conexao = self._conexao()
+        # Entradas que encontraram o seu registro: só elas incrementam a versão e vão para o diário
+        aplicadas = []
+        # BEGIN IMMEDIATE já na leitura do update: sem ele o SELECT não abre transação e duas
+        # sessões alterando campos diferentes do mesmo registro perderiam uma das alterações
+        conexao.execute("BEGIN IMMEDIATE")
+        with conexao:
+            for entrada in entradas:
+                if entrada["op"] == "create_new":
+                    cursor = conexao.execute(
+                        f"INSERT INTO {tabela} (chave, dados) VALUES (?, ?) ON CONFLICT(chave) DO NOTHING",
+                        (entrada["id"], json.dumps(entrada["dados"], ensure_ascii=False)),
+                    )
+                elif entrada["op"] == "create":
+                    cursor = conexao.execute(
+                        f"INSERT INTO {tabela} (chave, dados) VALUES (?, ?) "
+                        "ON CONFLICT(chave) DO UPDATE SET dados = excluded.dados",
+                        (entrada["id"], json.dumps(entrada["dados"], ensure_ascii=False)),
+                    )
+                elif entrada["op"] == "update":
+                    linha = conexao.execute(f"SELECT dados FROM {tabela} WHERE chave = ?", (entrada["id"],)).fetchone()
+                    if linha is None:
+                        continue
+                    registro = json.loads(linha[0])
+                    registro.update(entrada["dados"])
+                    cursor = conexao.execute(
+                        f"UPDATE {tabela} SET dados = ? WHERE chave = ?",
+                        (json.dumps(registro, ensure_ascii=False), entrada["id"]),
+                    )
+                else:
+                    cursor = conexao.execute(f"DELETE FROM {tabela} WHERE chave = ?", (entrada["id"],))
+                if cursor.rowcount > 0:
+                    aplicadas.append(entrada)
+            if aplicadas:
+                self._incrementar_versao(conexao, dataset.nome)
+            if dataset.nome in DATASETS_COM_DIARIO:
+                conexao.executemany(
+                    "INSERT INTO diario (dataset, operacao, chave, dados, timestamp, usuario) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (dataset.nome, e["op"], e["id"], json.dumps(e["dados"], ensure_ascii=False), e["timestamp"], e["usuario"])
+                        for e in aplicadas
+                    ],
+                )
+        return bool(aplicadas)
+
+
+# --- GRAVAÇÃO ADIADA (WRITE-BEHIND) ---
+class GravacaoAdiada(StorageBackend):
+    """
+    Envolve outro backend e adia as alterações de registro (insert/update/delete): as entradas
+    de diário vão para uma fila por dataset e são enviadas em lote, com um único apply() (um
+    upload no Drive) por dataset a cada `intervalo` segundos ou assim que a fila chega a
+    `tamanho_lote` entradas.
+
+    Antes de enfileirar, as entradas são conferidas no estado atual do dataset: uma alteração
+    ou exclusão de registro que não existe é recusada na hora, como nos demais backends.
+    Cada entrada é gravada em disco (pasta de staging, um arquivo JSONL por dataset e instância)
+    antes de entrar na fila; as alterações de campos levam junto os valores anteriores dos campos.
+    Entradas de um processo que caiu são recuperadas pelo próximo processo que iniciar e reenviadas,
+    exceto as que desfariam gravações feitas depois delas (ver _situacao). Essas ficam em
+    `<pasta>/descartadas/<dataset>.jsonl` e aparecem para os administradores no rodapé das páginas.
+    No encerramento do processo a fila é esvaziada.
+
+    As leituras feitas por este backend já incluem as entradas pendentes, de modo que a tela
+    mostra a alteração na hora. A versão do dataset também muda a cada entrada enfileirada.
+    As entradas pendentes só são vistas pelo processo que as enfileirou.
+    """
+
+    def __init__(self, backend, pasta, intervalo, tamanho_lote):
+        self.backend = backend
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self._pendentes = {}
+        # Quantas entradas de cada dataset já saíram da fila (posição absoluta do início da fila)
+        self._descartadas = {}
+        self._geracoes = {}
+        # Arquivos de staging recuperados de processos que caíram: nome → [(caminho, entradas)]
+        self._recuperadas = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._drive = None
+        self._evento = threading.Event()
+        self._thread = None
+        self._encerrado = False
+        self.ultimo_erro = None
+        # O PID sozinho não identifica a instância: depois de um reinício do contêiner ele costuma se repetir
+        self._token = uuid.uuid4().hex
+        os.makedirs(pasta, exist_ok=True)
+        self._recuperar()
+
+    # --- Staging em disco ---
+    def _arquivo_staging(self, nome, token=None):
+        return os.path.join(self.pasta, f"{nome}.{os.getpid()}-{token or self._token}.jsonl")
+
+    @staticmethod
+    def _gravar_jsonl(caminho, linhas, modo):
+        with open(caminho, modo, encoding="utf-8") as f:
+            f.writelines(json.dumps(linha, ensure_ascii=False) + "\n" for linha in linhas)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _gravar_staging(self, nome, entradas, modo):
+        caminho = self._arquivo_staging(nome)
+        if modo == "w" and not entradas:
+            if os.path.exists(caminho):
+                os.remove(caminho)
+            return
+        if modo == "w":
+            self._gravar_jsonl(f"{caminho}.tmp", entradas, "w")
+            os.replace(f"{caminho}.tmp", caminho)
+            return
+        self._gravar_jsonl(caminho, entradas, "a")
+
+    @staticmethod
+    def _ler_staging(caminho):
+        with open(caminho, encoding="utf-8") as f:
+            # Uma última linha incompleta (queda no meio da gravação) é descartada
+            entradas = []
+            for linha in f:
+                try:
+                    entradas.append(json.loads(linha))
+                except json.JSONDecodeError:
+                    break
+        return entradas
+
+    def _recuperar(self):
+        """
+        Assume os arquivos de staging que esta instância não criou e cujo processo não está mais
+        rodando (ou tem o PID deste processo, isto é, é de uma execução anterior). O arquivo é
+        renomeado para esta instância antes da leitura, então dois processos nunca assumem o mesmo.
+        """
+        for i, caminho in enumerate(sorted(glob.glob(os.path.join(self.pasta, "*.jsonl")))):
+            nome, dono = os.path.basename(caminho)[:-len(".jsonl")].rsplit(".", 1)
+            pid, _, token = dono.partition("-")
+            if token.startswith(self._token):
+                continue
+            if int(pid) != os.getpid() and processo_ativo(int(pid)):
+                continue
+            assumido = self._arquivo_staging(nome, f"{self._token}r{i}")
+            try:
+                os.rename(caminho, assumido)
+            except FileNotFoundError:
+                continue
+            self._recuperadas.setdefault(nome, []).append((assumido, self._ler_staging(assumido)))
+
+    def _reenviar_recuperadas(self, nome):
+        """
+        Reenvia as entradas recuperadas que não desfazem gravações feitas depois delas e separa as
+        demais em <pasta>/descartadas (ver descartadas()).
+        """
+        recuperadas = self._recuperadas.get(nome)
+        if not recuperadas:
+            return
+        chave = CHAVES_PRIMARIAS[nome]
+        dataset = self.backend.open(self._drive, nome)
+        atuais = {r.get(chave): r for r in self.backend.read(dataset)}
+        for caminho, entradas in list(recuperadas):
+            reenviar, conflitos = [], []
+            for entrada in entradas:
+                situacao = self._situacao(atuais.get(entrada["id"]), entrada)
+                if situacao == "reenviar":
+                    reenviar.append(self._sem_controle(entrada))
+                    self._aplicar_no_mapa(atuais, chave, entrada)
+                elif situacao == "conflito":
+                    conflitos.append(entrada)
+            if reenviar:
+                self.backend.apply(dataset, reenviar)
+            if conflitos:
+                self._gravar_jsonl(self._arquivo_descartadas(nome), conflitos, "a")
+                logger.warning(
+                    "%d alteração(ões) recuperada(s) de %s não reenviada(s): o registro mudou depois delas",
+                    len(conflitos), nome,
+                )
+            os.remove(caminho)
+            recuperadas.remove((caminho, entradas))
+
+    @staticmethod
+    def _situacao(registro, entrada):
+        """
+        Situação de uma entrada recuperada diante do registro atual (None se ele não existe):
+        "reenviar", "aplicada" (o registro já tem o resultado dela) ou "conflito" (o registro foi
+        alterado depois dela por outra gravação, que seria desfeita pelo reenvio).
+        create_new e delete nunca desfazem nada; create só é reenviado se o registro não existe (os
+        ids são gerados na inclusão, então um registro existente é o próprio, já enviado antes da
+        queda); update, se cada campo alterado ainda tem o valor anterior (ou já o valor novo).
+        """
+        operacao = entrada["op"]
+        if operacao in ("create_new", "delete"):
+            return "reenviar"
+        if operacao == "create":
+            return "reenviar" if registro is None else "aplicada"
+        if registro is None:
+            return "conflito"
+        campos = entrada["dados"]
+        if all(registro.get(campo) == valor for campo, valor in campos.items()):
+            return "aplicada"
+        anteriores = entrada.get("anteriores")
+        if anteriores is not None and all(
+            registro.get(campo) in (anteriores.get(campo), valor) for campo, valor in campos.items()
+        ):
+            return "reenviar"
+        return "conflito"
+
+    @staticmethod
+    def _aplicar_no_mapa(atuais, chave, entrada):
+        """Aplica a entrada ao mapa id → registro. Retorna se ela encontrou o seu registro."""
+        registros = [atuais[entrada["id"]]] if entrada["id"] in atuais else []
+        encontrou = aplicar_entradas(registros, chave, [entrada])
+        if registros:
+            atuais[entrada["id"]] = registros[0]
+        else:
+            atuais.pop(entrada["id"], None)
+        return encontrou
+
+    @staticmethod
+    def _sem_controle(entrada):
+        # Os valores anteriores só servem ao reenvio depois de uma queda; não vão para o backend
+        return {chave: valor for chave, valor in entrada.items() if chave != "anteriores"}
+
+    # --- Alterações descartadas ---
+    def _arquivo_descartadas(self, nome):
+        pasta = os.path.join(self.pasta, "descartadas")
+        os.makedirs(pasta, exist_ok=True)
+        return os.path.join(pasta, f"{nome}.jsonl")
+
+    def descartadas(self):
+        """Entradas recuperadas que não puderam ser reenviadas, cada uma com o nome do seu dataset."""
+        entradas = []
+        for caminho in sorted(glob.glob(os.path.join(self.pasta, "descartadas", "*.jsonl"))):
+            nome = os.path.basename(caminho)[:-len(".jsonl")]
+            entradas.extend(dict(entrada, dataset=nome) for entrada in self._ler_staging(caminho))
+        return entradas
+
+    def arquivar_descartadas(self):
+        """Marca as entradas descartadas como conferidas: os arquivos são renomeados, não apagados."""
+        marca_tempo = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        for caminho in glob.glob(os.path.join(self.pasta, "descartadas", "*.jsonl")):
+            os.replace(caminho, f"{caminho[:-len('.jsonl')]}.conferidas-{marca_tempo}")
+
+    # --- Fila ---
+    def _lock_dataset(self, nome):
+        with self._lock:
+            return self._locks.setdefault(nome, threading.RLock())
+
+    def pendentes(self, nome):
+        with self._lock:
+            return list(self._pendentes.get(nome, ()))
+
+    def _iniciar(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._laco, name="gravacao-adiada", daemon=True)
+                self._thread.start()
+
+    def _laco(self):
+        while not self._encerrado:
+            self._evento.wait(self.intervalo)
+            self._evento.clear()
+            self.descarregar_tudo()
+
+    def descarregar(self, nome):
+        """Envia ao backend, em um único apply(), todas as entradas pendentes do dataset."""
+        with self._lock_dataset(nome):
+            if self._drive is None and isinstance(self.backend, DriveJSONStorage):
+                # Entradas recuperadas antes de qualquer sessão abrir o Drive: aguardam a primeira
+                return
+            self._reenviar_recuperadas(nome)
+            entradas = self.pendentes(nome)
+            if not entradas:
+                return
+            dataset = self.backend.open(self._drive, nome)
+            if not self.backend.apply(dataset, [self._sem_controle(e) for e in entradas]):
+                # Os registros foram excluídos por outro processo depois de as entradas serem enfileiradas
+                logger.warning("Nenhuma das %d alteração(ões) pendente(s) de %s encontrou o seu registro", len(entradas), nome)
+            self._descartar(nome, len(entradas))
+
+    def _descartar(self, nome, quantidade):
+        with self._lock:
+            restantes = self._pendentes[nome][quantidade:]
+            self._pendentes[nome] = restantes
+            self._descartadas[nome] = self._descartadas.get(nome, 0) + quantidade
+            self._gravar_staging(nome, restantes, "w")
+
+    def descarregar_tudo(self):
+        with self._lock:
+            nomes = {nome for nome, entradas in self._pendentes.items() if entradas}
+            nomes.update(nome for nome, arquivos in self._recuperadas.items() if arquivos)
+        for nome in sorted(nomes):
+            try:
+                self.descarregar(nome)
+            except Exception as e:
+                # As entradas continuam na fila (e em disco) para a próxima tentativa
+                self.ultimo_erro = e
+                logger.exception("Falha ao enviar as alterações pendentes de %s; nova tentativa no próximo envio", nome)
+
+    def encerrar(self):
+        self._encerrado = True
+        self._evento.set()
+        self.descarregar_tudo()
+
+    # --- Interface de backend ---
+    def open(self, drive, nome):
+        dataset = self.backend.open(drive, nome)
+        dataset.backend = self
+        if drive is not None:
+            self._drive = drive
+        return dataset
+
+    def _ler_com_pendentes(self, dataset):
+        """Dados do backend com as entradas pendentes aplicadas e a posição da fila até onde elas estão contidas."""
+        nome = dataset.nome
+        dados = self.backend.read(dataset)
+        with self._lock:
+            entradas = [self._sem_controle(e) for e in self._pendentes.get(nome, ())]
+            lidas = self._descartadas.get(nome, 0) + len(entradas)
+        if entradas:
+            aplicar_entradas(dados, CHAVES_PRIMARIAS[nome], entradas)
+        return dados, lidas
+
+    def read(self, dataset):
+        with self._lock_dataset(dataset.nome):
+            dados, lidas = self._ler_com_pendentes(dataset)
+        # Usada por write(): as entradas até essa posição já estão nos dados lidos
+        dataset.pendentes_lidas = lidas
+        return dados
+
+    def version(self, dataset):
+        versao = self.backend.version(dataset)
+        if versao is None:
+            return None
+        with self._lock:
+            return versao, self._geracoes.get(dataset.nome, 0)
+
+    def apply(self, dataset, entradas):
+        """
+        Confere as entradas no estado atual (dados do backend mais as entradas pendentes) e enfileira
+        as que encontram o seu registro, gravando-as antes em disco. Retorna False, sem enfileirar
+        nada, se nenhuma encontra. As alterações de campos levam os valores anteriores dos campos.
+        """
+        nome = dataset.nome
+        chave = CHAVES_PRIMARIAS[nome]
+        with self._lock_dataset(nome):
+            # Leitura por uma referência nova: a do chamador guarda a versão que ele leu (gravação condicional)
+            dados, _ = self._ler_com_pendentes(self.backend.open(dataset.drive, nome))
+            atuais = {r.get(chave): r for r in dados}
+            enfileirar = []
+            for entrada in entradas:
+                registro = atuais.get(entrada["id"])
+                if entrada["op"] == "update" and registro is not None:
+                    entrada = dict(entrada, anteriores={campo: registro.get(campo) for campo in entrada["dados"]})
+                if self._aplicar_no_mapa(atuais, chave, entrada):
+                    enfileirar.append(entrada)
+            if not enfileirar:
+                return False
+            with self._lock:
+                self._gravar_staging(nome, enfileirar, "a")
+                fila = self._pendentes.setdefault(nome, [])
+                fila.extend(enfileirar)
+                self._geracoes[nome] = self._geracoes.get(nome, 0) + 1
+                cheia = len(fila) >= self.tamanho_lote
+        self._iniciar()
+        if cheia:
+            self._evento.set()
+        return True
+
+    def modify(self, dataset, funcao):
+        # Alterações diretas partem do estado já com as entradas pendentes aplicadas
+        with self._lock_dataset(dataset.nome):
+            self.descarregar(dataset.nome)
+            return self.backend.modify(dataset, funcao)
+
+    def write(self, dataset, dados):
+        # Os dados gravados já contêm as entradas pendentes vistas na leitura: se a gravação
+        # (condicional à versão lida) passar, essas entradas saem da fila sem serem reenviadas
+        nome = dataset.nome
+        with self._lock_dataset(nome):
+            self.backend.write(dataset, dados)
+            lidas = dataset.pendentes_lidas
+            if lidas is not None:
+                with self._lock:
+                    incluidas = lidas - self._descartadas.get(nome, 0)
+                if incluidas > 0:
+                    self._descartar(nome, incluidas)
+
+
+# --- SELEÇÃO DO BACKEND ---
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Retorna o backend configurado para o processo.
+    Configuração: seção [storage] dos segredos (ou variáveis ROCKER_STORAGE_*),
+    com backend = "drive" (padrão) ou "sqlite" e sqlite_path para o arquivo do banco.
+    A gravação adiada (seção [gravacao]) só é usada com adiada = true.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = criar_backend(get_setting("storage", "backend", "drive"))
+                if get_setting("gravacao", "adiada", False):
+                    backend = GravacaoAdiada(
+                        backend,
+                        pasta=get_setting("gravacao", "pasta", ".cache/gravacoes_pendentes"),
+                        intervalo=get_setting("gravacao", "intervalo", 3.0),
+                        tamanho_lote=get_setting("gravacao", "tamanho_lote", 50),
+                    )
+                    atexit.register(backend.encerrar)
+                _backend = backend
+    return _backend
+
+
+def criar_backend(tipo):
+    if tipo == "drive":
+        return DriveJSONStorage()
+    if tipo == "sqlite":
+        return SQLiteStorage(get_setting("storage", "sqlite_path", "rocker.db"))
+    raise ValueError(f"Backend de armazenamento desconhecido: {tipo}")
+
+
+# --- CARREGAMENTO CONCORRENTE ---
+class Carregamento:
+    """Resultado de carregar(): datasets abertos, dados lidos e erros, cada um indexado pelo nome do dataset."""
+
+    def __init__(self):
+        self.datasets = {}
+        self.dados = {}
+        self.erros = {}
+
+
+_pool_carga = None
+_pool_carga_lock = threading.Lock()
+
+
+def _pool():
+    global _pool_carga
+    with _pool_carga_lock:
+        if _pool_carga is None:
+            _pool_carga = ThreadPoolExecutor(
+                max_workers=get_setting("storage", "load_workers", 8), thread_name_prefix="carga-datasets"
+            )
+        return _pool_carga
+
+
+def carregar(drive, nomes, somente_abrir=()):
+    """
+    Abre e lê vários datasets ao mesmo tempo, cada um em uma thread do pool, de modo que a espera
+    total é a do dataset mais lento e não a soma de todos. Os datasets em `somente_abrir` são só
+    abertos (para gravação posterior), sem leitura. Um erro em um dataset não impede os demais:
+    ele fica em Carregamento.erros.
+    """
+    backend = get_backend()
+
+    def carregar_um(nome):
+        dataset = backend.open(drive, nome)
+        return dataset, (None if nome in somente_abrir else backend.read(dataset))
+
+    carregamento = Carregamento()
+    futuros = {nome: _pool().submit(carregar_um, nome) for nome in nomes}
+    for nome, futuro in futuros.items():
+        try:
+            carregamento.datasets[nome], dados = futuro.result()
+        except Exception as e:
+            carregamento.erros[nome] = e
+            continue
+        if nome not in somente_abrir:
+            carregamento.dados[nome] = dados
+    return carregamento
+
+
+# --- MIGRAÇÃO DOS ARQUIVOS JSON PARA O SQLITE ---
+def migrar_json_para_sqlite(drive, destino):
+    """Copia todos os datasets do Google Drive para o backend SQLite informado. Retorna a contagem por dataset."""
+    origem = DriveJSONStorage()
+    resumo = {}
+    for nome in DATASETS:
+        dados = origem.read(origem.open(drive, nome))
+        destino.write(destino.open(None, nome), dados)
+        resumo[nome] = len(dados)
+    return resumo
+
+
+if __name__ == "__main__":
+    # Uso: python storage.py [caminho_do_banco]
+    import utils
+
+    caminho = sys.argv[1] if len(sys.argv) > 1 else get_setting("storage", "sqlite_path", "rocker.db")
+    resumo = migrar_json_para_sqlite(utils.login_gdrive(), SQLiteStorage(caminho))
+    for nome, quantidade in resumo.items():
+        print(f"{nome}: {quantidade} registro(s) migrado(s) para {os.path.abspath(caminho)}")
@@ -0,0 +1,47 @@
+# tests/conftest.py
+# Testes dos backends de armazenamento, da numeração e do faturamento sobre o emulador do Drive
+# (drive_local.DriveLocal, em memória) e um banco SQLite temporário. Uso (na raiz do projeto):
+#   python -m pytest -q
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import drive_local  # noqa: E402
+import numeracao  # noqa: E402
+import storage  # noqa: E402
+
+
+@pytest.fixture
+def drive():
+    return drive_local.DriveLocal()
+
+
+@pytest.fixture
+def backend_drive(tmp_path, monkeypatch, drive):
+    backend = storage.DriveJSONStorage(caminho_ids=str(tmp_path / "drive_ids.json"))
+    monkeypatch.setattr(storage, "_backend", backend)
+    return backend
+
+
+@pytest.fixture
+def backend_sqlite(tmp_path, monkeypatch):
+    backend = storage.SQLiteStorage(str(tmp_path / "rocker.db"))
+    monkeypatch.setattr(storage, "_backend", backend)
+    return backend
+
+
+@pytest.fixture(params=["drive", "sqlite"])
+def backend(request):
+    """O backend do processo (storage.get_backend()), um teste para cada tipo."""
+    return request.getfixturevalue(f"backend_{request.param}")
+
+
+@pytest.fixture
+def alocador_faturas(monkeypatch):
+    """Alocador de números de fatura novo, sem blocos reservados por outros testes."""
+    alocador = numeracao.AlocadorNumeros("fatura", "ultimo_numero_fatura", 5, "invoices.json", "numero_fatura")
+    monkeypatch.setattr(numeracao, "alocador_faturas", alocador)
+    return alocador
@@ -0,0 +1,68 @@
+# tests/test_dinheiro.py
+import random
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+import dinheiro
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("1500.00", 150000),
+    ("1.500,00", 150000),
+    ("R$ 1.500,50", 150050),
+    ("R$ 1500", 150000),
+    (1500, 150000),
+    (0.1, 10),
+    (19.99, 1999),
+    (1.005, 101),
+    ("0,005", 1),
+    ("0,004", 0),
+    (None, 0),
+    ("", 0),
+])
+def test_para_centavos(valor, esperado):
+    assert dinheiro.para_centavos(valor) == esperado
+
+
+def test_para_centavos_recusa_texto_invalido():
+    with pytest.raises(ValueError):
+        dinheiro.para_centavos("mil reais")
+
+
+def test_soma_de_floats_nao_acumula_erro():
+    # Em float, 0.1 somado dez vezes dá 0.9999999999999999
+    assert sum(dinheiro.para_centavos(0.1) for _ in range(10)) == 100
+
+
+@pytest.mark.parametrize("valor, parte, total, esperado", [
+    (300000, 15, 30, 150000),
+    (10001, 1, 2, 5001),
+    (10000, 1, 3, 3333),
+    (20000, 1, 3, 6667),
+    (100000, 15, 31, 48387),
+    (1, 1, 2, 1),
+    (0, 7, 30, 0),
+])
+def test_proporcional(valor, parte, total, esperado):
+    assert dinheiro.proporcional(valor, parte, total) == esperado
+
+
+def test_proporcional_igual_ao_arredondamento_decimal():
+    aleatorio = random.Random(7)
+    for _ in range(2000):
+        total = aleatorio.randint(28, 31)
+        parte = aleatorio.randint(0, total)
+        valor = aleatorio.randint(0, 10_000_000)
+        esperado = (Decimal(valor) * parte / total).quantize(Decimal(1), rounding=ROUND_HALF_UP)
+        assert dinheiro.proporcional(valor, parte, total) == int(esperado)
+
+
+@pytest.mark.parametrize("centavos, texto, reais", [
+    (150000, "1500.00", "R$ 1.500,00"),
+    (5, "0.05", "R$ 0,05"),
+    (-12345, "-123.45", "-R$ 123,45"),
+])
+def test_formatacao(centavos, texto, reais):
+    assert dinheiro.formatar(centavos) == texto
+    assert dinheiro.formatar_reais(centavos) == reais
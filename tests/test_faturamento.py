@@ -0,0 +1,103 @@
+# tests/test_faturamento.py
+from datetime import date
+
+import faturamento
+import numeracao
+
+JUNHO = date(2025, 6, 1)
+
+
+def _contrato(i, data_inicio="01/01/2025", mensal_centavos=300000, entrega_centavos=5000, status="Ativo"):
+    return {
+        "id_contrato": f"k{i}",
+        "numero_contrato": f"{i:05d}-2025",
+        "status": status,
+        "tipo_contrato": "Locação",
+        "data_inicio": data_inicio,
+        "valor_entrega_centavos": entrega_centavos,
+        "itens_contrato": [{"quantidade": 1, "valor_unitario_centavos": mensal_centavos}],
+        "cliente": {"id": f"c{i}", "nome_razao_social": f"Cliente {i}"},
+    }
+
+
+def _lancar(backend, drive, itens):
+    invoices_file = backend.open(drive, "invoices.json")
+    return faturamento.executar(drive, invoices_file, itens, JUNHO, date(2025, 7, 10), "PIX")
+
+
+def _faturas(backend, drive):
+    return backend.read(backend.open(drive, "invoices.json"))
+
+
+# --- Cálculo ---
+def test_mes_cheio_sem_frete():
+    item = faturamento.calcular_item(_contrato(1, "10/03/2025"), JUNHO, set())
+    assert (item.valor, item.dias, item.dias_no_mes, item.frete) == (300000, 30, 30, 0)
+
+
+def test_primeiro_mes_proporcional_com_frete():
+    # 16 a 30 de junho: 15 de 30 dias, mais o frete de entrega
+    item = faturamento.calcular_item(_contrato(1, "16/06/2025"), JUNHO, set())
+    assert (item.dias, item.frete, item.valor) == (15, 5000, 150000 + 5000)
+
+
+def test_proporcional_arredonda_meio_centavo_para_cima():
+    # R$ 100,01 por 15 de 30 dias = R$ 50,005 → R$ 50,01
+    item = faturamento.calcular_item(_contrato(1, "16/06/2025", mensal_centavos=10001, entrega_centavos=0), JUNHO, set())
+    assert (item.dias, item.valor) == (15, 5001)
+
+
+def test_contratos_fora_do_faturamento():
+    contratos = [
+        _contrato(1, "01/07/2025"),
+        _contrato(2, "data inválida"),
+        _contrato(3, status="Encerrado"),
+        dict(_contrato(4), tipo_contrato="Venda"),
+        _contrato(5),
+    ]
+    faturas = [{"id_contrato": "k5", "competencia": "2025-06"}]
+    plano = faturamento.planejar(contratos, faturas, JUNHO)
+    assert [(i.contrato["id_contrato"], i.motivo) for i in plano] == [
+        ("k1", "Locação começa depois desta competência"),
+        ("k2", "Data de início inválida"),
+        ("k5", "Já faturado nesta competência"),
+    ]
+
+
+# --- Execução ---
+def test_faturamento_repetido_nao_duplica(backend, drive, alocador_faturas):
+    plano = faturamento.planejar([_contrato(1), _contrato(2)], [], JUNHO)
+    lancadas = _lancar(backend, drive, plano)
+    assert [(f["id_contrato"], f["numero_fatura"], f["competencia"]) for f in lancadas] == [
+        ("k1", "0000001", "2025-06"), ("k2", "0000002", "2025-06"),
+    ]
+
+    # A mesma prévia confirmada de novo (outra aba, clique repetido) não lança nada
+    assert _lancar(backend, drive, plano) == []
+    assert sorted(f["numero_fatura"] for f in _faturas(backend, drive)) == ["0000001", "0000002"]
+
+
+def test_fatura_lancada_por_outra_sessao_e_mantida(backend, drive, alocador_faturas, monkeypatch):
+    plano = faturamento.planejar([_contrato(1), _contrato(2)], [], JUNHO)
+    reservar = alocador_faturas.reservar
+    comp = faturamento.competencia(JUNHO)
+    da_outra_sessao = dict(
+        faturamento.montar_fatura(plano[1], "0000099", JUNHO, date.today(), date(2025, 7, 10), "BOLETO BANCÁRIO"),
+        status="Pago",
+    )
+
+    def reservar_com_outra_sessao(drive, quantidade):
+        # Outra sessão grava a fatura de k2 entre a releitura do invoices.json e a gravação
+        backend.insert(backend.open(drive, "invoices.json"), da_outra_sessao)
+        return reservar(drive, quantidade)
+
+    monkeypatch.setattr(alocador_faturas, "reservar", reservar_com_outra_sessao)
+    lancadas = _lancar(backend, drive, plano)
+
+    assert [(f["id_contrato"], f["numero_fatura"]) for f in lancadas] == [("k1", "0000001")]
+    faturas = {f["id_contrato"]: f for f in _faturas(backend, drive)}
+    assert faturas["k2"] == da_outra_sessao
+    assert faturas["k2"]["id_fatura"] == faturamento.id_fatura_mensal("k2", comp)
+    # O número reservado para k2 não foi usado: fica registrado como lacuna
+    config = backend.read(backend.open(drive, "config.json"))
+    assert [lacuna["numeros"] for lacuna in config[numeracao.CAMPO_LACUNAS]] == [[2, 2]]
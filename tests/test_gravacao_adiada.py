@@ -0,0 +1,116 @@
+# tests/test_gravacao_adiada.py
+import os
+
+import pytest
+
+import storage
+
+
+def _fatura(i, status="Pendente", observacao=""):
+    return {"id_fatura": f"f{i}", "numero_fatura": f"{i:07d}", "status": status, "observacao": observacao}
+
+
+@pytest.fixture
+def pasta(tmp_path):
+    return str(tmp_path / "gravacoes_pendentes")
+
+
+def _adiada(backend, pasta):
+    # Intervalo longo: nada é enviado pela thread de fundo durante o teste, só por descarregar_tudo()
+    return storage.GravacaoAdiada(backend, pasta=pasta, intervalo=3600, tamanho_lote=1000)
+
+
+def _staging(pasta):
+    return [nome for nome in os.listdir(pasta) if nome.endswith(".jsonl")]
+
+
+def test_gravacao_adiada_so_com_configuracao(tmp_path, monkeypatch):
+    monkeypatch.setenv("ROCKER_STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("ROCKER_STORAGE_SQLITE_PATH", str(tmp_path / "rocker.db"))
+    monkeypatch.delenv("ROCKER_GRAVACAO_ADIADA", raising=False)
+    monkeypatch.setattr(storage, "_backend", None)
+    assert isinstance(storage.get_backend(), storage.SQLiteStorage)
+
+
+def test_alteracao_de_registro_inexistente_e_recusada(backend_sqlite, pasta):
+    adiada = _adiada(backend_sqlite, pasta)
+    invoices_file = adiada.open(None, "invoices.json")
+    assert not adiada.update(invoices_file, "f1", {"status": "Pago"})
+    assert not adiada.delete(invoices_file, "f1")
+    assert adiada.pendentes("invoices.json") == []
+
+
+def test_pendentes_aparecem_na_leitura_e_sao_enviados(backend_sqlite, pasta):
+    adiada = _adiada(backend_sqlite, pasta)
+    invoices_file = adiada.open(None, "invoices.json")
+    assert adiada.insert(invoices_file, _fatura(1))
+    assert adiada.update(invoices_file, "f1", {"status": "Pago"})
+
+    assert adiada.read(invoices_file) == [_fatura(1, "Pago")]
+    assert backend_sqlite.read(backend_sqlite.open(None, "invoices.json")) == []
+    assert len(_staging(pasta)) == 1
+
+    adiada.descarregar_tudo()
+    assert backend_sqlite.read(backend_sqlite.open(None, "invoices.json")) == [_fatura(1, "Pago")]
+    assert adiada.pendentes("invoices.json") == []
+    assert _staging(pasta) == []
+
+
+def test_atualizacao_de_outro_processo_nao_e_ignorada(backend_sqlite, pasta):
+    backend_sqlite.insert(backend_sqlite.open(None, "invoices.json"), _fatura(1))
+    adiada = _adiada(backend_sqlite, pasta)
+    invoices_file = adiada.open(None, "invoices.json")
+    assert adiada.update(invoices_file, "f1", {"observacao": "enviada"})
+
+    # Outro processo exclui a fatura antes do envio: a alteração pendente não a recria
+    backend_sqlite.delete(backend_sqlite.open(None, "invoices.json"), "f1")
+    assert adiada.read(invoices_file) == []
+    adiada.descarregar_tudo()
+    assert backend_sqlite.read(backend_sqlite.open(None, "invoices.json")) == []
+
+
+def test_recuperacao_reenvia_o_que_nao_conflita(backend_sqlite, pasta):
+    invoices_file = backend_sqlite.open(None, "invoices.json")
+    backend_sqlite.insert(invoices_file, _fatura(1))
+    backend_sqlite.insert(invoices_file, _fatura(2))
+    backend_sqlite.insert(invoices_file, _fatura(4))
+
+    # Processo que "cai" com alterações ainda na fila (só no staging em disco)
+    caiu = _adiada(backend_sqlite, pasta)
+    fila = caiu.open(None, "invoices.json")
+    assert caiu.update(fila, "f1", {"status": "Pago"})
+    assert caiu.update(fila, "f2", {"observacao": "primeira"})
+    assert caiu.insert(fila, _fatura(3))
+    assert caiu.delete(fila, "f4")
+    assert len(_staging(pasta)) == 1
+
+    # Depois da queda, outra sessão altera o mesmo campo da fatura f2
+    backend_sqlite.update(invoices_file, "f2", {"observacao": "depois"})
+
+    # O próximo processo assume o staging (mesmo PID, outra instância = execução anterior)
+    novo = _adiada(backend_sqlite, pasta)
+    novo.descarregar_tudo()
+
+    faturas = {f["id_fatura"]: f for f in backend_sqlite.read(invoices_file)}
+    assert faturas == {"f1": _fatura(1, "Pago"), "f2": _fatura(2, observacao="depois"), "f3": _fatura(3)}
+    descartadas = novo.descartadas()
+    assert [(e["dataset"], e["id"], e["dados"]) for e in descartadas] == [("invoices.json", "f2", {"observacao": "primeira"})]
+    assert _staging(pasta) == []
+
+    novo.arquivar_descartadas()
+    assert novo.descartadas() == []
+
+
+def test_recuperacao_de_alteracao_ja_enviada_nao_repete(backend_sqlite, pasta):
+    invoices_file = backend_sqlite.open(None, "invoices.json")
+    backend_sqlite.insert(invoices_file, _fatura(1))
+    caiu = _adiada(backend_sqlite, pasta)
+    assert caiu.update(caiu.open(None, "invoices.json"), "f1", {"status": "Pago"})
+    # O envio chegou ao backend, mas o processo caiu antes de limpar o staging
+    backend_sqlite.update(invoices_file, "f1", {"status": "Pago"})
+    versao = backend_sqlite.version(invoices_file)
+
+    novo = _adiada(backend_sqlite, pasta)
+    novo.descarregar_tudo()
+    assert backend_sqlite.version(invoices_file) == versao
+    assert novo.descartadas() == []
@@ -0,0 +1,150 @@
+# tests/test_indices.py
+# Os índices devem dar os mesmos resultados dos filtros lineares que as páginas usavam antes deles
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import indices
+
+NOMES = ["Ana", "Bruno", "Carla", "Construtora", "Silva", "Souza", "Obras", "Engenharia", "Lima", "Costa"]
+STATUS = ["Ativo", "Encerrado", "Encerrado com Pendências"]
+
+
+def _documento(aleatorio):
+    digitos = "".join(aleatorio.choice("0123456789") for _ in range(11))
+    return f"{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}"
+
+
+def _clientes(aleatorio, quantidade):
+    clientes = []
+    for i in range(quantidade):
+        nome = " ".join(aleatorio.sample(NOMES, aleatorio.randint(1, 3)))
+        clientes.append({
+            "id": f"c{i}", "nome_razao_social": nome, "cpf_cnpj": _documento(aleatorio),
+            "email": f"{nome.split()[0].lower()}{i}@exemplo.com.br",
+        })
+    return clientes
+
+
+def _contratos(aleatorio, clientes, quantidade):
+    inicio = date(2025, 1, 1)
+    return [
+        {
+            "id_contrato": f"k{i}",
+            "numero_contrato": f"{i:05d}-2025",
+            "status": aleatorio.choice(STATUS),
+            "data_geracao": (inicio + timedelta(days=aleatorio.randint(0, 20))).isoformat(),
+            "cliente": aleatorio.choice(clientes),
+        }
+        for i in range(quantidade)
+    ]
+
+
+# --- Filtros lineares (como nas páginas antes dos índices) ---
+def _filtrar_linear(contratos, texto=None, status=None, data=None):
+    filtrados = contratos
+    if texto:
+        texto = texto.lower()
+        filtrados = [c for c in filtrados if texto in c['numero_contrato'].lower() or texto in c['cliente']['nome_razao_social'].lower()]
+    if status is not None:
+        filtrados = [c for c in filtrados if c.get('status') == status]
+    if data is not None:
+        filtrados = [c for c in filtrados if c['data_geracao'] == data.isoformat()]
+    return sorted(filtrados, key=lambda c: c['data_geracao'], reverse=True)
+
+
+def _buscar_documento_linear(clientes, trecho):
+    busca = indices.somente_digitos(trecho)
+    return {c['id'] for c in clientes if busca in indices.somente_digitos(c.get('cpf_cnpj', ''))}
+
+
+def _buscar_nome_linear(clientes, texto):
+    palavras = texto.lower().split()
+    return {
+        c['id'] for c in clientes
+        if all(any(p.startswith(palavra) for p in c['nome_razao_social'].lower().split()) for palavra in palavras)
+    }
+
+
+def _ids(registros, chave):
+    return [r[chave] for r in registros]
+
+
+def _conferir_contratos(indice, contratos, aleatorio):
+    consultas = [(None, None, None)]
+    for _ in range(60):
+        texto = aleatorio.choice([None, "", "0001", "2025", "00012-", "sil", "Costa", "o", "xyz", "ENGENHARIA LIMA"])
+        status = aleatorio.choice([None] + STATUS)
+        data = aleatorio.choice([None, date(2025, 1, 1) + timedelta(days=aleatorio.randint(0, 25))])
+        consultas.append((texto, status, data))
+    for texto, status, data in consultas:
+        esperado = _filtrar_linear(contratos, texto, status, data)
+        obtido = indice.filtrar(texto, status, data)
+        # Mesmo conjunto e na ordem por data (os empates podem vir em outra ordem)
+        assert sorted(_ids(obtido, "id_contrato")) == sorted(_ids(esperado, "id_contrato")), (texto, status, data)
+        assert [c['data_geracao'] for c in obtido] == [c['data_geracao'] for c in esperado]
+
+
+@pytest.fixture
+def aleatorio():
+    return random.Random(11)
+
+
+def test_filtro_de_contratos_igual_ao_linear(aleatorio):
+    contratos = _contratos(aleatorio, _clientes(aleatorio, 40), 500)
+    _conferir_contratos(indices.IndiceContratos(contratos), contratos, aleatorio)
+
+
+def test_indice_de_contratos_atualizado_no_lugar(aleatorio):
+    clientes = _clientes(aleatorio, 40)
+    contratos = {c['id_contrato']: c for c in _contratos(aleatorio, clientes, 300)}
+    indice = indices.IndiceContratos(contratos.values())
+    novos = iter(_contratos(random.Random(99), clientes, 1000)[300:])
+    for _ in range(200):
+        operacao = aleatorio.choice(["incluir", "status", "excluir"])
+        if operacao == "incluir":
+            contrato = next(novos)
+            contratos[contrato['id_contrato']] = contrato
+            indice.adicionar(contrato)
+        elif operacao == "status":
+            id_contrato = aleatorio.choice(list(contratos))
+            contratos[id_contrato] = dict(contratos[id_contrato], status=aleatorio.choice(STATUS))
+            indice.alterar_status(id_contrato, contratos[id_contrato]['status'])
+        else:
+            id_contrato = aleatorio.choice(list(contratos))
+            del contratos[id_contrato]
+            indice.remover(id_contrato)
+    _conferir_contratos(indice, list(contratos.values()), aleatorio)
+
+
+def test_busca_de_clientes_igual_a_linear(aleatorio):
+    clientes = _clientes(aleatorio, 400)
+    indice = indices.IndiceClientes(clientes)
+    for cliente in aleatorio.sample(clientes, 30):
+        digitos = indices.somente_digitos(cliente['cpf_cnpj'])
+        inicio = aleatorio.randint(0, 8)
+        for trecho in (digitos[inicio:inicio + 2], digitos[inicio:inicio + 5], cliente['cpf_cnpj'][:7], cliente['cpf_cnpj']):
+            assert {c['id'] for c in indice.buscar_documento(trecho)} == _buscar_documento_linear(clientes, trecho), trecho
+        assert indice.documento_cadastrado(digitos)
+        assert [c['id'] for c in indice.buscar_email(cliente['email'])] == [cliente['id']]
+    for texto in ["ana", "Cons", "silva obras", "s", "engenharia co", "zz"]:
+        assert {c['id'] for c in indice.buscar_nome(texto)} == _buscar_nome_linear(clientes, texto), texto
+    # Verificação de duplicidade ao salvar (antes um any() sobre todos os clientes)
+    for documento in [clientes[0]['cpf_cnpj'], _documento(aleatorio), _documento(aleatorio)]:
+        assert indice.documento_cadastrado(documento) == any(c['cpf_cnpj'] == documento for c in clientes)
+
+
+def test_indice_de_clientes_atualizado_no_lugar(aleatorio):
+    clientes = {c['id']: c for c in _clientes(aleatorio, 200)}
+    indice = indices.IndiceClientes(clientes.values())
+    alterado = dict(clientes["c1"], nome_razao_social="Mármore Pedreira", cpf_cnpj="111.222.333-44")
+    clientes["c1"] = alterado
+    indice.atualizar(alterado)
+    del clientes["c2"]
+    indice.remover("c2")
+
+    assert [c['id'] for c in indice.buscar("marmore")] == ["c1"]
+    assert [c['id'] for c in indice.buscar("11122233344")] == ["c1"]
+    for texto in ["ana", "costa", "souza lima"]:
+        assert {c['id'] for c in indice.buscar_nome(texto)} == _buscar_nome_linear(clientes.values(), texto)
@@ -0,0 +1,113 @@
+# tests/test_numeracao.py
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import numeracao
+import storage
+
+
+class _Hoje(date):
+    """date com today() controlado pelo teste, para simular a virada de ano."""
+    atual = date(2025, 12, 31)
+
+    @classmethod
+    def today(cls):
+        return cls.atual
+
+
+def _alocador(**opcoes):
+    return numeracao.AlocadorNumeros("fatura", "ultimo_numero_fatura", 5, "invoices.json", "numero_fatura", **opcoes)
+
+
+def _config(drive):
+    backend = storage.get_backend()
+    return backend.read(backend.open(drive, "config.json"))
+
+
+def _numeros(reservados):
+    return [numero for numero, _ in reservados]
+
+
+def _lacunas(drive):
+    return [(lacuna["numeros"], lacuna["motivo"]) for lacuna in _config(drive).get(numeracao.CAMPO_LACUNAS, [])]
+
+
+def test_reserva_de_blocos(backend, drive):
+    processo_a, processo_b = _alocador(), _alocador()
+    assert _numeros(processo_a.reservar(drive, 3)) == [1, 2, 3]
+    assert processo_b.proximo(drive)[0] == 6
+    assert _numeros(processo_a.reservar(drive, 2)) == [4, 5]
+
+    config = _config(drive)
+    assert config["ultimo_numero_fatura"] == 10
+    assert [r["numeros"] for r in config[numeracao.CAMPO_RESERVAS]] == [[1, 5], [6, 10]]
+
+
+def test_devolucao_no_encerramento(backend, drive):
+    processo_a, processo_b = _alocador(), _alocador()
+    processo_a.reservar(drive, 3)
+    processo_b.proximo(drive)
+
+    # Outro processo reservou depois do bloco de processo_a: os números dele viram lacuna
+    processo_a.encerrar()
+    # Ninguém reservou depois do bloco de processo_b: o contador volta
+    processo_b.encerrar()
+
+    config = _config(drive)
+    assert config["ultimo_numero_fatura"] == 6
+    assert config[numeracao.CAMPO_RESERVAS] == []
+    assert _lacunas(drive) == [([4, 5], "devolvidos no encerramento")]
+    assert _alocador().proximo(drive)[0] == 7
+
+
+def test_contador_recomeca_na_virada_do_ano(backend, drive, monkeypatch):
+    monkeypatch.setattr(numeracao, "date", _Hoje)
+    monkeypatch.setattr(_Hoje, "atual", date(2025, 12, 31))
+    alocador = _alocador(campo_ano="ano_numero_fatura")
+    assert alocador.reservar(drive, 2) == [(1, 2025), (2, 2025)]
+
+    monkeypatch.setattr(_Hoje, "atual", date(2026, 1, 1))
+    assert alocador.proximo(drive) == (1, 2026)
+    config = _config(drive)
+    assert (config["ano_numero_fatura"], config["ultimo_numero_fatura"]) == (2026, 5)
+    # O restante do bloco de 2025 voltou ao contador antes da virada: nenhuma lacuna
+    assert _lacunas(drive) == []
+
+
+def test_reserva_abandonada_vira_lacuna(backend, drive):
+    backend.insert(backend.open(drive, "invoices.json"), {"id_fatura": "f2", "numero_fatura": "0000002"})
+    reservado_em = (datetime.now() - timedelta(days=30)).isoformat(timespec="seconds")
+    abandonada = {
+        "tipo": "fatura", "numeros": [1, 5], "ano": 2025, "reservado_em": reservado_em,
+        "dono": {"host": "outra-maquina", "pid": 123, "token": "processo-que-caiu"},
+    }
+    backend.modify(backend.open(drive, "config.json"), lambda config: config.update(
+        ultimo_numero_fatura=5, **{numeracao.CAMPO_RESERVAS: [abandonada]},
+    ))
+
+    # A conciliação acontece na primeira reserva do processo
+    assert _alocador().proximo(drive)[0] == 6
+    assert _lacunas(drive) == [([1, 1], "reserva interrompida"), ([3, 5], "reserva interrompida")]
+    assert [r["numeros"] for r in _config(drive)[numeracao.CAMPO_RESERVAS]] == [[6, 10]]
+
+
+def test_reserva_recente_de_outra_maquina_e_mantida(backend, drive):
+    outra = {
+        "tipo": "fatura", "numeros": [1, 5], "ano": 2025, "reservado_em": datetime.now().isoformat(timespec="seconds"),
+        "dono": {"host": "outra-maquina", "pid": 123, "token": "processo-ativo"},
+    }
+    backend.modify(backend.open(drive, "config.json"), lambda config: config.update(
+        ultimo_numero_fatura=5, **{numeracao.CAMPO_RESERVAS: [outra]},
+    ))
+    assert _alocador().reconciliar(drive) == 0
+    assert _lacunas(drive) == []
+
+
+@pytest.mark.parametrize("quantidade", [3, 5])
+def test_lista_de_lacunas_tem_limite(backend, drive, quantidade):
+    alocador = _alocador(max_lacunas=3)
+    for numero in range(quantidade):
+        alocador.registrar_lacunas(drive, [(numero * 10, None)], "teste")
+    # Só as mais recentes ficam no config.json
+    assert _lacunas(drive) == [([n * 10, n * 10], "teste") for n in range(quantidade)][-3:]
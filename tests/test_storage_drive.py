@@ -0,0 +1,146 @@
+# tests/test_storage_drive.py
+import threading
+
+import pytest
+
+import serializacao
+import storage
+
+
+def _cliente(i):
+    return {"id": f"c{i}", "nome_razao_social": f"Cliente {i}"}
+
+
+def _contrato(i, status="Ativo"):
+    return {"id_contrato": f"k{i}", "numero_contrato": f"{i:05d}-2025", "status": status}
+
+
+def _arquivos_do_diario(drive):
+    """Entradas de cada arquivo de diário arquivado por uma compactação."""
+    return [
+        serializacao.decodificar(drive._ler_conteudo(m["id"]))[0]
+        for m in drive._listar(None)
+        if m["title"].startswith("contracts.journal.") and m["title"] != "contracts.journal.json"
+        and not m["labels"]["trashed"]
+    ]
+
+
+# --- Gravação condicional (etag) ---
+def test_gravacao_condicional_recusa_versao_antiga(backend_drive, drive):
+    sessao_a = backend_drive.open(drive, "clients.json")
+    sessao_b = backend_drive.open(drive, "clients.json")
+    backend_drive.read(sessao_b)
+    backend_drive.write(sessao_a, [_cliente(1)])
+
+    with pytest.raises(storage.ConflitoDeVersao):
+        backend_drive.write(sessao_b, [_cliente(2)])
+    assert backend_drive.read(backend_drive.open(drive, "clients.json")) == [_cliente(1)]
+
+
+def test_modify_repete_sobre_a_versao_nova(backend_drive, drive):
+    sessao_a = backend_drive.open(drive, "config.json")
+    sessao_b = backend_drive.open(drive, "config.json")
+    backend_drive.modify(sessao_a, lambda config: config.update(contador=1))
+
+    # sessao_b ainda tem a etag de antes da gravação de sessao_a: a primeira tentativa conflita
+    uploads = drive.chamadas["upload"]
+    backend_drive.modify(sessao_b, lambda config: config.update(contador=config["contador"] + 1))
+    assert drive.chamadas["upload"] - uploads == 2
+    assert backend_drive.read(backend_drive.open(drive, "config.json")) == {"contador": 2}
+
+
+def _processos(tmp_path, quantidade):
+    # Uma instância do backend por "processo": sem locks nem cache em comum, só o Drive
+    return [storage.DriveJSONStorage(caminho_ids=str(tmp_path / f"ids_{i}.json")) for i in range(quantidade)]
+
+
+def test_modify_concorrente_nao_perde_alteracoes(backend_drive, drive, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "MAX_TENTATIVAS_CONFLITO", 100)
+    # Um pouco de latência em cada chamada faz as sessões se cruzarem
+    drive.latencia = 0.002
+    backend_drive.open(drive, "config.json")
+
+    def incrementar(backend):
+        for _ in range(5):
+            config_file = backend.open(drive, "config.json")
+            backend.modify(config_file, lambda config: config.update(contador=config.get("contador", 0) + 1))
+
+    threads = [threading.Thread(target=incrementar, args=(b,)) for b in _processos(tmp_path, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend_drive.read(backend_drive.open(drive, "config.json")) == {"contador": 20}
+
+
+# --- Diário de alterações ---
+def test_diario_e_reaplicado_na_leitura(backend_drive, drive, tmp_path):
+    contracts_file = backend_drive.open(drive, "contracts.json")
+    for i in range(3):
+        assert backend_drive.insert(contracts_file, _contrato(i))
+    assert backend_drive.update(contracts_file, "k1", {"status": "Encerrado"})
+    assert backend_drive.delete(contracts_file, "k2")
+    assert not backend_drive.update(contracts_file, "k9", {"status": "Encerrado"})
+
+    # O snapshot continua vazio: as alterações estão só no diário
+    assert backend_drive._ler_json(contracts_file) == []
+    assert [e["op"] for e in backend_drive._ler_json(contracts_file.diario)] == ["create"] * 3 + ["update", "delete"]
+
+    # Outra instância (sem cache) chega ao mesmo estado relendo o diário
+    outro = storage.DriveJSONStorage(caminho_ids=str(tmp_path / "outros_ids.json"))
+    esperado = [_contrato(0), _contrato(1, "Encerrado")]
+    assert outro.read(outro.open(drive, "contracts.json")) == esperado
+
+
+def test_reaplicar_entradas_nao_muda_o_resultado():
+    entradas = [
+        storage.nova_entrada("create", "k1", _contrato(1)),
+        storage.nova_entrada("update", "k1", {"status": "Encerrado"}),
+        storage.nova_entrada("create_new", "k1", _contrato(1)),
+        storage.nova_entrada("create", "k2", _contrato(2)),
+        storage.nova_entrada("delete", "k2"),
+    ]
+    registros = []
+    storage.aplicar_entradas(registros, "id_contrato", entradas)
+    primeira = [dict(r) for r in registros]
+    storage.aplicar_entradas(registros, "id_contrato", entradas)
+    assert registros == primeira == [_contrato(1, "Encerrado")]
+
+
+def test_compactacao_arquiva_cada_entrada_uma_vez(backend_drive, drive):
+    backend_drive.limite_compactacao = 3
+    contracts_file = backend_drive.open(drive, "contracts.json")
+    for i in range(7):
+        backend_drive.insert(contracts_file, _contrato(i))
+
+    diario = backend_drive._ler_json(contracts_file.diario)
+    arquivados = [e["id"] for arquivo in _arquivos_do_diario(drive) for e in arquivo]
+    assert len(diario) < 3
+    assert sorted(arquivados + [e["id"] for e in diario]) == [f"k{i}" for i in range(7)]
+    assert backend_drive.read(contracts_file) == [_contrato(i) for i in range(7)]
+
+
+def test_compactacao_concorrente_nao_duplica_nem_perde_entradas(backend_drive, drive, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "MAX_TENTATIVAS_CONFLITO", 100)
+    # Um pouco de latência em cada chamada faz as sessões se cruzarem
+    drive.latencia = 0.002
+    backend_drive.open(drive, "contracts.json")
+
+    def incluir(backend, sessao):
+        backend.limite_compactacao = 4
+        for i in range(8):
+            contracts_file = backend.open(drive, "contracts.json")
+            backend.insert(contracts_file, _contrato(sessao * 100 + i))
+
+    threads = [threading.Thread(target=incluir, args=(b, sessao)) for sessao, b in enumerate(_processos(tmp_path, 3))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    contracts_file = backend_drive.open(drive, "contracts.json")
+    esperados = sorted(f"k{sessao * 100 + i}" for sessao in range(3) for i in range(8))
+    arquivados = [e["id"] for arquivo in _arquivos_do_diario(drive) for e in arquivo]
+    diario = [e["id"] for e in backend_drive._ler_json(contracts_file.diario)]
+    assert sorted(arquivados + diario) == esperados
+    assert sorted(c["id_contrato"] for c in backend_drive.read(contracts_file)) == esperados
@@ -0,0 +1,243 @@
+# usuarios.py
+import base64
+import functools
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import utils
+from settings import get_setting
+
+ALGORITMO = "pbkdf2_sha256"
+ITERACOES = get_setting("usuarios", "pbkdf2_iteracoes", 600_000)
+
+
+# --- SENHAS ---
+def hash_senha(senha, iteracoes=None):
+    """Gera o hash da senha no formato 'pbkdf2_sha256$iterações$sal$hash' (sal e hash em base64)."""
+    iteracoes = iteracoes or ITERACOES
+    sal = os.urandom(16)
+    derivada = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), sal, iteracoes)
+    return f"{ALGORITMO}${iteracoes}${base64.b64encode(sal).decode()}${base64.b64encode(derivada).decode()}"
+
+
+def verificar_senha(senha, codificado):
+    """Confere a senha com o hash guardado; a comparação final leva o mesmo tempo para qualquer entrada."""
+    try:
+        algoritmo, iteracoes, sal, esperado = codificado.split("$")
+        iteracoes = int(iteracoes)
+    except (AttributeError, ValueError):
+        return False
+    if algoritmo != ALGORITMO:
+        return False
+    derivada = hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), base64.b64decode(sal), iteracoes)
+    return hmac.compare_digest(derivada, base64.b64decode(esperado))
+
+
+def _precisa_atualizar_hash(codificado):
+    try:
+        return int(codificado.split("$")[1]) < ITERACOES
+    except (AttributeError, IndexError, ValueError):
+        return True
+
+
+def normalizar_email(email):
+    return (email or "").strip().lower()
+
+
+def eh_administrador(usuario):
+    """Administrador: `administrador: true` no users.json ou e-mail listado em usuarios.administradores."""
+    administradores = get_setting("usuarios", "administradores", [])
+    if isinstance(administradores, str):
+        administradores = administradores.split(",")
+    return bool(usuario.get('administrador')) or normalizar_email(usuario.get('email')) in {normalizar_email(e) for e in administradores}
+
+
+@functools.lru_cache(maxsize=1)
+def _hash_ficticio():
+    # Hash usado quando o e-mail não existe, para que a resposta demore o mesmo que uma senha errada.
+    # Calculado no primeiro uso, e não na importação (são ITERACOES rodadas de PBKDF2)
+    return hash_senha("senha-ficticia")
+
+
+class MuitasTentativas(Exception):
+    """Login bloqueado temporariamente por excesso de tentativas com senha errada."""
+
+    def __init__(self, segundos):
+        super().__init__(f"Muitas tentativas. Tente novamente em {segundos} segundo(s).")
+        self.segundos = segundos
+
+
+# --- LIMITE DE TENTATIVAS ---
+class LimiteTentativas:
+    """
+    Bloqueia um e-mail depois de `maximo` falhas dentro de uma janela de `janela` segundos.
+    Só e-mails com falhas recentes ocupam memória, e no máximo `max_chaves` deles (os que falharam
+    há mais tempo saem primeiro), para que tentativas com e-mails inventados não façam o mapa crescer sem limite.
+    """
+
+    def __init__(self, maximo, janela, max_chaves=10_000):
+        self.maximo = maximo
+        self.janela = janela
+        self.max_chaves = max_chaves
+        self._falhas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recentes(self, chave, agora):
+        falhas = self._falhas.get(chave)
+        if falhas is None:
+            return ()
+        while falhas and falhas[0] <= agora - self.janela:
+            falhas.popleft()
+        if not falhas:
+            del self._falhas[chave]
+        return falhas
+
+    def verificar(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            falhas = self._recentes(chave, agora)
+            if len(falhas) >= self.maximo:
+                raise MuitasTentativas(int(falhas[0] + self.janela - agora) + 1)
+
+    def registrar_falha(self, chave):
+        agora = time.monotonic()
+        with self._lock:
+            self._recentes(chave, agora)
+            self._falhas.setdefault(chave, deque()).append(agora)
+            self._falhas.move_to_end(chave)
+            while len(self._falhas) > self.max_chaves:
+                self._falhas.popitem(last=False)
+
+    def limpar(self, chave):
+        with self._lock:
+            self._falhas.pop(chave, None)
+
+
+# --- DIRETÓRIO DE USUÁRIOS ---
+class DiretorioUsuarios:
+    """
+    Mapa e-mail → usuário mantido em memória e compartilhado pelas sessões do processo.
+    O login consulta só o mapa; a cada `intervalo` segundos a versão do users.json é conferida
+    em segundo plano e o mapa é recarregado se o arquivo mudou.
+    """
+
+    def __init__(self, intervalo, limite):
+        self.intervalo = intervalo
+        self.limite = limite
+        self._por_email = None
+        self._versao = None
+        self._conferido_em = 0.0
+        self._lock = threading.Lock()
+        self._atualizando = False
+
+    def _recarregar(self, drive):
+        users_file = utils.get_database_file(drive, "users.json")
+        versao = utils.versao_dataset(users_file)
+        if self._por_email is None or versao is None or versao != self._versao:
+            usuarios = utils.read_data(users_file)
+            self._por_email = {normalizar_email(u['email']): u for u in usuarios}
+            self._versao = versao
+        self._conferido_em = time.monotonic()
+        return users_file
+
+    def _atualizar_em_segundo_plano(self, drive):
+        def atualizar():
+            try:
+                with self._lock:
+                    self._recarregar(drive)
+            except Exception:
+                # Fica com o mapa atual; a próxima consulta tenta de novo
+                pass
+            finally:
+                self._atualizando = False
+
+        self._atualizando = True
+        threading.Thread(target=atualizar, name="diretorio-usuarios", daemon=True).start()
+
+    def usuario(self, drive, email):
+        # O mapa é lido uma vez para uma variável local: _gravar_hash pode trocá-lo por None a qualquer momento
+        por_email = self._por_email
+        if por_email is None:
+            with self._lock:
+                if self._por_email is None:
+                    self._recarregar(drive)
+                por_email = self._por_email
+        elif time.monotonic() - self._conferido_em > self.intervalo and not self._atualizando:
+            self._atualizar_em_segundo_plano(drive)
+        return por_email.get(normalizar_email(email))
+
+    def autenticar(self, drive, email, senha):
+        """Retorna o usuário se e-mail e senha conferem, senão None. Levanta MuitasTentativas se bloqueado."""
+        chave = normalizar_email(email)
+        self.limite.verificar(chave)
+        usuario = self.usuario(drive, email)
+
+        if usuario is None:
+            verificar_senha(senha, _hash_ficticio())
+            valida = False
+        elif usuario.get('senha_hash'):
+            valida = verificar_senha(senha, usuario['senha_hash'])
+        else:
+            # Registro ainda com a senha em texto puro: é convertido no primeiro login certo
+            valida = hmac.compare_digest(str(usuario.get('senha', '')).encode("utf-8"), senha.encode("utf-8"))
+
+        if not valida:
+            self.limite.registrar_falha(chave)
+            return None
+        self.limite.limpar(chave)
+        if not usuario.get('senha_hash') or _precisa_atualizar_hash(usuario['senha_hash']):
+            self._gravar_hash(drive, usuario['email'], senha)
+        return usuario
+
+    def _gravar_hash(self, drive, email, senha):
+        novo_hash = hash_senha(senha)
+
+        def gravar(usuarios):
+            for u in usuarios:
+                if u['email'] == email:
+                    u['senha_hash'] = novo_hash
+                    u.pop('senha', None)
+
+        try:
+            with self._lock:
+                users_file = utils.get_database_file(drive, "users.json")
+                users_file.backend.modify(users_file, gravar)
+                # O mapa é recarregado na próxima consulta
+                self._por_email = None
+        except Exception:
+            # A conversão é oportunista: não impede o login e será tentada de novo no próximo
+            pass
+
+
+diretorio = DiretorioUsuarios(
+    intervalo=get_setting("usuarios", "intervalo_atualizacao", 60),
+    limite=LimiteTentativas(
+        maximo=get_setting("usuarios", "max_tentativas", 5),
+        janela=get_setting("usuarios", "janela_tentativas", 15 * 60),
+    ),
+)
+
+
+# --- MIGRAÇÃO DAS SENHAS EM TEXTO PURO ---
+def migrar_senhas(drive):
+    """Substitui todas as senhas em texto puro do users.json pelo hash. Retorna quantas foram convertidas."""
+    users_file = utils.get_database_file(drive, "users.json")
+
+    def converter(usuarios):
+        convertidos = 0
+        for u in usuarios:
+            if 'senha' in u:
+                u['senha_hash'] = hash_senha(str(u.pop('senha')))
+                convertidos += 1
+        return convertidos
+
+    return users_file.backend.modify(users_file, converter)
+
+
+if __name__ == "__main__":
+    # Uso: python usuarios.py
+    print(f"{migrar_senhas(utils.login_gdrive())} senha(s) convertida(s) para hash")
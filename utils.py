@@ -3,34 +3,115 @@ import streamlit as st
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
 from validate_docbr import CPF, CNPJ
-import json
-import requests
-from datetime import date, datetime
+from datetime import datetime, timedelta, timezone
 from docx import Document
 from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 import io
 import uuid
+import threading
+import unicodedata
+import httplib2
+import storage
+import numeracao
+import consulta_cep
+import drive_local
+import metricas
+import dinheiro
 
 # --- NOVA FUNÇÃO DE LOGIN COM CONTA DE SERVIÇO ---
-def login_gdrive():
+# Antecedência com que o token de acesso é renovado antes de expirar
+MARGEM_RENOVACAO_TOKEN = timedelta(minutes=5)
+
+_drive = None
+_drive_lock = threading.Lock()
+
+class _PoolHttpPorThread:
+    """
+    Substitui o armazenamento por thread (thread_local) do GoogleAuth.
+    O pydrive2 mantém um objeto HTTP autorizado por thread, mas o Streamlit usa uma thread nova
+    a cada execução do script. Os objetos HTTP de threads encerradas voltam para um pool e são
+    reaproveitados, mantendo as conexões TLS já abertas com o Google.
+    Depende de como o pydrive2 usa o thread_local (e o storage, de auth.service): por isso a versão
+    do pydrive2 é fixada no requirements.txt; ao atualizá-la, confira GoogleAuth.Get_Http_Object.
+    """
+    def __init__(self):
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "_em_uso", {})
+        object.__setattr__(self, "_livres", [])
+
+    def __getattr__(self, nome):
+        if nome != "http":
+            raise AttributeError(nome)
+        thread_atual = threading.current_thread()
+        with self._lock:
+            http = self._em_uso.get(thread_atual)
+            if http is None:
+                # Devolve ao pool os objetos de threads que já terminaram
+                for thread in [t for t in self._em_uso if not t.is_alive()]:
+                    self._livres.append(self._em_uso.pop(thread))
+                if self._livres:
+                    http = self._livres.pop()
+                    self._em_uso[thread_atual] = http
+        return http
+
+    def __setattr__(self, nome, valor):
+        if nome != "http":
+            raise AttributeError(nome)
+        with self._lock:
+            self._em_uso[threading.current_thread()] = valor
+
+def _autenticar_gdrive():
     """
     Autentica com o Google Drive usando uma Conta de Serviço.
     Ele tenta primeiro usar os segredos do Streamlit (para produção na nuvem).
     Se falhar, ele usa o arquivo local 'service_account.json' (para desenvolvimento).
     """
-    gauth = GoogleAuth()
-    scope = ["https://www.googleapis.com/auth/drive"]
     try:
         # Tenta autenticar usando os segredos do Streamlit (para quando estiver online)
-        gauth.credentials = GoogleAuth.get_credentials_from_json(st.secrets["gdrive_service_account"], scope)
-    except (AttributeError, KeyError):
+        service_config = {"client_json_dict": dict(st.secrets["gdrive_service_account"])}
+    except (AttributeError, KeyError, FileNotFoundError):
         # Se falhar (rodando localmente), usa o arquivo JSON da conta de serviço
-        gauth.ServiceAuth("service_account.json")
-        
-    return GoogleDrive(gauth)
+        service_config = {"client_json_file_path": "service_account.json"}
+    gauth = GoogleAuth(settings={
+        "client_config_backend": "service",
+        "service_config": service_config,
+        "oauth_scope": ["https://www.googleapis.com/auth/drive"],
+    })
+    gauth.ServiceAuth()
+    gauth.thread_local = _PoolHttpPorThread()
+    return gauth
+
+def _renovar_token_se_necessario(gauth):
+    credenciais = gauth.credentials
+    expira_em = credenciais.token_expiry
+    if expira_em is not None and expira_em.tzinfo is None:
+        # O oauth2client guarda a validade do token em UTC, sem fuso
+        expira_em = expira_em.replace(tzinfo=timezone.utc)
+    if credenciais.access_token is None or expira_em is None or expira_em - datetime.now(timezone.utc) < MARGEM_RENOVACAO_TOKEN:
+        credenciais.refresh(httplib2.Http(timeout=gauth.http_timeout))
+
+@metricas.medido("login_gdrive")
+def login_gdrive():
+    """
+    Retorna o cliente do Google Drive compartilhado por todas as sessões do processo.
+    A autenticação acontece uma única vez; nas chamadas seguintes o token é apenas
+    renovado quando estiver perto de expirar.
+    """
+    global _drive
+    with _drive_lock:
+        if _drive is None:
+            # Com [drive_local] ativo, o app roda sobre o emulador local (ver drive_local.py)
+            _drive = drive_local.criar_de_configuracao() if drive_local.ativo() else GoogleDrive(_autenticar_gdrive())
+        if isinstance(_drive, GoogleDrive):
+            _renovar_token_se_necessario(_drive.auth)
+        return _drive
 
 # --- FUNÇÃO PARA GERAR O CONTRATO EM WORD ---
+# Incrementar sempre que o layout do documento mudar (invalida o cache de documentos gerados)
+VERSAO_MODELO_CONTRATO = 1
+
+@metricas.medido("gerar_contrato_docx")
 def gerar_contrato_docx(dados):
     doc = Document()
     style = doc.styles['Normal']
@@ -96,21 +177,20 @@ def gerar_contrato_docx(dados):
     hdr_cells[3].text = 'Vlr. Unit. Mensal (R$)'
     hdr_cells[4].text = 'Vlr. Total Mensal (R$)'
 
-    total_locacao_mensal = 0
-    for i, item in enumerate(dados['itens_contrato']):
+    # Valores em centavos: totais dos itens calculados de uma vez e formatados só ao escrever
+    totais_itens = dinheiro.totais_itens(dados['itens_contrato'])
+    for i, (item, valor_total_item) in enumerate(zip(dados['itens_contrato'], totais_itens)):
         row_cells = tabela.add_row().cells
         row_cells[0].text = f"2.1.{i+1}"
         row_cells[1].text = str(item['quantidade'])
         row_cells[2].text = f"{item['produto']} COM {item['plataforma']}"
-        row_cells[3].text = f"{item['valor_unitario']:.2f}"
-        valor_total_item = item['quantidade'] * item['valor_unitario']
-        row_cells[4].text = f"{valor_total_item:.2f}"
-        total_locacao_mensal += valor_total_item
+        row_cells[3].text = dinheiro.formatar(dinheiro.centavos(item, 'valor_unitario'))
+        row_cells[4].text = dinheiro.formatar(valor_total_item)
         
     add_justified_paragraph("\n2.2. Resumo Financeiro:")
-    add_justified_paragraph(f"Valor Total da Locação Mensal: R$ {total_locacao_mensal:.2f}")
-    add_justified_paragraph(f"Custo de Entrega (Frete): R$ {dados['valor_entrega']:.2f}")
-    add_justified_paragraph(f"Custo de Recolha (Frete): R$ {dados['valor_recolha']:.2f}")
+    add_justified_paragraph(f"Valor Total da Locação Mensal: R$ {dinheiro.formatar(dinheiro.somar(totais_itens))}")
+    add_justified_paragraph(f"Custo de Entrega (Frete): R$ {dinheiro.formatar(dinheiro.centavos(dados, 'valor_entrega'))}")
+    add_justified_paragraph(f"Custo de Recolha (Frete): R$ {dinheiro.formatar(dinheiro.centavos(dados, 'valor_recolha'))}")
 
     add_justified_paragraph("\n2.3. Contato e Endereço da Obra:")
     add_justified_paragraph(f"Contato Responsável na Obra: {dados['contato_nome']}")
@@ -135,6 +215,10 @@ def gerar_contrato_docx(dados):
     return buffer
 
 # --- FUNÇÃO PARA GERAR A FATURA EM WORD ---
+# Incrementar sempre que o layout do documento mudar (invalida o cache de documentos gerados)
+VERSAO_MODELO_FATURA = 1
+
+@metricas.medido("gerar_fatura_docx")
 def gerar_fatura_docx(dados_fatura):
     doc = Document()
     style = doc.styles['Normal']
@@ -218,12 +302,12 @@ def gerar_fatura_docx(dados_fatura):
     hdr_cells[1].text = 'Valor (R$)'
     row_cells = tabela_itens.add_row().cells
     row_cells[0].text = dados_fatura['DESCRICAO_SERVICO']
-    row_cells[1].text = f"{float(dados_fatura['VALOR_TOTAL'].replace(',', '.')):.2f}"
+    row_cells[1].text = dados_fatura['VALOR_TOTAL']
     doc.add_paragraph()
 
     p_total = doc.add_paragraph()
     p_total.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-    p_total.add_run(f"Valor Total: R$ {float(dados_fatura['VALOR_TOTAL'].replace(',', '.')):.2f}").bold = True
+    p_total.add_run(f"Valor Total: R$ {dados_fatura['VALOR_TOTAL']}").bold = True
     
     doc.add_paragraph(f"\nOBSERVAÇÕES: {dados_fatura['OBSERVACAO']}")
 
@@ -233,53 +317,140 @@ def gerar_fatura_docx(dados_fatura):
     return buffer
 
 # --- FUNÇÕES DE GERENCIAMENTO DE NÚMEROS ---
+# Os números saem de blocos reservados atomicamente no config.json (ver numeracao.py)
 def get_next_contract_number(drive):
     try:
-        config_file = get_database_file(drive, "config.json")
-        config_data = read_data(config_file)
-        ultimo_numero = config_data.get("ultimo_numero_contrato", 0)
-        novo_numero = ultimo_numero + 1
-        ano_atual = date.today().year
-        config_data["ultimo_numero_contrato"] = novo_numero
-        write_data(config_file, config_data)
-        return f"{str(novo_numero).zfill(5)}-{ano_atual}"
+        novo_numero, ano = numeracao.alocador_contratos.proximo(drive)
+        return f"{str(novo_numero).zfill(5)}-{ano}"
     except Exception as e:
         st.error(f"Erro ao obter número do contrato: {e}")
         return None
 
 def get_next_fatura_number(drive):
     try:
-        config_file = get_database_file(drive, "config.json")
-        config_data = read_data(config_file)
-        ultimo_numero = config_data.get("ultimo_numero_fatura", 0)
-        novo_numero = ultimo_numero + 1
-        config_data["ultimo_numero_fatura"] = novo_numero
-        write_data(config_file, config_data)
+        novo_numero, _ = numeracao.alocador_faturas.proximo(drive)
         return f"{str(novo_numero).zfill(7)}"
     except Exception as e:
         st.error(f"Erro ao obter número da fatura: {e}")
         return None
 
-# --- FUNÇÕES DE CONEXÃO COM GOOGLE DRIVE ---
+# --- FUNÇÕES DE ACESSO AOS DADOS ---
+# O armazenamento é delegado ao backend configurado (Google Drive ou SQLite), ver storage.py
+@metricas.medido("get_database_file")
 def get_database_file(drive, filename):
-    file_list = drive.ListFile({'q': f"title='{filename}' and trashed=false"}).GetList()
-    if file_list:
-        return file_list[0]
-    else:
-        file = drive.CreateFile({'title': filename, 'mimeType': 'application/json'})
-        file.SetContentString('[]')
-        file.Upload()
-        return file
+    return storage.get_backend().open(drive, filename)
+
+@metricas.medido("carregar_datasets")
+def carregar_datasets(drive, nomes, somente_abrir=()):
+    """Abre e lê os datasets em paralelo; ver storage.carregar."""
+    return storage.carregar(drive, nomes, somente_abrir)
+
+@metricas.medido("read_data")
+def read_data(dataset):
+    return dataset.backend.read(dataset)
 
-def read_data(drive_file):
-    content = drive_file.GetContentString()
-    if not content:
-        return []
-    return json.loads(content)
+# Grava o dataset inteiro só se ele não mudou desde a leitura (senão levanta storage.ConflitoDeVersao).
+# Para alterar registros, prefira insert/update/delete_record, que reaplicam a alteração em caso de conflito.
+@metricas.medido("write_data")
+def write_data(dataset, data):
+    dataset.backend.write(dataset, data)
 
-def write_data(drive_file, data):
-    drive_file.SetContentString(json.dumps(data, indent=4, ensure_ascii=False))
-    drive_file.Upload()
+def versao_dataset(dataset):
+    return dataset.backend.version(dataset)
+
+# --- ESTRUTURAS DERIVADAS POR VERSÃO ---
+class CachePorVersao:
+    """
+    Valores derivados de datasets (ordenações, mapas, índices) guardados junto com a versão do
+    dataset em que foram montados e compartilhados entre as sessões do processo.
+    A montagem acontece fora do lock geral (com um lock por chave, para não montar o mesmo valor
+    duas vezes), então uma montagem lenta não bloqueia as consultas das outras chaves.
+    """
+
+    def __init__(self):
+        self._valores = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def obter(self, chave, versao, montar, valido=None):
+        """
+        Retorna o valor guardado na chave se ele for da versão informada (e valido(valor), se
+        informado); senão monta com montar() e guarda. Com versao None monta sem guardar.
+        """
+        def guardado():
+            with self._lock:
+                item = self._valores.get(chave)
+            if versao is not None and item is not None and item[0] == versao and (valido is None or valido(item[1])):
+                return item
+            return None
+
+        item = guardado()
+        if item is not None:
+            return item[1]
+        if versao is None:
+            return montar()
+        with self._lock:
+            lock_chave = self._locks.setdefault(chave, threading.Lock())
+        with lock_chave:
+            item = guardado()
+            if item is not None:
+                return item[1]
+            valor = montar()
+            with self._lock:
+                self._valores[chave] = (versao, valor)
+            return valor
+
+    def limpar(self):
+        with self._lock:
+            self._valores.clear()
+
+    def alterar(self, chave, versao_anterior, versao_nova, funcao):
+        """
+        Aplica funcao(valor) ao valor guardado e o passa para versao_nova, se ele estiver em
+        versao_anterior; se estiver em outra versão é descartado (será remontado no próximo obter).
+        Retorna o valor alterado, ou None.
+        """
+        with self._lock:
+            item = self._valores.get(chave)
+            if item is None:
+                return None
+            if item[0] is None or item[0] != versao_anterior:
+                del self._valores[chave]
+                return None
+            funcao(item[1])
+            self._valores[chave] = (versao_nova, item[1])
+            return item[1]
+
+# As alterações de registro levam o nome do usuário logado para o diário de alterações
+def insert_record(dataset, registro):
+    return dataset.backend.insert(dataset, registro, usuario=st.session_state.get('nome_usuario'))
+
+def update_record(dataset, id_registro, campos):
+    return dataset.backend.update(dataset, id_registro, campos, usuario=st.session_state.get('nome_usuario'))
+
+def delete_record(dataset, id_registro):
+    return dataset.backend.delete(dataset, id_registro, usuario=st.session_state.get('nome_usuario'))
+
+# --- ORDENAÇÃO DE REGISTROS ---
+def normalizar_texto(texto):
+    """Remove acentos e diferenças entre maiúsculas e minúsculas (para ordenar e buscar)."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+_ordenacoes = CachePorVersao()
+
+def ordem_por(dataset, registros, campo):
+    """
+    Retorna as posições dos registros ordenados pelo campo (texto normalizado).
+    A ordenação é calculada uma vez por versão do dataset e reaproveitada por todas as sessões.
+    """
+    def ordenar():
+        chaves = [normalizar_texto(r.get(campo, '')) for r in registros]
+        return sorted(range(len(registros)), key=chaves.__getitem__)
+
+    return _ordenacoes.obter(
+        (dataset.nome, campo), versao_dataset(dataset), ordenar, valido=lambda ordem: len(ordem) == len(registros)
+    )
 
 # --- FUNÇÕES DE VALIDAÇÃO ---
 def validar_e_formatar_cpf(cpf_str):
@@ -295,22 +466,11 @@ def validar_e_formatar_cnpj(cnpj_str):
     return None
 
 # --- FUNÇÃO DE CONSULTA DE CEP ---
+@metricas.medido("consultar_cep")
 def consultar_cep(cep):
-    cep_limpo = "".join(filter(str.isdigit, cep))
-    if len(cep_limpo) != 8:
-        return None
-    try:
-        url = f"https://viacep.com.br/ws/{cep_limpo}/json/"
-        response = requests.get(url)
-        if response.status_code == 200:
-            dados = response.json()
-            if dados.get("erro"):
-                return None
-            return dados
-        else:
-            return None
-    except requests.RequestException:
-        return None
+    # Cache em memória e em disco, tempo limite e base local de contingência: ver consulta_cep.py
+    # Levanta consulta_cep.CEPIndisponivel quando não dá para saber se o CEP existe
+    return consulta_cep.resolvedor().consultar(cep)
 
 # --- COMPONENTE DE RODAPÉ ---
 def exibir_rodape():
@@ -325,4 +485,30 @@ def exibir_rodape():
         </div>
         """,
         unsafe_allow_html=True
-    )
\ No newline at end of file
+    )
+    # Fecha a medição da execução da página e mostra o painel de desempenho (administradores)
+    metricas.exibir_painel(metricas.finalizar_execucao())
+    exibir_alteracoes_descartadas()
+
+# --- ALTERAÇÕES NÃO REENVIADAS DEPOIS DE UMA QUEDA (ADMINISTRADORES) ---
+def exibir_alteracoes_descartadas():
+    """Lista na barra lateral as alterações recuperadas pela gravação adiada que não puderam ser reenviadas."""
+    backend = storage.get_backend()
+    if not st.session_state.get('administrador') or not isinstance(backend, storage.GravacaoAdiada):
+        return
+    descartadas = backend.descartadas()
+    if not descartadas:
+        return
+    with st.sidebar.expander(f"⚠️ {len(descartadas)} alteração(ões) não reenviada(s)"):
+        st.caption("Alterações feitas antes de uma queda do servidor que não foram gravadas porque o registro foi alterado depois delas. Confira e refaça as que ainda forem necessárias.")
+        st.dataframe(
+            [
+                {"Arquivo": e["dataset"], "Operação": e["op"], "Registro": e["id"], "Dados": str(e.get("dados")), "Usuário": e.get("usuario"), "Data": e.get("timestamp")}
+                for e in descartadas
+            ],
+            hide_index=True,
+        )
+        st.download_button("Baixar (JSONL)", data=metricas.jsonl(descartadas), file_name="alteracoes_descartadas.jsonl", mime="application/x-ndjson")
+        if st.button("Marcar como conferidas"):
+            backend.arquivar_descartadas()
+            st.rerun()